@@ -1,8 +1,11 @@
 import sys 
 sys.path.append("../")
 import os 
-from inverse_folding_oracle.fold import fold_aa_seq
+from inverse_folding_oracle.fold import fold_aa_seqs
+import numpy as np 
 from inverse_folding_oracle.get_tm import cal_tm_score
+from inverse_folding_oracle.tm_align import cal_tm_scores_native
+from inverse_folding_oracle.resources import get_target_ca_coords
 
 
 from contextlib import contextmanager
@@ -25,9 +28,44 @@ def aa_seq_to_tm_score(
     aa_seq, 
     target_pdb_path,
     esm_model=None,
+    save_pdb_dir=None,
+    tm_scorer="tmalign",
 ):
+    return aa_seqs_to_tm_scores(
+        aa_seqs=[aa_seq],
+        target_pdb_path=target_pdb_path,
+        esm_model=esm_model,
+        save_pdb_dir=save_pdb_dir,
+        tm_scorer=tm_scorer,
+    )[0]
+
+
+def aa_seqs_to_tm_scores(
+    aa_seqs, 
+    target_pdb_path,
+    esm_model=None,
+    max_tokens_per_batch=1024,
+    save_pdb_dir=None, # debug only, also write folded pdbs to this dir 
+    tm_scorer="tmalign", # "tmalign" (TMalign binary) or "native" (in process numpy TM-align, see tm_align.py)
+    fold_cache=None, # optional FoldCache (see fold_cache.py) shared with other oracles 
+):
+    # batched version of aa_seq_to_tm_score, folds all seqs in length buckets 
+    # folded pdbs stay in memory and are passed to the scorer as pdb text 
+    assert tm_scorer in ["tmalign", "native"]
+    scores = []
     with suppress_stdout():
-        folded_pdb_path = fold_aa_seq(aa_seq, esm_model=esm_model)
-        score = cal_tm_score(folded_pdb_path, target_pdb_path)
-        os.remove(folded_pdb_path)
-    return score 
+        folded_pdbs = fold_aa_seqs(
+            aa_seqs, 
+            esm_model=esm_model, 
+            max_tokens_per_batch=max_tokens_per_batch,
+            save_pdb_dir=save_pdb_dir,
+            fold_cache=fold_cache,
+        )
+        if tm_scorer == "native":
+            return cal_tm_scores_native(folded_pdbs, get_target_ca_coords(target_pdb_path))
+        for folded_pdb in folded_pdbs:
+            if folded_pdb is None:
+                scores.append(np.nan)
+                continue
+            scores.append(cal_tm_score(folded_pdb, target_pdb_path))
+    return scores
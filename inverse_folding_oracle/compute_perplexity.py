@@ -1,11 +1,12 @@
 import esm 
+import numpy as np 
+from inverse_folding_oracle.resources import get_target_coords
 device = "cuda:0"
 def score_sequences(seq_list, target_pdb, inv_model, alphabet, device=device):
 
     inv_model = inv_model.to(device)
 
-    structure = esm.inverse_folding.util.load_structure(target_pdb, "A")
-    coords, _ = esm.inverse_folding.util.extract_coords_from_structure(structure)
+    coords, _ = get_target_coords(target_pdb, "A")
 
     ll, _ = esm.inverse_folding.util.score_sequence(inv_model, alphabet, coords, seq_list)
 
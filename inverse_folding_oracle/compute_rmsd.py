@@ -3,6 +3,7 @@ import sys
 sys.path.append("../")
 import esm
 from inverse_folding_oracle.fold import fold_aa_seq
+from inverse_folding_oracle.resources import get_target_coords
 import os 
 
 def cal_rmsd(c1, c2):
@@ -39,9 +40,8 @@ def cal_rmsd(c1, c2):
 
 
 def cal_unnormalized_rmsd(inverse_folded_pdb, target_pdb):
-    # Load the target structure and the inverse folded structure
-    structure_target = esm.inverse_folding.util.load_structure(target_pdb, "A")
-    coords_target, _ = esm.inverse_folding.util.extract_coords_from_structure(structure_target)
+    # Load the target structure (cached across calls) and the inverse folded structure
+    coords_target, _ = get_target_coords(target_pdb, "A")
 
     structure_inverse_folded = esm.inverse_folding.util.load_structure(inverse_folded_pdb, "A")
     coords_inverse_folded, _ = esm.inverse_folding.util.extract_coords_from_structure(structure_inverse_folded)
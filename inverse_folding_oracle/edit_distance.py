@@ -1,16 +1,8 @@
+from lolbo.utils.edit_distance import edit_distance
 
 
 
 def compute_edit_distance(s1, s2): 
     ''' Returns Levenshtein Edit Distance btwn two strings'''
-    m=len(s1)+1
-    n=len(s2)+1
-    tbl = {}
-    for i in range(m): tbl[i,0]=i
-    for j in range(n): tbl[0,j]=j
-    for i in range(1, m):
-        for j in range(1, n):
-            cost = 0 if s1[i-1] == s2[j-1] else 1 
-            tbl[i,j] = min(tbl[i, j-1]+1, tbl[i-1, j]+1, tbl[i-1, j-1]+cost)
-
-    return tbl[i,j] 
\ No newline at end of file
+    # Myers' bit-vector algorithm, see lolbo/utils/edit_distance.py
+    return edit_distance(s1, s2)
\ No newline at end of file
@@ -4,14 +4,21 @@ from transformers.models.esm.openfold_utils.protein import to_pdb, Protein as OF
 from transformers.models.esm.openfold_utils.feats import atom14_to_atom37
 import uuid
 import os 
+import numpy as np 
 import esm 
 from esm.inverse_folding.util import CoordBatchConverter
+from inverse_folding_oracle.resources import get_esmfold_model, get_esmfold_tokenizer
+from inverse_folding_oracle.seq_utils import clean_aa_seq, esm_token_length
+from lolbo.utils.utils import token_budget_batches
 # device = "cuda:0" if torch.cuda.is_available() else "cpu" 
 if not torch.cuda.is_available():
     print("NO GPU AVAILABLE")
-    assert 0 
+    # ImportError so optional importers (i.e. the fold cache in your_tasks) can fall back 
+    raise ImportError("inverse_folding_oracle.fold needs a GPU")
 
-def convert_outputs_to_pdb(outputs):
+def convert_outputs_to_pdb(outputs, lengths=None):
+    # lengths: optional list of unpadded sequence lengths for a padded batch,
+    #   padding positions are dropped from the returned pdbs 
     final_atom_positions = atom14_to_atom37(outputs["positions"][-1], outputs)
     outputs = {k: v.to("cpu").numpy() for k, v in outputs.items()}
     final_atom_positions = final_atom_positions.cpu().numpy()
@@ -22,18 +29,53 @@ def convert_outputs_to_pdb(outputs):
         pred_pos = final_atom_positions[i]
         mask = final_atom_mask[i]
         resid = outputs["residue_index"][i] + 1
+        b_factors = outputs["plddt"][i]
+        chain_index = outputs["chain_index"][i] if "chain_index" in outputs else None
+        if lengths is not None:
+            L = lengths[i]
+            aa, pred_pos, mask, resid, b_factors = aa[:L], pred_pos[:L], mask[:L], resid[:L], b_factors[:L]
+            if chain_index is not None:
+                chain_index = chain_index[:L]
         pred = OFProtein(
             aatype=aa,
             atom_positions=pred_pos,
             atom_mask=mask,
             residue_index=resid,
-            b_factors=outputs["plddt"][i],
-            chain_index=outputs["chain_index"][i] if "chain_index" in outputs else None,
+            b_factors=b_factors,
+            chain_index=chain_index,
         )
         pdbs.append(to_pdb(pred))
     return pdbs
 
 
+class FoldResult:
+    ''' ESMFold prediction for a single sequence '''
+    def __init__(
+        self,
+        pdb, # pdb text 
+        atom_positions, # (L, 37, 3) float32 array of atom37 positions 
+        plddt, # (L, 37) float32 array of per atom plddt 
+        mean_plddt, # float, mean plddt over existing atoms (same as get_plddt.compute_plddt)
+    ):
+        self.pdb = pdb
+        self.atom_positions = atom_positions
+        self.plddt = plddt
+        self.mean_plddt = mean_plddt
+
+
+def convert_outputs_to_fold_results(outputs, lengths):
+    # lengths: list of unpadded sequence lengths of the batch 
+    pdbs = convert_outputs_to_pdb(outputs, lengths=lengths)
+    atom_positions = atom14_to_atom37(outputs["positions"][-1], outputs).cpu().numpy().astype(np.float32)
+    plddt = outputs["plddt"].cpu().numpy().astype(np.float32)
+    atom_exists = outputs["atom37_atom_exists"].cpu().numpy()
+    results = []
+    for i, L in enumerate(lengths):
+        mean_plddt = (plddt[i, :L]*atom_exists[i, :L]).sum() / atom_exists[i, :L].sum()
+        results.append(FoldResult(pdbs[i], atom_positions[i, :L], plddt[i, :L], float(mean_plddt)))
+    return results
+
+
 def inverse_fold(target_pdb_id, chain_id="A", model=None):
     '''This function is used to convert a pdb file to a sequence using inverse folding
     Default to chain A, since we only support folding a single sequence at the moment
@@ -66,24 +108,53 @@ def inverse_fold_many_seqs(target_pdb_id, num_seqs, chain_id="A", model=None):
     sampled_seqs = model.sample(coords, temperature=1, num_seqs=num_seqs) 
     return sampled_seqs 
 
+
+def fold_seqs(seqs, model=None, max_tokens_per_batch=1024):
+    ''' Folds a list of sequences with one forward pass per length bucket 
+        returns list of FoldResults (None for seqs that are empty after cleaning)
+    '''
+    if model is None:
+        model = get_esmfold_model()
+    model = model.eval()
+    tokenizer = get_esmfold_tokenizer()
+    seqs = [clean_aa_seq(seq) for seq in seqs]
+    results = [None]*len(seqs)
+    to_fold = [ix for ix, seq in enumerate(seqs) if len(seq) > 0]
+    for batch in token_budget_batches([seqs[ix] for ix in to_fold], max_tokens=max_tokens_per_batch, length_fn=esm_token_length):
+        batch_idxs = [to_fold[ix] for ix in batch]
+        batch_seqs = [seqs[ix] for ix in batch_idxs]
+        tokenized = tokenizer(batch_seqs, return_tensors="pt", padding=True, add_special_tokens=False)
+        with torch.no_grad():
+            output = model(
+                tokenized['input_ids'].to(model.device),
+                attention_mask=tokenized['attention_mask'].to(model.device),
+            )
+        batch_results = convert_outputs_to_fold_results(output, lengths=[len(seq) for seq in batch_seqs])
+        for ix, result in zip(batch_idxs, batch_results):
+            results[ix] = result
+    return results 
+
+
+def seqs_to_pdbs(seqs, model=None, max_tokens_per_batch=1024):
+    ''' Folds a list of sequences with one forward pass per length bucket 
+        returns list of pdb strings (None for seqs that are empty after cleaning)
+    '''
+    results = fold_seqs(seqs, model=model, max_tokens_per_batch=max_tokens_per_batch)
+    return [None if result is None else result.pdb for result in results]
+
+
 def seq_to_pdb(seq, save_path="./output.pdb", model=None):
     # This function is used to fold a sequence to a pdb file
     # Load the model and tokenizer
     if model is None:
-        model = EsmForProteinFolding.from_pretrained("facebook/esmfold_v1")
+        model = get_esmfold_model()
 
-    model = model.to('cpu') 
-    tokenizer = AutoTokenizer.from_pretrained("facebook/esmfold_v1")
+    # the model may be the shared one from the registry, move the inputs to it rather than moving it 
+    tokenizer = get_esmfold_tokenizer()
 
-    ### Added by Natalie, remove tokens in UNIREF that are unsupported by ESM  
-    seq = seq.replace("-", "") 
-    seq = seq.replace("U", "") 
-    seq = seq.replace("X", "") 
-    seq = seq.replace("Z", "") 
-    seq = seq.replace("O", "") 
-    seq = seq.replace("B", "")
+    seq = clean_aa_seq(seq)
 
-    tokenized_input = tokenizer([seq], return_tensors="pt", add_special_tokens=False)['input_ids'].to('cpu') 
+    tokenized_input = tokenizer([seq], return_tensors="pt", add_special_tokens=False)['input_ids'].to(model.device) 
 
     with torch.no_grad():
         output = model(tokenized_input)
@@ -96,13 +167,32 @@ def seq_to_pdb(seq, save_path="./output.pdb", model=None):
 
 def fold_aa_seq(aa_seq, esm_model=None):
     if esm_model is None:
-        esm_model = EsmForProteinFolding.from_pretrained("facebook/esmfold_v1").to('cpu') 
+        esm_model = get_esmfold_model() 
     if not os.path.exists("temp_pdbs/"):
         os.mkdir("temp_pdbs/")
     folded_pdb_path = f"temp_pdbs/{uuid.uuid1()}.pdb"
     seq_to_pdb(seq=aa_seq, save_path=folded_pdb_path, model=esm_model)
     return folded_pdb_path 
 
+def fold_aa_seqs(aa_seqs, esm_model=None, max_tokens_per_batch=1024, save_pdb_dir=None, fold_cache=None):
+    # batched version of fold_aa_seq, returns list of pdb strings kept in memory (None where seq could not be folded)
+    # save_pdb_dir: optional debug dir, if given each folded pdb is also written to save_pdb_dir/{uuid}.pdb and kept 
+    # fold_cache: optional FoldCache (see fold_cache.py), only seqs missing from it are folded 
+    if esm_model is None:
+        esm_model = get_esmfold_model() 
+    if fold_cache is None:
+        pdbs = seqs_to_pdbs(aa_seqs, model=esm_model, max_tokens_per_batch=max_tokens_per_batch)
+    else:
+        results = fold_cache.fold(aa_seqs, model=esm_model, max_tokens_per_batch=max_tokens_per_batch)
+        pdbs = [None if result is None else result.pdb for result in results]
+    if save_pdb_dir is not None:
+        os.makedirs(save_pdb_dir, exist_ok=True)
+        for pdb in pdbs:
+            if pdb is not None:
+                with open(os.path.join(save_pdb_dir, f"{uuid.uuid1()}.pdb"), "w") as f:
+                    f.write(pdb)
+    return pdbs 
+
 def load_esm_if_model():
     if_model, if_alphabet = esm.pretrained.esm_if1_gvp4_t16_142M_UR50()
     if_model = if_model.eval() 
@@ -138,7 +228,7 @@ def aa_seq_to_gvp_encoding(aa_seq, if_model=None, if_alphabet=None, fold_model=N
     if (if_model is None) or (if_alphabet is None):
         if_model, if_alphabet = load_esm_if_model()
     if fold_model is None: 
-        fold_model = EsmForProteinFolding.from_pretrained("facebook/esmfold_v1").to('cpu') 
+        fold_model = get_esmfold_model() 
     folded_pdb = fold_aa_seq(aa_seq, esm_model=fold_model)
     with torch.no_grad():
         encoding = get_gvp_encoding(pdb_path=folded_pdb, model=if_model, alphabet=if_alphabet) 
@@ -150,7 +240,7 @@ def aa_seqs_list_to_avg_gvp_encodings(aa_seq_list, if_model=None, if_alphabet=No
         if (if_model is None) or (if_alphabet is None):
             if_model, if_alphabet = load_esm_if_model()
         if fold_model is None: 
-            fold_model = EsmForProteinFolding.from_pretrained("facebook/esmfold_v1").to('cpu') 
+            fold_model = get_esmfold_model() 
         folded_pdbs = [fold_aa_seq(aa_seq, esm_model=fold_model) for aa_seq in aa_seq_list]
 
         # V1 get individually  
@@ -0,0 +1,158 @@
+import os 
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np 
+from inverse_folding_oracle.fold import FoldResult, clean_aa_seq, fold_seqs
+
+
+class FoldCache:
+    '''Content addressed cache of ESMFold results keyed by the sha256 of the 
+        (cleaned) amino acid sequence. Shared by every oracle that folds 
+        sequences (TM-score objective, pLDDT constraint) so that a sequence is 
+        folded at most once per run, including when it is re-decoded and 
+        re-scored during recentering. 
+        Results are held in an in memory LRU tier of max_entries results, 
+        and optionally in an on disk tier (one .npz per sequence in cache_dir) 
+        that is never evicted and can be reused across runs'''
+
+    def __init__(
+        self,
+        max_entries=2048,
+        cache_dir=None,
+    ):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.entries = OrderedDict() # key --> FoldResult, least recently used first 
+        self.lock = threading.Lock() # oracle pool threads share the cache 
+        self.num_hits = 0
+        self.num_misses = 0
+
+
+    @staticmethod
+    def key(seq):
+        return hashlib.sha256(clean_aa_seq(seq).encode("utf-8")).hexdigest()
+
+
+    def get(self, seq):
+        ''' Returns the cached FoldResult of seq, or None if seq was never folded '''
+        return self._get(self.key(seq))
+
+
+    def put(self, seq, result):
+        self._put(self.key(seq), result)
+
+
+    def fold(self, seqs, model=None, max_tokens_per_batch=1024):
+        ''' Input:
+                seqs: list of amino acid seqs
+            Output:
+                list of FoldResults in the same order (None for seqs that are empty after cleaning),
+                only distinct seqs missing from the cache are folded (in one batched call)
+        '''
+        keys = [self.key(seq) for seq in seqs]
+        results = [self._get(key) for key in keys]
+        to_fold = OrderedDict() # key --> seq 
+        for seq, key, result in zip(seqs, keys, results):
+            if result is None:
+                to_fold[key] = seq
+        with self.lock:
+            self.num_hits += len(seqs) - sum(result is None for result in results)
+            self.num_misses += len(to_fold)
+        if len(to_fold) > 0:
+            folded = fold_seqs(list(to_fold.values()), model=model, max_tokens_per_batch=max_tokens_per_batch)
+            folded = dict(zip(to_fold.keys(), folded))
+            for key, result in folded.items():
+                if result is not None:
+                    self._put(key, result)
+            results = [folded[key] if result is None else result for key, result in zip(keys, results)]
+
+        return results
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def _get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                return result
+        result = self._load(key)
+        if result is not None:
+            self._put(key, result, write_to_disk=False)
+        return result
+
+
+    def _put(self, key, result, write_to_disk=True):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        if write_to_disk:
+            self._save(key, result)
+
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npz")
+
+
+    def _load(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return FoldResult(
+                pdb=str(data["pdb"]),
+                atom_positions=data["atom_positions"],
+                plddt=data["plddt"],
+                mean_plddt=float(data["mean_plddt"]),
+            )
+
+
+    def _save(self, key, result):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so parallel runs never read a partial file 
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                pdb=np.array(result.pdb),
+                atom_positions=result.atom_positions,
+                plddt=result.plddt,
+                mean_plddt=np.array(result.mean_plddt),
+            )
+        os.replace(tmp_path, path)
+
+
+# process wide FoldCache shared by all oracles 
+_shared_fold_cache = None
+_shared_fold_cache_lock = threading.Lock()
+
+
+def get_shared_fold_cache(max_entries=2048, cache_dir=None):
+    ''' Returns the process wide FoldCache, created on first call. 
+        Consumers configured with different settings still share it: 
+        the largest max_entries is kept and a cache_dir given by 
+        any consumer enables the on disk tier 
+    '''
+    global _shared_fold_cache
+    with _shared_fold_cache_lock:
+        if _shared_fold_cache is None:
+            _shared_fold_cache = FoldCache(max_entries=max_entries, cache_dir=cache_dir)
+        else:
+            _shared_fold_cache.max_entries = max(_shared_fold_cache.max_entries, max_entries)
+            if (cache_dir is not None) and (_shared_fold_cache.cache_dir is None):
+                os.makedirs(cache_dir, exist_ok=True)
+                _shared_fold_cache.cache_dir = cache_dir
+        return _shared_fold_cache
@@ -1,29 +1,32 @@
 import torch 
-device = "cuda:0"
+from inverse_folding_oracle.seq_utils import clean_aa_seq, esm_token_length
+from lolbo.utils.utils import token_budget_batches
 
-def compute_plddt(seq, fold_model, tokenizer):
-    # Compute plddt score for sequence 
-    fold_model = fold_model.to(device)
-
-    seq = seq.replace("-", "") 
-    seq = seq.replace("U", "") 
-    seq = seq.replace("X", "") 
-    seq = seq.replace("Z", "") 
-    seq = seq.replace("O", "") 
-    seq = seq.replace("B", "")
 
-    # if seq is not a list of sequences, convert it to a list
-    if not isinstance(seq, list):
-        seq = [seq]
-    
-    tokenized_input = tokenizer(seq, return_tensors="pt", add_special_tokens=False)['input_ids'].to(device)
+def compute_plddts(seqs, fold_model, tokenizer, max_tokens_per_batch=1024):
+    ''' Mean plddt of each seq in a list of seqs, 
+        with one ESMFold forward pass per length bucket 
+        returns (len(seqs),) float tensor (nan for seqs that are empty after cleaning)
+    '''
+    # fold_model may be the shared one from the registry, move the inputs to it rather than moving it 
+    device = fold_model.device
+    seqs = [clean_aa_seq(seq) for seq in seqs]
+    mean_plddts = torch.full((len(seqs),), float("nan"))
+    to_fold = [ix for ix, seq in enumerate(seqs) if len(seq) > 0]
+    for batch in token_budget_batches([seqs[ix] for ix in to_fold], max_tokens=max_tokens_per_batch, length_fn=esm_token_length):
+        batch_idxs = [to_fold[ix] for ix in batch]
+        tokenized = tokenizer([seqs[ix] for ix in batch_idxs], return_tensors="pt", padding=True, add_special_tokens=False)
+        attention_mask = tokenized['attention_mask'].to(device)
+        with torch.inference_mode():
+            output = fold_model(tokenized['input_ids'].to(device), attention_mask=attention_mask)
+            # Calculate the mean plddt score for single chain proteins, ignoring padding positions
+            atom_exists = output["atom37_atom_exists"] * attention_mask[..., None]
+            mean_plddt = (output["plddt"] * atom_exists).sum(dim=(1, 2)) / atom_exists.sum(dim=(1, 2))
+        mean_plddts[batch_idxs] = mean_plddt.float().cpu()
 
-    with torch.no_grad():
-        output = fold_model(tokenized_input)
-        # Calculate the mean plddt score for single chain proteins
-        mean_plddt = (output["plddt"] * output["atom37_atom_exists"]).sum(
-                dim=(1, 2)
-            ) / output["atom37_atom_exists"].sum(dim=(1, 2))
+    return mean_plddts
 
-    return mean_plddt.item()
 
+def compute_plddt(seq, fold_model, tokenizer):
+    # Compute plddt score for a single sequence 
+    return compute_plddts([seq], fold_model, tokenizer)[0].item()
@@ -13,9 +13,9 @@ def get_probs_human(seqs_list, human_tokenizer, human_model):
     # Input: list of sequences 
     # Output: tensor of probs of being human 
     inputs = human_tokenizer(seqs_list, return_tensors="pt", truncation=True, padding=True)
-    # move to gpu
+    # move to the device the model is on 
     for k, v in inputs.items():
-        inputs[k] = v.to(device)
+        inputs[k] = v.to(human_model.device)
     outputs = human_model(**inputs)
     probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
     # return probability of being human, first column is probability of being non-human, second column is probability of being human
@@ -34,8 +34,59 @@ def get_prob_human(seq, human_tokenizer, human_model):
     return probs[0][1].item()
 
 
-def load_human_classier_model():
+def load_human_classier_model(device=device):
     human_classifier_tokenizer = AutoTokenizer.from_pretrained(CLASSIFIER_PATH) 
     human_classifier_model = EsmForSequenceClassification.from_pretrained(CLASSIFIER_PATH).to(device)   
     return human_classifier_tokenizer,  human_classifier_model 
 
+
+class HumanClassifier:
+    '''Probability that amino acid seqs are human according to the fine tuned 
+        EsmForSequenceClassification checkpoint in CLASSIFIER_PATH. 
+        Seqs are sorted by length and scored in micro batches of at most 
+        batch_size seqs, so each micro batch holds seqs of similar length 
+        and a large batch is never padded to its single longest seq. 
+        quantize=True runs a dynamic int8 quantized copy of the model (CPU only)'''
+
+    def __init__(
+        self,
+        device=None, # defaults to cuda:0 if available, else cpu 
+        batch_size=64, # max seqs per forward pass 
+        quantize=False, # if True, quantize the linear layers to int8 and run on cpu 
+        checkpoint_path=CLASSIFIER_PATH,
+    ):
+        if device is None:
+            device = "cuda:0" if torch.cuda.is_available() else "cpu"
+        if quantize:
+            # dynamic quantization only has cpu kernels 
+            device = "cpu"
+        self.device = device
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(checkpoint_path) 
+        model = EsmForSequenceClassification.from_pretrained(checkpoint_path).eval() 
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model.to(device)
+
+
+    def __call__(self, seqs_list):
+        ''' Input: list of sequences 
+            Output: (len(seqs_list),) tensor of probs of being human 
+        '''
+        probs = torch.zeros(len(seqs_list))
+        order = sorted(range(len(seqs_list)), key=lambda ix: len(seqs_list[ix]))
+        for start in range(0, len(order), self.batch_size):
+            batch_idxs = order[start:start + self.batch_size]
+            inputs = self.tokenizer(
+                [seqs_list[ix] for ix in batch_idxs], 
+                return_tensors="pt", 
+                truncation=True, 
+                padding=True,
+            )
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            with torch.inference_mode():
+                logits = self.model(**inputs).logits
+            # second column is probability of being human 
+            probs[batch_idxs] = torch.softmax(logits.float(), dim=-1)[:, 1].cpu()
+        return probs 
+
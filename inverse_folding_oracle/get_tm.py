@@ -1,11 +1,47 @@
 import re
+import os 
 import subprocess
+import tempfile
+from contextlib import contextmanager, ExitStack
 import numpy as np 
 
+# TMalign only reads pdb files, pdb text held in memory is handed to it
+#   through a tmpfs file (/dev/shm) when available so it never touches disk 
+TMP_PDB_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def is_pdb_text(pdb):
+    # pdbs are passed around either as a path to a pdb file or as the pdb text itself 
+    return "\n" in pdb
+
+
+@contextmanager
+def pdb_path(pdb):
+    ''' Yields a path TMalign can read for pdb (a pdb file path or pdb text),
+        pdb text is written to a temporary file removed on exit 
+    '''
+    if not is_pdb_text(pdb):
+        yield pdb
+        return
+    with tempfile.NamedTemporaryFile("w", suffix=".pdb", dir=TMP_PDB_DIR) as f:
+        f.write(pdb)
+        f.flush()
+        yield f.name
+
+
+def run_tmalign(folded_pdb, target_pdb):
+    # folded_pdb, target_pdb: pdb file paths or pdb text 
+    with ExitStack() as stack:
+        folded_path = stack.enter_context(pdb_path(folded_pdb))
+        target_path = stack.enter_context(pdb_path(target_pdb))
+        # Call the executable file in Bash and capture its output
+        command = ["../inverse_folding_oracle/TMalign", folded_path, target_path]
+        output = subprocess.check_output(command)
+    return output
+
+
 def cal_tm_score(folded_pdb, target_pdb):
-    # Call the executable file in Bash and capture its output
-    command = ["../inverse_folding_oracle/TMalign", folded_pdb, target_pdb]
-    output = subprocess.check_output(command)
+    output = run_tmalign(folded_pdb, target_pdb)
     # Extract the TM-score value using regular expressions
     tm_score_regex = r"TM-score= ([\d\.]+)"
     # tm_score_match = re.search(tm_score_regex, output.decode("utf-8"))
@@ -27,9 +63,7 @@ def cal_tm_score(folded_pdb, target_pdb):
 
 
 def cal_tm_score_and_normalized_rmsd(folded_pdb, target_pdb):
-    # Call the executable file in Bash and capture its output
-    command = ["../inverse_folding_oracle/TMalign", folded_pdb, target_pdb]
-    output = subprocess.check_output(command)
+    output = run_tmalign(folded_pdb, target_pdb)
 
     decoded_output = output.decode("utf-8")
     # Extract normalized RMSD value using regular expressions
@@ -0,0 +1,48 @@
+import os 
+import functools
+import esm 
+from transformers import AutoTokenizer, EsmForProteinFolding
+from inverse_folding_oracle.tm_align import parse_ca_coords
+
+# Process wide registry of the resources needed by every oracle call 
+#   (ESMFold tokenizer and model, parsed target structures). 
+#   Each is loaded once on first use and shared by all later calls, 
+#   objectives preload them at construction. 
+#   Returned arrays/models are shared, callers must not modify them in place 
+
+ESMFOLD_MODEL_NAME = "facebook/esmfold_v1"
+
+
+@functools.lru_cache(maxsize=None)
+def get_esmfold_tokenizer():
+    return AutoTokenizer.from_pretrained(ESMFOLD_MODEL_NAME)
+
+
+@functools.lru_cache(maxsize=None)
+def get_esmfold_model(device="cpu"):
+    model = EsmForProteinFolding.from_pretrained(ESMFOLD_MODEL_NAME)
+    model = model.eval() 
+    return model.to(device) 
+
+
+def get_target_coords(target_pdb_path, chain_id="A"):
+    ''' Returns backbone coords (L x 3 x 3 array of N, CA, C) and native seq 
+        of chain chain_id of the target structure, parsed once per path 
+    '''
+    return _load_target_coords(os.path.abspath(target_pdb_path), chain_id)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_target_coords(target_pdb_path, chain_id):
+    structure = esm.inverse_folding.util.load_structure(target_pdb_path, chain_id)
+    return esm.inverse_folding.util.extract_coords_from_structure(structure)
+
+
+def get_target_ca_coords(target_pdb_path):
+    # (L, 3) CA coords of the target used by the native TM-align (see tm_align.py), parsed once per path 
+    return _load_target_ca_coords(os.path.abspath(target_pdb_path))
+
+
+@functools.lru_cache(maxsize=None)
+def _load_target_ca_coords(target_pdb_path):
+    return parse_ca_coords(target_pdb_path)
@@ -0,0 +1,16 @@
+def clean_aa_seq(seq):
+    ### Added by Natalie, remove tokens in UNIREF that are unsupported by ESM  
+    seq = seq.replace("-", "") 
+    seq = seq.replace("U", "") 
+    seq = seq.replace("X", "") 
+    seq = seq.replace("Z", "") 
+    seq = seq.replace("O", "") 
+    seq = seq.replace("B", "")
+    return seq 
+
+
+def esm_token_length(seq):
+    ''' Number of ESMFold tokens of seq 
+        (one per residue left after cleaning, folded without special tokens) 
+    '''
+    return len(clean_aa_seq(seq))
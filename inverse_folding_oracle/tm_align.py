@@ -0,0 +1,488 @@
+import numpy as np
+
+# In process TM-score/TM-align over C-alpha coordinates, used in place of
+#   forking the TMalign binary (see get_tm.py) once per oracle call
+# Follows the TM-align algorithm (Zhang & Skolnick 2005, NAR 33:2302):
+#   initial alignments (gapless threading, secondary structure, local fragment superposition,
+#   ss + superposition and fragment gapless threading) refined by iterating 
+#   Needleman-Wunsch DP on 1/(1+d^2/d0^2) scores with the TM-score superposition search
+# Scores match the TMalign binary to within 1e-4 on the bundled targets
+#   (see tests/test_tm_align.py), TMalign stays the default scorer of the oracles
+
+
+def parse_ca_coords(pdb):
+    ''' Input:
+            pdb: path to a pdb file or pdb text
+        Output:
+            (L, 3) float array of CA coords of the first chain of the first model
+    '''
+    if "\n" not in pdb:
+        with open(pdb) as f:
+            pdb = f.read()
+    coords = []
+    seen_residues = set()
+    chain = None
+    for line in pdb.splitlines():
+        if line.startswith("ENDMDL"):
+            break
+        if (not line.startswith("ATOM")) or (line[12:16].strip() != "CA"):
+            continue
+        if line[16] not in (" ", "A"): # keep first alternate location only
+            continue
+        if chain is None:
+            chain = line[21]
+        elif line[21] != chain:
+            break
+        residue = line[22:27]
+        if residue in seen_residues:
+            continue
+        seen_residues.add(residue)
+        coords.append([float(line[30:38]), float(line[38:46]), float(line[46:54])])
+    return np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+
+def kabsch(x, y, w):
+    ''' Batched weighted Kabsch superposition
+        Input:
+            x, y: (..., n, 3) coords (broadcastable), w: (..., n) weights (0/1 masks)
+        Output:
+            R (..., 3, 3) and t (..., 3) minimizing sum_k w_k |R x_k + t - y_k|^2
+    '''
+    w = w.astype(np.float64)
+    w_sum = np.maximum(w.sum(-1), 1e-8)[..., None]
+    x_mean = (w[..., None] * x).sum(-2) / w_sum
+    y_mean = (w[..., None] * y).sum(-2) / w_sum
+    xc = x - x_mean[..., None, :]
+    yc = y - y_mean[..., None, :]
+    H = np.swapaxes(w[..., None] * xc, -1, -2) @ yc
+    U, _, Vt = np.linalg.svd(H)
+    d = np.sign(np.linalg.det(U @ Vt))
+    d = np.where(d == 0, 1.0, d)
+    Vt[..., 2, :] *= d[..., None]
+    R = np.swapaxes(Vt, -1, -2) @ np.swapaxes(U, -1, -2)
+    t = y_mean - (R @ x_mean[..., None])[..., 0]
+    return R, t
+
+
+def transform(x, R, t):
+    # applies R x + t to (..., n, 3) coords
+    return x @ np.swapaxes(R, -1, -2) + t[..., None, :]
+
+
+def search_params(xlen, ylen):
+    # d0 and cutoffs used while searching for the alignment (TMalign parameter_set4search)
+    L = min(xlen, ylen)
+    d0 = 0.168 if L <= 19 else 1.24*(L - 15)**(1/3) - 1.8
+    d0 = d0 + 0.8
+    d0_search = min(max(d0, 4.5), 8.0)
+    score_d8 = 1.5*L**0.3 + 3.5
+    return L, d0, d0_search, score_d8
+
+
+def final_params(L):
+    # d0 used for the reported TM-score normalized by length L (TMalign parameter_set4final)
+    d0 = 0.5 if L <= 21 else max(1.24*(L - 15)**(1/3) - 1.8, 0.5)
+    d0_search = min(max(d0, 4.5), 8.0)
+    return d0, d0_search
+
+
+def _select_close_pairs(dist2, d, min_pairs=3):
+    # pairs closer than d, d grows by 0.5 for rows with fewer than min_pairs pairs
+    n = dist2.shape[-1]
+    cutoff = np.full(dist2.shape[:-1], float(d))
+    mask = dist2 < (cutoff**2)[..., None]
+    if n > min_pairs:
+        too_few = mask.sum(-1) < min_pairs
+        while too_few.any():
+            cutoff[too_few] += 0.5
+            mask[too_few] = dist2[too_few] < (cutoff[too_few]**2)[..., None]
+            too_few = mask.sum(-1) < min_pairs
+    return mask
+
+
+def tm_score_search(xa, ya, Lnorm, d0, d0_search, score_d8=None, simplify_step=40, n_iter=20):
+    ''' Finds the superposition maximizing the TM-score of the aligned pairs (xa[k], ya[k])
+            starting from fragments of the alignment (TMalign TMscore8_search),
+            all fragment seeds are refined together as one batch. The superposition
+            only depends on the selected pairs, so seeds that reach the same
+            selection are merged and only the best score over all selections is kept
+        Input:
+            xa, ya: (n_ali, 3) aligned coords
+            Lnorm: length the TM-score is normalized by
+            score_d8: if given, only pairs closer than score_d8 add to the score
+        Output:
+            best TM-score, R, t (superposition of xa onto ya)
+    '''
+    n_ali = xa.shape[0]
+    if n_ali == 0:
+        return 0.0, np.eye(3), np.zeros(3)
+    L_min = min(n_ali, 4)
+    fragment_lengths = []
+    for i in range(6):
+        L = n_ali // (2**i)
+        if (L <= L_min) or (i == 5):
+            fragment_lengths.append(L_min)
+            break
+        fragment_lengths.append(L)
+    seeds = []
+    for L in fragment_lengths:
+        starts = list(range(0, n_ali - L + 1, simplify_step))
+        if starts[-1] != n_ali - L:
+            starts.append(n_ali - L)
+        seeds += [(start, L) for start in starts]
+    mask = np.zeros((len(seeds), n_ali), dtype=bool)
+    for s, (start, L) in enumerate(seeds):
+        mask[s, start:start + L] = True
+
+    d02 = d0**2
+    def score(R, t):
+        dist2 = ((transform(xa, R, t) - ya)**2).sum(-1)
+        terms = 1.0/(1.0 + dist2/d02)
+        if score_d8 is not None:
+            terms = terms*(dist2 <= score_d8**2)
+        return terms.sum(-1)/Lnorm, dist2
+
+    best_score, best_R, best_t = -1.0, None, None
+    for it in range(n_iter + 1):
+        R, t = kabsch(xa, ya, mask)
+        scores, dist2 = score(R, t)
+        best = int(np.argmax(scores))
+        if scores[best] > best_score:
+            best_score, best_R, best_t = float(scores[best]), R[best], t[best]
+        if it == 0:
+            # first selection after superposing the fragments
+            new_mask = _select_close_pairs(dist2, d0_search - 1)
+        else:
+            new_mask = _select_close_pairs(dist2, d0_search + 1)
+            # seeds whose selection did not change have converged
+            new_mask = new_mask[(new_mask != mask).any(-1)]
+        if new_mask.shape[0] == 0:
+            break
+        unique_rows = {row.tobytes(): ix for ix, row in enumerate(np.packbits(new_mask, axis=-1))}
+        mask = new_mask[list(unique_rows.values())]
+    return best_score, best_R, best_t
+
+
+def nw_align(score, gap_open):
+    ''' Needleman-Wunsch DP of TMalign (NWDP_TM): opening a gap after an aligned
+            pair costs gap_open, extending a gap is free, leading gaps are free.
+            Cells are filled one anti-diagonal at a time, so each step is a
+            numpy op over a whole diagonal of every matrix in the batch
+        Input:
+            score: (..., xlen, ylen) pair scores
+        Output:
+            invmap: (..., ylen) int array, invmap[j] = i if y_j is aligned to x_i else -1
+    '''
+    batch_shape = score.shape[:-2]
+    xlen, ylen = score.shape[-2:]
+    score = score.reshape(-1, xlen, ylen)
+    B = score.shape[0]
+    # cell (i, j) of the (xlen+1, ylen+1) DP matrices is stored at [i+j, i]
+    n_diag = xlen + ylen + 1
+    val = np.zeros((B, n_diag, xlen + 1))
+    path = np.zeros((B, n_diag, xlen + 1), dtype=bool) # True if (i, j) was reached by aligning x_i to y_j
+    offer = np.zeros((B, n_diag, xlen + 1)) # val + gap_open*path, what (i, j) offers to a gap step from it
+    skewed_score = np.zeros((B, n_diag, xlen + 1))
+    ii, jj = np.meshgrid(np.arange(1, xlen + 1), np.arange(1, ylen + 1), indexing='ij')
+    skewed_score[:, ii + jj, ii] = score
+    for k in range(2, n_diag):
+        lo, hi = max(1, k - ylen), min(xlen, k - 1) + 1
+        d = val[:, k-2, lo-1:hi-1] + skewed_score[:, k, lo:hi]
+        gap = np.maximum(offer[:, k-1, lo-1:hi-1], offer[:, k-1, lo:hi]) # best of (i-1, j) and (i, j-1)
+        aligned = d >= gap
+        val[:, k, lo:hi] = np.where(aligned, d, gap)
+        offer[:, k, lo:hi] = val[:, k, lo:hi] + gap_open*aligned
+        path[:, k, lo:hi] = aligned
+
+    invmap = np.full((B, ylen), -1)
+    for b in range(B):
+        i, j = xlen, ylen
+        while (i > 0) and (j > 0):
+            if path[b, i+j, i]:
+                invmap[b, j-1] = i-1
+                i, j = i-1, j-1
+                continue
+            if offer[b, i+j-1, i] >= offer[b, i+j-1, i-1]: # v >= h
+                j = j-1
+            else:
+                i = i-1
+    return invmap.reshape(batch_shape + (ylen,))
+
+
+def assign_secondary_structure(x):
+    # 1 coil, 2 helix, 3 turn, 4 strand from CA distances of residues i-2..i+2 (TMalign make_sec)
+    ss = np.ones(x.shape[0], dtype=int)
+    if x.shape[0] < 5:
+        return ss
+    a, b, c, d, e = x[:-4], x[1:-3], x[2:-2], x[3:-1], x[4:]
+    dist = lambda p, q: np.sqrt(((p - q)**2).sum(-1))
+    d13, d14, d15 = dist(a, c), dist(a, d), dist(a, e)
+    d24, d25, d35 = dist(b, d), dist(b, e), dist(c, e)
+    def near(targets, delta):
+        dists = (d15, d14, d25, d13, d24, d35)
+        return np.all([np.abs(dd - tt) < delta for dd, tt in zip(dists, targets)], axis=0)
+    helix = near((6.37, 5.18, 5.18, 5.45, 5.45, 5.45), 2.1)
+    strand = near((13.0, 10.4, 10.4, 6.1, 6.1, 6.1), 1.42)
+    turn = d15 < 8.0
+    ss[2:-2] = np.where(helix, 2, np.where(strand, 4, np.where(turn, 3, 1)))
+    return ss
+
+
+def _aligned_pairs(x, y, invmap):
+    js = np.nonzero(invmap >= 0)[0]
+    return x[invmap[js]], y[js]
+
+
+def _pair_dist2(x, y, R, t):
+    # (..., xlen, ylen) squared distances between superposed x and y
+    xt = transform(x, R, t)
+    dist2 = (xt**2).sum(-1)[..., :, None] + (y**2).sum(-1)[..., None, :] - 2*xt @ np.swapaxes(y, -1, -2)
+    return np.maximum(dist2, 0.0)
+
+
+def _score_fast(x, y, invmaps, d0, d0_search):
+    ''' Quick TM-score estimate used to rank a batch of initial alignments (TMalign get_score_fast):
+            superpose on all aligned pairs, then twice more on the close pairs only
+        Input:
+            invmaps: (B, ylen) alignments of y to x
+        Output:
+            (B,) unnormalized scores
+    '''
+    valid = invmaps >= 0
+    n_ali = valid.sum(-1)
+    xa = x[np.clip(invmaps, 0, x.shape[0] - 1)]
+    d02 = d0**2
+    def scores_for(mask):
+        R, t = kabsch(xa, y, mask)
+        dist2 = ((transform(xa, R, t) - y)**2).sum(-1)
+        return ((1.0/(1.0 + dist2/d02))*valid).sum(-1), np.where(valid, dist2, np.inf)
+    scores, dist2 = scores_for(valid)
+    for cutoff2 in (d0_search**2, d0_search**2 + 1):
+        cutoff2 = np.full(invmaps.shape[0], cutoff2)
+        mask = dist2 <= cutoff2[:, None]
+        too_few = (mask.sum(-1) < 3) & (n_ali > 3)
+        while too_few.any():
+            cutoff2[too_few] += 0.5
+            mask = dist2 <= cutoff2[:, None]
+            too_few = (mask.sum(-1) < 3) & (n_ali > 3)
+        new_scores, dist2 = scores_for(mask)
+        scores = np.maximum(scores, new_scores)
+    return scores
+
+
+def _initial_gapless(x, y, d0, d0_search):
+    # best gapless threading of y along x (TMalign get_initial), all shifts scored as one batch
+    xlen, ylen = x.shape[0], y.shape[0]
+    min_ali = max(min(xlen, ylen)//2, 5)
+    shifts = np.arange(min_ali - ylen, xlen - min_ali + 1)
+    x_idx = np.arange(ylen)[None, :] + shifts[:, None]
+    invmaps = np.where((x_idx >= 0) & (x_idx < xlen), x_idx, -1)
+    scores = _score_fast(x, y, invmaps, d0, d0_search)
+    # ties go to the last shift, like TMalign
+    return invmaps[len(scores) - 1 - int(np.argmax(scores[::-1]))]
+
+
+def _initial_local_superposition(x, y, d0, d0_search, max_dp_cells=2_000_000):
+    # alignments from superposing fragments of x and y (TMalign get_initial5), None if the chains are too short
+    xlen, ylen = x.shape[0], y.shape[0]
+    def jump(L):
+        n_jump = 45 if L > 250 else 35 if L > 200 else 25 if L > 150 else 15
+        return min(n_jump, L//3)
+    n_jump1, n_jump2 = jump(xlen), jump(ylen)
+    if (n_jump1 < 1) or (n_jump2 < 1):
+        return None
+    aL = min(xlen, ylen)
+    d01 = d0 + 1.5
+    # fragment pairs are aligned in chunks of at most max_dp_cells DP cells
+    chunk_size = max(1, max_dp_cells//((xlen + ylen + 1)*(xlen + 1)))
+    invmaps = []
+    for n_frag in (min(20, aL//3), min(100, aL//2)):
+        if n_frag < 1:
+            continue
+        starts = [(i, j) for i in range(0, xlen - n_frag + 1, n_jump1) for j in range(0, ylen - n_frag + 1, n_jump2)]
+        for chunk in range(0, len(starts), chunk_size):
+            chunk_starts = starts[chunk:chunk + chunk_size]
+            x_frags = np.stack([x[i:i + n_frag] for i, _ in chunk_starts])
+            y_frags = np.stack([y[j:j + n_frag] for _, j in chunk_starts])
+            R, t = kabsch(x_frags, y_frags, np.ones(x_frags.shape[:-1]))
+            invmaps.append(nw_align(1.0/(1.0 + _pair_dist2(x, y, R, t)/d01**2), 0.0))
+    if len(invmaps) == 0:
+        return None
+    invmaps = np.concatenate(invmaps)
+    scores = _score_fast(x, y, invmaps, d0, d0_search)
+    return invmaps[int(np.argmax(scores))]
+
+
+def _find_max_fragment(x, dcu0=4.25):
+    ''' Longest run of consecutive residues of x whose neighbouring CAs are closer than dcu0 
+            (TMalign find_max_frag), the cutoff grows by 10% until the run has at least 
+            min(4, len(x)//3) residues 
+        Output:
+            start, end (inclusive) of the run
+    '''
+    L = x.shape[0]
+    r_min = min(int(L/3.0), 4)
+    linked = ((x[1:] - x[:-1])**2).sum(-1)
+    inc = 0
+    dcu_cut = dcu0**2
+    while True:
+        best_len, best_start, best_end = 0, 0, 0
+        run, start = 1, 0
+        for i in range(1, L):
+            if linked[i-1] < dcu_cut:
+                run += 1
+                if i == L - 1:
+                    if run > best_len:
+                        best_len, best_start, best_end = run, start, i
+                    run = 1
+            else:
+                if run > best_len:
+                    best_len, best_start, best_end = run, start, i - 1
+                run, start = 1, i
+        if best_len >= r_min:
+            return best_start, best_end
+        inc += 1
+        dcu_cut = (1.1**inc*dcu0)**2
+
+
+def _initial_fragment_gapless(x, y, d0, d0_search):
+    # gapless threading of the longest unbroken fragment of the shorter chain along the other chain 
+    #   (TMalign get_initial_fgt), all shifts scored as one batch
+    xlen, ylen = x.shape[0], y.shape[0]
+    xstart, xend = _find_max_fragment(x)
+    ystart, yend = _find_max_fragment(y)
+    Lx, Ly = xend - xstart + 1, yend - ystart + 1
+    thread_x = (Lx < Ly) or ((Lx == Ly) and (xlen <= ylen))
+    L_fr = min(Lx, Ly)
+    ifr = np.arange(L_fr) + (xstart if thread_x else ystart)
+    L0 = min(xlen, ylen)
+    if L_fr == L0:
+        # the whole chain, drop its ends so this differs from _initial_gapless 
+        ifr = ifr[int(L0*0.1):int(L0*0.89) + 1]
+        L_fr = len(ifr)
+    if thread_x:
+        min_ali = int(0.1*min(L_fr, ylen))
+        shifts = np.arange(min_ali - ylen, L_fr - min_ali + 1)
+        fr_idx = np.arange(ylen)[None, :] + shifts[:, None]
+        invmaps = np.where((fr_idx >= 0) & (fr_idx < L_fr), ifr[np.clip(fr_idx, 0, L_fr - 1)], -1)
+    else:
+        min_ali = int(0.1*min(xlen, L_fr))
+        shifts = np.arange(min_ali - L_fr, xlen - min_ali + 1)
+        x_idx = np.arange(L_fr)[None, :] + shifts[:, None]
+        invmaps = np.full((len(shifts), ylen), -1)
+        invmaps[:, ifr] = np.where((x_idx >= 0) & (x_idx < xlen), x_idx, -1)
+    scores = _score_fast(x, y, invmaps, d0, d0_search)
+    # ties go to the last shift, like TMalign
+    return invmaps[len(scores) - 1 - int(np.argmax(scores[::-1]))]
+
+
+def tm_align(x, y):
+    ''' Input:
+            x, y: (xlen, 3), (ylen, 3) CA coords of the two structures (at least 5 residues each)
+        Output:
+            TM-score normalized by xlen, TM-score normalized by ylen, invmap (alignment of y to x)
+    '''
+    xlen, ylen = x.shape[0], y.shape[0]
+    Lnorm, d0, d0_search, score_d8 = search_params(xlen, ylen)
+    d02 = d0**2
+    ddcc = 0.1 if Lnorm <= 40 else 0.4
+    ss_x, ss_y = assign_secondary_structure(x), assign_secondary_structure(y)
+    ss_match = (ss_x[:, None] == ss_y[None, :]).astype(np.float64)
+
+    def search(invmap, simplify_step=40):
+        xa, ya = _aligned_pairs(x, y, invmap)
+        return tm_score_search(xa, ya, Lnorm, d0, d0_search, score_d8=score_d8, simplify_step=simplify_step)
+
+    best_tm, best_invmap = -1.0, None
+    def consider(tm, invmap):
+        nonlocal best_tm, best_invmap
+        if tm > best_tm:
+            best_tm, best_invmap = tm, invmap
+
+    def dp_iter(R, t, max_iter, gap_opens=(-0.6, 0.0)):
+        # alternate DP on the current superposition and TM-score search (TMalign DP_iter),
+        #   the superposition carries over from one gap penalty to the next
+        for gap_open in gap_opens:
+            tm_old = None
+            for _ in range(max_iter):
+                invmap = nw_align(1.0/(1.0 + _pair_dist2(x, y, R, t)/d02), gap_open)
+                tm, R, t = search(invmap)
+                consider(tm, invmap)
+                if (tm_old is not None) and (abs(tm - tm_old) < 1e-6):
+                    break
+                tm_old = tm
+
+    # gapless threading
+    invmap = _initial_gapless(x, y, d0, d0_search)
+    tm, R, t = search(invmap)
+    consider(tm, invmap)
+    dp_iter(R, t, max_iter=30)
+    # secondary structure alignment
+    invmap = nw_align(ss_match, -1.0)
+    tm, R, t = search(invmap)
+    consider(tm, invmap)
+    if tm > 0.2*best_tm:
+        dp_iter(R, t, max_iter=30)
+    # local superposition of fragments
+    invmap = _initial_local_superposition(x, y, d0, d0_search)
+    if invmap is not None:
+        tm, R, t = search(invmap)
+        consider(tm, invmap)
+        if tm > ddcc*best_tm:
+            dp_iter(R, t, max_iter=2)
+    # secondary structure plus superposition of the best alignment so far
+    xa, ya = _aligned_pairs(x, y, best_invmap)
+    R, t = kabsch(xa, ya, np.ones(xa.shape[0]))
+    d01 = d0 + 1.5
+    invmap = nw_align(1.0/(1.0 + _pair_dist2(x, y, R, t)/d01**2) + 0.5*ss_match, -1.0)
+    tm, R, t = search(invmap)
+    consider(tm, invmap)
+    if tm > ddcc*best_tm:
+        dp_iter(R, t, max_iter=30)
+    # fragment gapless threading
+    invmap = _initial_fragment_gapless(x, y, d0, d0_search)
+    tm, R, t = search(invmap)
+    consider(tm, invmap)
+    if tm > ddcc*best_tm:
+        dp_iter(R, t, max_iter=2, gap_opens=(0.0,))
+
+    # final scores on the aligned pairs closer than score_d8 after a detailed search
+    xa, ya = _aligned_pairs(x, y, best_invmap)
+    _, R, t = tm_score_search(xa, ya, Lnorm, d0, d0_search, score_d8=score_d8, simplify_step=1)
+    close = ((transform(xa, R, t) - ya)**2).sum(-1) <= score_d8**2
+    xa, ya = xa[close], ya[close]
+    tm_scores = []
+    for L in (xlen, ylen):
+        d0_final, d0_search_final = final_params(L)
+        tm, _, _ = tm_score_search(xa, ya, L, d0_final, d0_search_final, simplify_step=1)
+        tm_scores.append(tm)
+    return tm_scores[0], tm_scores[1], best_invmap
+
+
+def cal_tm_score_native(folded_pdb, target_pdb):
+    # same score as get_tm.cal_tm_score (min of the two normalized TM-scores) without TMalign
+    return cal_tm_scores_native([folded_pdb], target_pdb)[0]
+
+
+def cal_tm_scores_native(folded_pdbs, target_pdb):
+    ''' Input:
+            folded_pdbs: list of pdb paths or pdb text (None for failed folds)
+            target_pdb: path or pdb text of the target, parsed once for the whole batch
+        Output:
+            list of TM-scores (np.nan where a structure could not be scored)
+    '''
+    target_coords = parse_ca_coords(target_pdb) if isinstance(target_pdb, str) else target_pdb
+    scores = []
+    for folded_pdb in folded_pdbs:
+        if folded_pdb is None:
+            scores.append(np.nan)
+            continue
+        folded_coords = parse_ca_coords(folded_pdb)
+        if min(folded_coords.shape[0], target_coords.shape[0]) < 5:
+            # too short to align, TMalign reports no score
+            scores.append(np.nan)
+            continue
+        tm1, tm2, _ = tm_align(folded_coords, target_coords)
+        scores.append(min(tm1, tm2))
+    return scores
+
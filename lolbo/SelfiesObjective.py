@@ -4,7 +4,9 @@ import selfies as sf
 from lolbo.utils.mol_utils.selfies_vae.model_positional_unbounded import SELFIESDataset, InfoTransformerVAE
 from lolbo.utils.mol_utils.selfies_vae.data import collate_fn
 from lolbo.latent_space_objective import LatentSpaceObjective
-from lolbo.utils.mol_utils.mol_utils import GUACAMOL_TASK_NAMES
+from lolbo.utils.score_store import SqliteScoreStore
+from lolbo.utils.oracle_pool import maybe_wrap_in_oracle_pool
+from lolbo.utils.mol_utils.mol_utils import GUACAMOL_TASK_NAMES, canonicalize_smiles
 from your_tasks.your_objective_functions import OBJECTIVE_FUNCTIONS_DICT
 
 
@@ -31,13 +33,23 @@ class SelfiesObjective(LatentSpaceObjective):
         constraint_function_ids=[], # list of strings identifying the black box constraint function to use
         constraint_thresholds=[], # list of corresponding threshold values (floats)
         constraint_types=[], # list of strings giving correspoding type for each threshold ("min" or "max" allowed)
-        dim = 256
+        dim = 256,
+        score_store_path=None, # optional sqlite file used to share oracle scores across runs
+        num_oracle_workers=1, # number of xs scored concurrently by the oracle
+        oracle_executor="thread", # "thread" or "process" pool used when num_oracle_workers > 1
+        oracle_timeout=None, # max seconds for one oracle call once it starts running (None --> no limit)
+        num_scoring_workers=1, # number of processes the molecule objective uses to score each batch of smiles
     ):
         # we only want guacamol tasks right now
         assert task_specific_args in GUACAMOL_TASK_NAMES + ["logp"]
         print("task_specific_args:", task_specific_args)
         self.task_specific_args = task_specific_args
-        self.objective_function = OBJECTIVE_FUNCTIONS_DICT[task_id](self.task_specific_args)
+        self.objective_function = maybe_wrap_in_oracle_pool(
+            OBJECTIVE_FUNCTIONS_DICT[task_id](self.task_specific_args, num_workers=num_scoring_workers),
+            num_oracle_workers=num_oracle_workers,
+            oracle_executor=oracle_executor,
+            oracle_timeout=oracle_timeout,
+        )
 
 
         self.dim                    = 256 # SELFIES VAE DEFAULT LATENT SPACE DIM
@@ -45,10 +57,15 @@ class SelfiesObjective(LatentSpaceObjective):
         self.max_string_length      = max_string_length # max string length that VAE can generate
         self.smiles_to_selfies      = smiles_to_selfies # dict to hold computed mappings form smiles to selfies strings
         self.constraint_functions       = []
+
+        score_store = None
+        if score_store_path is not None:
+            score_store = SqliteScoreStore(score_store_path, task_id, self.task_specific_args)
         super().__init__(
             num_calls=num_calls,
             xs_to_scores_dict=xs_to_scores_dict,
             task_id=task_id,
+            score_store=score_store,
         )
         
 
@@ -79,6 +96,12 @@ class SelfiesObjective(LatentSpaceObjective):
         return decoded_smiles
 
 
+    def canonicalize(self, x):
+        ''' Different smiles strings of the same molecule 
+            share one score (one oracle call) '''
+        return canonicalize_smiles(x)
+
+
     def query_oracle(self, x):
         ''' Input: 
                 a  list  input space item x
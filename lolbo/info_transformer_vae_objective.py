@@ -3,6 +3,8 @@ import torch
 import sys 
 sys.path.append("../")
 from lolbo.latent_space_objective import LatentSpaceObjective
+from lolbo.utils.score_store import SqliteScoreStore
+from lolbo.utils.oracle_pool import maybe_wrap_in_oracle_pool
 from uniref_vae.data import collate_fn
 from uniref_vae.load_vae import load_vae 
 from your_tasks.your_objective_functions import OBJECTIVE_FUNCTIONS_DICT
@@ -25,13 +27,22 @@ class InfoTransformerVAEObjective(LatentSpaceObjective):
         constraint_types=[], # list of strings giving correspoding type for each threshold ("min" or "max" allowed)
         xs_to_scores_dict={},
         num_calls=0,
+        score_store_path=None, # optional sqlite file used to share oracle scores across runs
+        num_oracle_workers=1, # number of xs scored concurrently by the oracle
+        oracle_executor="thread", # "thread" or "process" pool used when num_oracle_workers > 1
+        oracle_timeout=None, # max seconds for one oracle call once it starts running (None --> no limit)
     ):
         self.dim                        = dim 
         self.max_string_length          = max_string_length 
         self.path_to_vae_statedict      = path_to_vae_statedict
         self.task_specific_args         = task_specific_args
 
-        self.objective_function = OBJECTIVE_FUNCTIONS_DICT[task_id](*self.task_specific_args)
+        self.objective_function = maybe_wrap_in_oracle_pool(
+            OBJECTIVE_FUNCTIONS_DICT[task_id](*self.task_specific_args),
+            num_oracle_workers=num_oracle_workers,
+            oracle_executor=oracle_executor,
+            oracle_timeout=oracle_timeout,
+        )
 
         self.constraint_functions       = []
         for ix, constraint_threshold in enumerate(constraint_thresholds):
@@ -42,11 +53,16 @@ class InfoTransformerVAEObjective(LatentSpaceObjective):
             )
             self.constraint_functions.append(cfunc) 
 
+        score_store = None
+        if score_store_path is not None:
+            score_store = SqliteScoreStore(score_store_path, task_id, self.task_specific_args)
+
         super().__init__(
             num_calls=num_calls,
             xs_to_scores_dict=xs_to_scores_dict,
             task_id=task_id,
             init_vae=init_vae,
+            score_store=score_store,
         )
 
     def vae_decode(self, z):
@@ -1,5 +1,7 @@
 import numpy as np
 import torch 
+from concurrent.futures import Future
+from lolbo.utils.oracle_pool import OraclePool
 
 
 class LatentSpaceObjective:
@@ -16,9 +18,22 @@ class LatentSpaceObjective:
         num_calls=0,
         task_id='',
         init_vae=True,
+        score_store=None,
     ):
         # dict used to track xs and scores (ys) queried during optimization
         self.xs_to_scores_dict = xs_to_scores_dict 
+
+        # optional persistent store (see lolbo/utils/score_store.py) 
+        #   shared across runs, consulted before calling the oracle
+        self.score_store = score_store
+
+        # memo table x --> canonical_key(x), the keys of xs_to_scores_dict 
+        #   (see canonicalize(), i.e. one key for all smiles strings of a molecule)
+        self.canonical_keys = {}
+
+        # canonical key --> future of its score, for xs submitted to 
+        #   the oracle whose batch has not been collected yet (see submit())
+        self.in_flight_futures = {}
         
         # track total number of times the oracle has been called
         self.num_calls = num_calls
@@ -43,33 +58,100 @@ class LatentSpaceObjective:
                 out_dict['scores']: an array of valid scores obtained from input zs
                 out_dict['constr_vals']: an array of constraint values or none if unconstrained
         '''
+        return self.collect(self.submit(z))
+
+
+    def submit(self, z):
+        ''' Decodes z and submits the uncached xs to the oracle 
+            without waiting on the scores 
+            Input 
+                z: a numpy array or pytorch tensor of latent space points
+            Output
+                pending: dict passed to collect() to get the out_dict of __call__
+        '''
         if type(z) is np.ndarray: 
             z = torch.from_numpy(z).float()
         decoded_xs = self.vae_decode(z)
+        keys = [self.canonical_key(x) for x in decoded_xs]
+        if self.score_store is not None:
+            # pull in scores already computed by earlier or parallel runs
+            self.xs_to_scores_dict.update(self.score_store.lookup(
+                [key for key in keys if key not in self.xs_to_scores_dict]
+            ))
         scores = []
         xs_to_be_queired = [] 
-        for x in decoded_xs:
+        keys_to_be_queired = {} # canonical key --> index into xs_to_be_queired
+        in_flight_futures = {} # canonical key --> future, for xs already submitted by an earlier pending batch
+        for x, key in zip(decoded_xs, keys):
             # get rid of X's (deletion)
             # if we have already computed the score, don't 
             #   re-compute (don't call oracle unnecessarily)
-            if x in self.xs_to_scores_dict:
-                score = self.xs_to_scores_dict[x]
+            if key in self.xs_to_scores_dict:
+                score = self.xs_to_scores_dict[key]
             else: # otherwise call the oracle to get score
                 score = "?"
-                xs_to_be_queired.append(x)
+                if key in self.in_flight_futures:
+                    # still being scored for an earlier batch, wait on that call instead
+                    in_flight_futures[key] = self.in_flight_futures[key]
+                # equivalent xs in one batch are only scored once
+                elif key not in keys_to_be_queired:
+                    keys_to_be_queired[key] = len(xs_to_be_queired)
+                    xs_to_be_queired.append(x)
             scores.append(score)
-        
-        computed_scores = self.query_oracle(xs_to_be_queired)
+
+        pending = {}
+        pending['z'] = z
+        pending['decoded_xs'] = decoded_xs
+        pending['keys'] = keys
+        pending['scores'] = scores
+        pending['xs_to_be_queired'] = xs_to_be_queired
+        pending['keys_to_be_queired'] = keys_to_be_queired
+        pending['futures'] = self.submit_oracle(xs_to_be_queired)
+        pending['in_flight_futures'] = in_flight_futures
+        for key, ix in keys_to_be_queired.items():
+            self.in_flight_futures[key] = pending['futures'][ix]
+
+        return pending
+
+
+    def ready(self, pending):
+        ''' True iff all oracle calls of a submitted batch have finished '''
+        futures = pending['futures'] + list(pending['in_flight_futures'].values())
+        return all(future.done() for future in futures)
+
+
+    def collect(self, pending):
+        ''' Waits on the oracle calls of a batch returned by submit()
+            and returns the out_dict described in __call__
+        '''
+        z = pending['z']
+        decoded_xs = pending['decoded_xs']
+        keys = pending['keys']
+        scores = pending['scores']
+        keys_to_be_queired = pending['keys_to_be_queired']
+        computed_scores = self.gather_oracle(pending['futures'])
+        in_flight_scores = dict(zip(
+            pending['in_flight_futures'].keys(),
+            self.gather_oracle(list(pending['in_flight_futures'].values())),
+        ))
+        for key in keys_to_be_queired:
+            self.in_flight_futures.pop(key, None)
+        # nans of oracle calls that raised or timed out say nothing about x,
+        #   they are not cached so x can be scored again later
+        cached_keys = [key for key, ix in keys_to_be_queired.items() if pending['futures'][ix].exception() is None]
+        if self.score_store is not None:
+            self.score_store.insert(cached_keys, [computed_scores[keys_to_be_queired[key]] for key in cached_keys])
+        # add scores to dict so we don't have to
+        #   compute them again if we get the same (or an equivalent) input x
+        for key in cached_keys:
+            self.xs_to_scores_dict[key] = computed_scores[keys_to_be_queired[key]]
         # move computed scores to scores list 
         temp = [] 
-        ix = 0
-        for score in scores:
-            if score == "?":
-                temp.append(computed_scores[ix]) 
-                # add score to dict so we don't have to
-                #   compute it again if we get the same input x
-                self.xs_to_scores_dict[xs_to_be_queired[ix]] = computed_scores[ix]
-                ix += 1
+        for score, key in zip(scores, keys):
+            if (score == "?") and (key in in_flight_scores):
+                temp.append(in_flight_scores[key])
+            elif score == "?":
+                temp.append(computed_scores[keys_to_be_queired[key]]) 
             else:
                 temp.append(score)
         scores = temp 
@@ -98,6 +180,57 @@ class LatentSpaceObjective:
         return out_dict
 
 
+    def submit_oracle(self, xs):
+        ''' Input: 
+                a list of input space items xs
+            Output:
+                a list of futures holding the scores of xs,
+                scores are computed concurrently when self.objective_function
+                is an OraclePool and right away with query_oracle() otherwise
+        '''
+        objective_function = getattr(self, "objective_function", None)
+        if isinstance(objective_function, OraclePool):
+            return objective_function.submit(xs)
+        futures = []
+        for score in self.query_oracle(xs):
+            future = Future()
+            future.set_result(score)
+            futures.append(future)
+
+        return futures
+
+
+    def gather_oracle(self, futures):
+        ''' Waits on futures returned by submit_oracle(), returns list of scores '''
+        objective_function = getattr(self, "objective_function", None)
+        if isinstance(objective_function, OraclePool):
+            return objective_function.gather(futures)
+        return [future.result() for future in futures]
+
+
+    def canonical_key(self, x):
+        ''' Key of x in xs_to_scores_dict, the score store and the top k
+            (memoized canonicalize(x)) '''
+        if not isinstance(x, str):
+            return self.canonicalize(x)
+        key = self.canonical_keys.get(x)
+        if key is None:
+            key = self.canonicalize(x)
+            self.canonical_keys[x] = key
+        return key
+
+
+    def canonicalize(self, x):
+        ''' Input: 
+                an input space item x
+            Output:
+                canonical form of x, xs with the same canonical form 
+                are treated as the same x and only scored by the oracle once
+                (identity by default, override i.e. with canonical smiles for molecules)
+        '''
+        return x
+
+
     def vae_decode(self, z):
         '''Input
                 z: a tensor latent space points
@@ -1,6 +1,5 @@
 import torch
 import gpytorch
-import math
 from gpytorch.mlls import PredictiveLogLikelihood 
 import sys 
 sys.path.append("../")
@@ -9,13 +8,21 @@ from lolbo.utils.utils import (
     update_surr_model, 
     update_constraint_surr_models,
     update_models_end_to_end_with_constraints,
+    token_budget_batches,
 )
 from lolbo.utils.bo_utils.ppgpr import GPModelDKL
+from lolbo.utils.growable_tensor import GrowableTensorAttribute, append_rows
+from lolbo.utils.top_k import TopK
 import numpy as np
 import os
 
 
 class LOLBOState:
+    # stored in preallocated buffers so appends in update_next 
+    #   don't copy the full history every step 
+    train_z = GrowableTensorAttribute()
+    train_y = GrowableTensorAttribute()
+    train_c = GrowableTensorAttribute()
 
     def __init__(
         self,
@@ -54,7 +61,7 @@ class LOLBOState:
         self.init_n_epochs      = init_n_epochs     # num epochs train surr model on initial data
         self.learning_rte       = learning_rte      # lr to use for model updates
         self.bsz                = bsz               # acquisition batch size
-        self.acq_func           = acq_func          # acquisition function (Expected Improvement (ei) or Thompson Sampling (ts))
+        self.acq_func           = acq_func          # acquisition function (Expected Improvement (ei), Thompson Sampling (ts) or pathwise Thompson Sampling (pathwise_ts))
         self.verbose            = verbose
         self.iterations         = iterations        #iterations counter for saving gp mean, vars, x_next
         self.accumulated_z_next = accumulated_z_next
@@ -65,7 +72,7 @@ class LOLBOState:
         self.recenter_history = recenter_history
         self.accumulated_recenter_history = accumulated_recenter_history
 
-        assert acq_func in ["ei", "ts"]
+        assert acq_func in ["ei", "ts", "pathwise_ts"]
         if minimize:
             self.train_y = self.train_y * -1
         self.ei_seen = 0
@@ -86,7 +93,7 @@ class LOLBOState:
         # put initial xs and ys in dict to be tracked by objective
         init_xs_to_scores_dict = {}
         for idx, x in enumerate(self.train_x):
-            init_xs_to_scores_dict[x] = self.train_y.squeeze()[idx].item()
+            init_xs_to_scores_dict[self.objective.canonical_key(x)] = self.train_y.squeeze()[idx].item()
         self.objective.xs_to_scores_dict = init_xs_to_scores_dict
 
 
@@ -104,36 +111,24 @@ class LOLBOState:
             valid_train_z = self.train_z
             valid_train_x = self.train_x 
 
+        # track top k scores found 
+        self.top_k = TopK(self.k, key=self.objective.canonical_key)
         if len(vaid_train_y) > 1:
             self.best_score_seen = torch.max(vaid_train_y)
             self.best_x_seen = valid_train_x[torch.argmax(vaid_train_y.squeeze())]
-
-            # track top k scores found 
-            self.top_k_scores, top_k_idxs = torch.topk(vaid_train_y.squeeze(), min(self.k, vaid_train_y.shape[0]))
-            self.top_k_scores = self.top_k_scores.tolist() 
-            top_k_idxs = top_k_idxs.tolist()
-            self.top_k_xs = [valid_train_x[i] for i in top_k_idxs]
-            self.top_k_zs = [valid_train_z[i].unsqueeze(-2) for i in top_k_idxs]
-            if self.train_c is not None: 
-                self.top_k_cs = [valid_train_c[i].unsqueeze(-2) for i in top_k_idxs]
+            top_k_scores, top_k_idxs = torch.topk(vaid_train_y.squeeze(), min(self.k, vaid_train_y.shape[0]))
+            for score, i in zip(top_k_scores.tolist(), top_k_idxs.tolist()):
+                c = valid_train_c[i] if self.train_c is not None else None
+                self.top_k.add(score, valid_train_x[i], valid_train_z[i], c)
         elif len(vaid_train_y) == 1:
             self.best_score_seen = vaid_train_y.item() 
-            self.best_x_seen = valid_train_x.item() 
-            self.top_k_scores = [self.best_score_seen]
-            self.top_k_xs = [self.best_x_seen]
-            self.top_k_zs = [valid_train_z] 
-            if self.train_c is not None: 
-                self.top_k_cs = [valid_train_c]
+            self.best_x_seen = valid_train_x[0] 
+            c = valid_train_c[0] if self.train_c is not None else None
+            self.top_k.add(self.best_score_seen, self.best_x_seen, valid_train_z[0], c)
         else:
             print("No valid init data according to constraint(s)")
             self.best_score_seen = None
             self.best_x_seen = None 
-            self.top_k_scores = []
-            self.top_k_xs = []
-            self.top_k_zs = []
-            # add self .ei scores and graph
-            if self.train_c is not None:
-                self.top_k_cs = []
 
 
     def initialize_tr_state(self):
@@ -226,22 +221,10 @@ class LOLBOState:
         for i, score in enumerate(y_next_):
             self.train_x.append(x_next_[i] )
             if valid_points[i]: # if y is valid according to constraints 
-                if len(self.top_k_scores) < self.k: 
-                    # if we don't yet have k top scores, add it to the list
-                    self.top_k_scores.append(score.item())
-                    self.top_k_xs.append(x_next_[i])
-                    self.top_k_zs.append(z_next_[i].unsqueeze(-2))
-                    if self.train_c is not None: # if constrained, update best constraints too
-                        self.top_k_cs.append(c_next_[i].unsqueeze(-2))
-                elif score.item() > min(self.top_k_scores) and (x_next_[i] not in self.top_k_xs):
-                    # if the score is better than the worst score in the top k list, upate the list
-                    min_score = min(self.top_k_scores)
-                    min_idx = self.top_k_scores.index(min_score)
-                    self.top_k_scores[min_idx] = score.item()
-                    self.top_k_xs[min_idx] = x_next_[i]
-                    self.top_k_zs[min_idx] = z_next_[i].unsqueeze(-2) # .to('cpu')
-                    if self.train_c is not None: # if constrained, update best constraints too
-                        self.top_k_cs[min_idx] = c_next_[i].unsqueeze(-2)
+                # add to top k if we don't yet have k points or if the score 
+                #   is better than the worst score in the top k (if constrained, track constraints too)
+                c = c_next_[i] if self.train_c is not None else None
+                self.top_k.add(score.item(), x_next_[i], z_next_[i], c)
                 #if this is the first valid example we've found, OR if we imporve 
                 if (self.best_score_seen is None) or (score.item() > self.best_score_seen):
                     self.progress_fails_since_last_e2e = 0
@@ -258,15 +241,17 @@ class LOLBOState:
                 Y_next=y_next_,
                 C_next=c_next_,
             )
-        self.train_z = torch.cat((self.train_z, z_next_), dim=-2)
-        self.train_y = torch.cat((self.train_y, y_next_), dim=-2)
+        append_rows(self, "train_z", z_next_)
+        append_rows(self, "train_y", y_next_)
         if c_next_ is not None:
-            self.train_c = torch.cat((self.train_c, c_next_), dim=-2)
+            append_rows(self, "train_c", c_next_)
 
         return self
 
 
-    def update_surrogate_model(self): 
+    def update_surrogate_model(self, n_new=None): 
+        ''' n_new: number of rows added to the train data since the last update
+                (None --> one acquisition batch, self.bsz) '''
         if not self.initial_model_training_complete:
             # first time training surr model --> train on all data
             n_epochs = self.init_n_epochs
@@ -274,12 +259,18 @@ class LOLBOState:
             train_y = self.train_y.squeeze(-1)
             train_c = self.train_c
         else:
-            # otherwise, only train on most recent batch of data
+            # otherwise, only train on the data added since the last update
+            if n_new is None:
+                n_new = self.bsz
+            n_new = min(n_new, self.train_z.shape[0])
+            if n_new == 0:
+                return self
+            start = self.train_z.shape[0] - n_new
             n_epochs = self.num_update_epochs
-            train_z = self.train_z[-self.bsz:]
-            train_y = self.train_y[-self.bsz:].squeeze(-1)
+            train_z = self.train_z[start:]
+            train_y = self.train_y[start:].squeeze(-1)
             if self.train_c is not None:
-                train_c = self.train_c[-self.bsz:]
+                train_c = self.train_c[start:]
             else:
                 train_c = None 
           
@@ -311,8 +302,8 @@ class LOLBOState:
         self.progress_fails_since_last_e2e = 0
         new_xs = self.train_x[-self.bsz:]
         new_ys = self.train_y[-self.bsz:].squeeze(-1).tolist()
-        train_x = new_xs + self.top_k_xs
-        train_y = torch.tensor(new_ys + self.top_k_scores).float()
+        train_x = new_xs + self.top_k.xs
+        train_y = torch.tensor(new_ys + self.top_k.scores).float()
 
         c_models = []
         c_mlls = []
@@ -321,13 +312,11 @@ class LOLBOState:
             c_models = self.c_models 
             c_mlls = self.c_mlls
             new_cs = self.train_c[-self.bsz:] 
-            # Note: self.top_k_cs is a list of (1, n_cons) tensors 
-            if len(self.top_k_cs) > 0:
-                top_k_cs_tensor = torch.cat(self.top_k_cs, -2).float() 
-                train_c = torch.cat((new_cs, top_k_cs_tensor), -2).float() 
+            # Note: self.top_k.cs_tensor() is a (n_top_k, n_cons) tensor 
+            if len(self.top_k) > 0:
+                train_c = torch.cat((new_cs, self.top_k.cs_tensor()), -2).float() 
             else:
                 train_c = new_cs 
-            # train_c = torch.tensor(new_cs + self.top_k_cs).float() 
 
         self.objective, self.model = update_models_end_to_end_with_constraints(
             train_x=train_x,
@@ -365,18 +354,15 @@ class LOLBOState:
                 optimize_list.append({f"params": c_model.parameters(), 'lr': self.learning_rte})
         optimizer1 = torch.optim.Adam(optimize_list, lr=self.learning_rte) 
         new_xs = self.train_x[-self.bsz:]
-        train_x = new_xs + self.top_k_xs
-        max_string_len = len(max(train_x, key=len))
-        # max batch size smaller to avoid memory limit 
-        #   with longer strings (more tokens) 
-        bsz = max(1, int(2560/max_string_len))
-        num_batches = math.ceil(len(train_x) / bsz) 
+        train_x = new_xs + self.top_k.xs
+        # bucket xs by length and cap padded tokens per batch 
+        #   to avoid memory limit with longer strings (more tokens) 
+        batches = token_budget_batches(train_x)
         for _ in range(self.num_update_epochs):
-            for batch_ix in range(num_batches):
+            for batch_idxs in batches:
                 optimizer1.zero_grad() 
                 with torch.no_grad(): 
-                    start_idx, stop_idx = batch_ix*bsz, (batch_ix+1)*bsz
-                    batch_list = train_x[start_idx:stop_idx] 
+                    batch_list = [train_x[ix] for ix in batch_idxs]
                     z, _ = self.objective.vae_forward(batch_list)
                     out_dict = self.objective(z)
                     scores_arr = out_dict['scores'] 
@@ -418,6 +404,15 @@ class LOLBOState:
         '''Generate new candidate points, 
         evaluate them, and update data
         '''
+        self.collect_acquisition(self.submit_acquisition())
+
+
+    def submit_acquisition(self, z_pending=None):
+        '''Generate new candidate points and submit them
+        to the oracle without waiting on the scores,
+        z_pending are candidates submitted earlier 
+        that have not been collected yet
+        '''
         # 1. Generate a batch of candidates in 
         #   trust region using surrogate model
         if self.train_c is not None: # if constrained 
@@ -432,11 +427,25 @@ class LOLBOState:
             batch_size=self.bsz, 
             acqf=self.acq_func,
             constraint_model_list=constraint_model_list,
+            X_pending=z_pending,
         )
-                  
-        # 2. Evaluate the batch of candidates by calling oracle
+        # 2. Submit the batch of candidates to the oracle
+        with torch.no_grad():
+            pending = self.objective.submit(z_next)
+        pending['mean'] = mean
+        pending['variance'] = variance
+        pending['ei'] = ei
+
+        return pending
+
+
+    def collect_acquisition(self, pending):
+        '''Wait on the scores of a batch returned by 
+        submit_acquisition() and update data
+        '''
+        mean, variance, ei = pending['mean'], pending['variance'], pending['ei']
         with torch.no_grad():
-            out_dict = self.objective(z_next)
+            out_dict = self.objective.collect(pending)
             z_next = out_dict['valid_zs']
             y_next = out_dict['scores']
             x_next = out_dict['decoded_xs']     
@@ -12,6 +12,7 @@ from botorch.generation.utils import _flip_sub_unique
 from botorch.models.model import Model
 from torch import Tensor
 from torch.nn import Module
+from .pathwise_sampling import draw_pathwise_samples
 
 
 # Code copied form botorch MaxPosteriorSampling class 
@@ -55,6 +56,7 @@ class MaxPosteriorSampling(SamplingStrategy):
         objective: Optional[AcquisitionObjective] = None,
         replacement: bool = True,
         constrained: bool = False,
+        pathwise: bool = False,
     ) -> None:
         r"""Constructor for the SamplingStrategy base class.
 
@@ -64,6 +66,8 @@ class MaxPosteriorSampling(SamplingStrategy):
                 the samples are evaluated. If a ScalarizedObjective, samples from the
                 scalarized posterior are used. Defaults to `IdentityMCObjective()`.
             replacement: If True, sample with replacement.
+            pathwise: If True, draw decoupled (pathwise) function samples instead of
+                joint posterior samples over X, cost is linear in the number of points in X.
         """
         super().__init__()
         self.model = model
@@ -73,6 +77,14 @@ class MaxPosteriorSampling(SamplingStrategy):
         self.replacement = replacement
         self.constraint_models = constraint_models
         self.constrained = constrained
+        self.pathwise = pathwise
+
+    def sample(self, model, X, num_samples, observation_noise=False):
+        r"""num_samples x N x 1 posterior samples of model at the N points in X"""
+        if self.pathwise:
+            return draw_pathwise_samples(model, num_samples)(X).unsqueeze(-1)
+        posterior = model.posterior(X, observation_noise=observation_noise)
+        return posterior.rsample(sample_shape=torch.Size([num_samples]))
 
     def forward(
         self, X: Tensor, num_samples: int = 1, observation_noise: bool = False, max_constr_val: int = 0,
@@ -89,10 +101,12 @@ class MaxPosteriorSampling(SamplingStrategy):
             A `batch_shape x num_samples x d`-dim Tensor of samples from `X`, where
             `X[..., i, :]` is the `i`-th sample.
         """
-        posterior = self.model.posterior(X, observation_noise=observation_noise)
         if isinstance(self.objective, ScalarizedObjective):
+            posterior = self.model.posterior(X, observation_noise=observation_noise)
             posterior = self.objective(posterior)
-        samples = posterior.rsample(sample_shape=torch.Size([num_samples]))
+            samples = posterior.rsample(sample_shape=torch.Size([num_samples]))
+        else:
+            samples = self.sample(self.model, X, num_samples, observation_noise=observation_noise)
 
         # SHAPES: (tested shapes in practice)
         #   X   =   N x d   =   torch.Size([5000, 256])
@@ -110,8 +124,7 @@ class MaxPosteriorSampling(SamplingStrategy):
             elif self.constraint_models is not None:
                 all_constraint_samples = []
                 for constr_model in self.constraint_models:
-                    constraint_posterior = constr_model.posterior(X, observation_noise=observation_noise)
-                    constr_samples = constraint_posterior.rsample(sample_shape=torch.Size([num_samples]))
+                    constr_samples = self.sample(constr_model, X, num_samples, observation_noise=observation_noise)
                     all_constraint_samples.append(constr_samples)
                 constraint_samples = torch.cat(all_constraint_samples, dim=-1) 
 
@@ -0,0 +1,91 @@
+import math
+import torch
+
+
+# Decoupled (pathwise) posterior function samples for the
+#   sparse variational GPs in ppgpr.py (GPModel, GPModelDKL)
+# Wilson et al. 2020, Efficiently Sampling Functions from Gaussian Process Posteriors
+#   https://arxiv.org/abs/2002.09309
+#
+#   f(x) = mean(x) + f_prior(x) + k(x, Z) K_ZZ^-1 (L u - f_prior(Z))
+#
+# f_prior is a random Fourier feature draw from the GP prior, Z are the inducing points,
+#   L = chol(K_ZZ) and u ~ q(u) is a draw from the (whitened) variational distribution.
+# Each function sample is then evaluated on N candidates in O(N (num_rff_features + M))
+#   without ever forming the N x N joint covariance over the candidates
+
+
+class PathwiseSamples:
+    '''num_samples functions drawn from the posterior of a single output
+        GPModel/GPModelDKL with a ScaleKernel(RBFKernel()) covariance
+        Calling it on X (N x d) returns the (num_samples x N) sampled function values'''
+
+    def __init__(
+        self,
+        model,
+        num_samples,
+        num_rff_features=1024,
+        jitter=1e-3, # same default jitter VariationalStrategy adds to K_ZZ
+    ):
+        self.model = model
+        self.feature_extractor = getattr(model, "feature_extractor", None)
+        covar_module = model.covar_module
+        self.outputscale = covar_module.outputscale.detach()
+        self.lengthscale = covar_module.base_kernel.lengthscale.detach()
+        variational_strategy = model.variational_strategy
+        self.inducing_points = variational_strategy.inducing_points.detach()
+        n_inducing, dim = self.inducing_points.shape
+        dtype, device = self.inducing_points.dtype, self.inducing_points.device
+
+        # random Fourier features of the rbf kernel: cos(x W / lengthscale + b)
+        self.rff_weights = torch.randn(dim, num_rff_features, dtype=dtype, device=device)
+        self.rff_bias = 2 * math.pi * torch.rand(num_rff_features, dtype=dtype, device=device)
+        self.rff_scale = torch.sqrt(2 * self.outputscale / num_rff_features)
+        # prior function weights, one column per function sample
+        self.prior_weights = torch.randn(num_rff_features, num_samples, dtype=dtype, device=device)
+
+        # u ~ q(u), inducing values in whitened space (num_samples x M)
+        u = variational_strategy.variational_distribution.rsample(torch.Size([num_samples])).detach()
+        K_zz = self.kernel(self.inducing_points, self.inducing_points)
+        K_zz = K_zz + jitter * torch.eye(n_inducing, dtype=dtype, device=device)
+        L = torch.linalg.cholesky(K_zz)
+        prior_at_z = self.prior_sample(self.inducing_points) # M x num_samples
+        # update weights K_ZZ^-1 (L u - f_prior(Z)) = L^-T (u - L^-1 f_prior(Z))
+        residual = u.T - torch.linalg.solve_triangular(L, prior_at_z, upper=False)
+        self.update_weights = torch.linalg.solve_triangular(L.T, residual, upper=True) # M x num_samples
+
+
+    def kernel(self, X1, X2):
+        dists = torch.cdist(X1 / self.lengthscale, X2 / self.lengthscale)
+        return self.outputscale * torch.exp(-0.5 * dists ** 2)
+
+
+    def prior_sample(self, X):
+        features = self.rff_scale * torch.cos((X / self.lengthscale) @ self.rff_weights + self.rff_bias)
+        return features @ self.prior_weights
+
+
+    @torch.no_grad()
+    def __call__(self, X, chunk_size=10_000):
+        all_samples = []
+        for start in range(0, X.shape[-2], chunk_size):
+            X_chunk = X[start:start + chunk_size]
+            if self.feature_extractor is not None:
+                X_chunk = self.feature_extractor(X_chunk)
+            mean = self.model.mean_module(X_chunk).reshape(-1, 1)
+            samples = mean + self.prior_sample(X_chunk) + self.kernel(X_chunk, self.inducing_points) @ self.update_weights
+            all_samples.append(samples)
+
+        return torch.cat(all_samples, dim=-2).T
+
+
+def draw_pathwise_samples(model, num_samples, num_rff_features=1024):
+    ''' Input:
+            model: fitted single output GPModel or GPModelDKL
+            num_samples: number of posterior function samples to draw
+        Output:
+            PathwiseSamples f, f(X) is a (num_samples x N) tensor
+    '''
+    model.eval()
+    with torch.no_grad():
+        return PathwiseSamples(model, num_samples, num_rff_features=num_rff_features)
@@ -148,20 +148,22 @@ def generate_batch(
     n_candidates=None,  # Number of candidates for Thompson sampling 
     num_restarts=10,
     raw_samples=256,
-    acqf="ei",  # "ei" or "ts"
+    acqf="ei",  # "ei", "ts" or "pathwise_ts" (ts with decoupled function samples, scales to many more candidates)
     dtype=torch.float32,
     device=torch.device('cpu'),
     absolute_bounds=None, 
     constraint_model_list=None,
+    X_pending=None, # points submitted to the oracle whose scores have not come back yet
 ):
 
-    assert acqf in ("ts", "ei")
+    assert acqf in ("ts", "ei", "pathwise_ts")
     if constraint_model_list is not None:
-        assert acqf == "ts" # SCBO only works with ts
+        assert acqf in ("ts", "pathwise_ts") # SCBO only works with ts
         constrained=True
     else:
         constrained=False
     assert torch.all(torch.isfinite(Y))
+    if (n_candidates is None) and (acqf == "pathwise_ts"): n_candidates = 50_000
     if n_candidates is None: n_candidates = min(5000, max(2000, 200 * X.shape[-1]))
 
     x_center = X[Y.argmax(), :].clone()  
@@ -179,12 +181,18 @@ def generate_batch(
 
     if acqf == "ei":
         try:
-            ei = qExpectedImprovement(model.to('cpu'), Y.max().to('cpu')) 
+            # pending points are fantasized over jointly with the new batch
+            #   so ei is not spent on points already being evaluated
+            if X_pending is not None:
+                X_pending = X_pending.to('cpu')
+            ei = qExpectedImprovement(model.to('cpu'), Y.max().to('cpu'), X_pending=X_pending) 
             X_next, ei_values = optimize_acqf(ei,bounds=torch.stack([tr_lb, tr_ub]).to('cpu'),q=batch_size, num_restarts=num_restarts,raw_samples=raw_samples,)
         except: 
             acqf = 'ts'
 
-    if acqf == "ts":
+    if acqf in ("ts", "pathwise_ts"):
+        # Note: X_pending is not needed here, each call draws a fresh
+        #   posterior sample on fresh candidates (asynchronous Thompson sampling)
         dim = X.shape[-1]
         tr_lb = tr_lb.to('cpu')
         tr_ub = tr_ub.to('cpu') 
@@ -212,6 +220,7 @@ def generate_batch(
             constraint_models=constraint_model_list,
             replacement=False,
             constrained=constrained,
+            pathwise=(acqf == "pathwise_ts"),
         ) 
         with torch.no_grad():
             X_next = thompson_sampling(X_cand.to('cpu'), num_samples=batch_size )
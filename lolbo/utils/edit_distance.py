@@ -0,0 +1,100 @@
+import math
+import numpy as np
+
+
+# Levenshtein edit distance with Myers' bit-vector algorithm
+#   (Myers 1999, A fast bit-vector algorithm for approximate string matching,
+#   in the global distance form of Hyyro 2001)
+#
+# One string is the pattern, held as a bit mask per character (peq),
+#   the column of the DP table over the pattern is encoded by its vertical
+#   +1/-1 deltas in two bit vectors (pv, mv) and each character of the other string
+#   updates the whole column with a handful of integer operations.
+# Python ints are arbitrary precision, so patterns of any length are one
+#   "machine word" and a distance costs O(len(text)) big int operations
+#   instead of O(len(pattern) * len(text)) interpreted DP cell updates
+
+
+def _pattern_masks(pattern):
+    ''' character --> bit mask of its positions in pattern '''
+    peq = {}
+    for i, char in enumerate(pattern):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    return peq
+
+
+def _bit_vector_distance(peq, m, text, tau=None):
+    ''' Edit distance between the length m pattern encoded by peq and text.
+        If tau is given, returns tau as soon as the distance is known to be >= tau '''
+    n = len(text)
+    if m == 0:
+        return n if tau is None else min(n, tau)
+    if n == 0:
+        return m if tau is None else min(m, tau)
+    mask = (1 << m) - 1
+    high_bit = 1 << (m - 1)
+    pv, mv = mask, 0
+    score = m # D[m][0]
+    for j, char in enumerate(text):
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & high_bit:
+            score += 1
+        elif mh & high_bit:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+        # D[m][n] >= D[m][j+1] - (remaining chars of text)
+        if (tau is not None) and (score - (n - j - 1) >= tau):
+            return tau
+
+    return score
+
+
+def edit_distance(s1, s2):
+    ''' Returns Levenshtein Edit Distance btwn two strings (or any sequences of hashable items)'''
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    # shorter string as the pattern --> smaller bit vectors
+    return _bit_vector_distance(_pattern_masks(s2), len(s2), s1)
+
+
+def bounded_edit_distance(s1, s2, tau):
+    ''' Edit distance between s1 and s2 if it is < tau, and ceil(tau) otherwise.
+        Use when only "is the distance < tau" matters (i.e. ROBOT feasibility checks):
+        stops as soon as the distance is known to reach tau '''
+    tau = math.ceil(tau) # distances are ints, d >= tau <--> d >= ceil(tau)
+    if abs(len(s1) - len(s2)) >= tau:
+        return tau
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    return _bit_vector_distance(_pattern_masks(s2), len(s2), s1, tau=tau)
+
+
+def edit_distances(s, targets, tau=None):
+    ''' Input:
+            s: a string
+            targets: a list of strings
+            tau: optional threshold, distances >= tau are returned as ceil(tau) (see bounded_edit_distance)
+        Output:
+            np array of edit distances between s and each target,
+            s is encoded as the bit-vector pattern once for all targets
+    '''
+    if tau is not None:
+        tau = math.ceil(tau)
+    peq = _pattern_masks(s)
+    m = len(s)
+    distances = np.empty(len(targets), dtype=np.int64)
+    for ix, target in enumerate(targets):
+        if (tau is not None) and (abs(m - len(target)) >= tau):
+            distances[ix] = tau
+        else:
+            distances[ix] = _bit_vector_distance(peq, m, target, tau=tau)
+
+    return distances
+
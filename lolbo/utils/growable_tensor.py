@@ -0,0 +1,68 @@
+import torch
+
+
+class GrowableTensor:
+    '''Tensor that grows along its first dim with amortized O(1) appends.
+        Rows are written into a preallocated buffer whose capacity doubles
+        when full, instead of re-copying the full history with torch.cat
+        on every append. view() returns a zero-copy view of the filled rows'''
+
+    def __init__(self, data, min_capacity=1024):
+        data = data.detach()
+        self.n = data.shape[0]
+        capacity = max(min_capacity, 2 * self.n)
+        self.buffer = torch.empty((capacity,) + tuple(data.shape[1:]), dtype=data.dtype, device=data.device)
+        self.buffer[:self.n] = data
+
+
+    def append(self, rows):
+        rows = rows.detach()
+        n_new = rows.shape[0]
+        if self.n + n_new > self.buffer.shape[0]:
+            capacity = max(2 * self.buffer.shape[0], self.n + n_new)
+            new_buffer = torch.empty((capacity,) + tuple(self.buffer.shape[1:]), dtype=self.buffer.dtype, device=self.buffer.device)
+            new_buffer[:self.n] = self.buffer[:self.n]
+            self.buffer = new_buffer
+        self.buffer[self.n:self.n + n_new] = rows.to(device=self.buffer.device, dtype=self.buffer.dtype)
+        self.n += n_new
+
+
+    def view(self):
+        return self.buffer[:self.n]
+
+
+    def __len__(self):
+        return self.n
+
+
+class GrowableTensorAttribute:
+    '''Descriptor for tensor attributes of optimization states
+        (i.e. train_z, train_y, train_c) that are appended to on every step.
+        Reading the attribute returns a zero-copy view of the filled rows,
+        assigning a tensor to it replaces the underlying GrowableTensor.
+        Non-tensor values (None, lists) are stored as they are'''
+
+    def __set_name__(self, owner, name):
+        self.store_name = f"_{name}_store"
+
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self.store_name)
+        if isinstance(value, GrowableTensor):
+            return value.view()
+        return value
+
+
+    def __set__(self, obj, value):
+        if torch.is_tensor(value):
+            value = GrowableTensor(value)
+        obj.__dict__[self.store_name] = value
+
+
+def append_rows(obj, name, rows):
+    ''' Appends rows to the GrowableTensorAttribute obj.name in place
+        (same result as obj.name = torch.cat((obj.name, rows), dim=0))
+    '''
+    obj.__dict__[f"_{name}_store"].append(rows)
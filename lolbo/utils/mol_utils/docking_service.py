@@ -0,0 +1,152 @@
+import math
+import time
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+from lolbo.utils.mol_utils.mol_utils import canonical_docking_smiles, setup_tdc_oracle
+
+
+def _docking_worker(protein_name, conn):
+    ''' Worker process loop: builds the tdc docking oracle once,
+        then docks one smiles string per message until it receives None '''
+    oracle = setup_tdc_oracle(protein_name)
+    conn.send(("ready", None))
+    while True:
+        smiles_str = conn.recv()
+        if smiles_str is None:
+            break
+        try:
+            score = oracle(smiles_str)
+        except Exception as e:
+            print("Error occurred getting score from smiles str::", smiles_str, e)
+            score = None
+        conn.send(("done", score))
+
+
+class _DockingWorker:
+    '''One worker process and the parent's end of its pipe'''
+
+    def __init__(self, ctx, protein_name):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_docking_worker, args=(protein_name, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False # set once the worker has built its oracle
+
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class DockingService:
+    '''Long lived pool of docking worker processes for one tdc docking oracle.
+        Called on a list of smiles strings, returns the list of docking scores
+        in the same order, None wherever the smiles is invalid, too long,
+        the oracle failed, or docking took longer than timeout seconds.
+        Smiles are canonicalized and deduplicated before dispatch,
+        so each distinct molecule in a batch is docked once.
+        Each worker process docks one molecule at a time, a job that runs past
+        its timeout is cancelled by killing its worker, which is then replaced'''
+
+    def __init__(
+        self,
+        protein_name, # tdc docking oracle name (see setup_tdc_oracle)
+        num_workers=4,
+        timeout=600, # max seconds to dock one molecule
+        max_smile_len=600, # longer (canonical) smiles are not docked
+        start_method=None, # multiprocessing start method (None --> platform default)
+    ):
+        self.protein_name = protein_name
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self.max_smile_len = max_smile_len
+        self.ctx = mp.get_context(start_method)
+        self.workers = [_DockingWorker(self.ctx, protein_name) for _ in range(num_workers)]
+
+
+    def __call__(self, smiles_list):
+        keys = [canonical_docking_smiles(smiles_str, max_smile_len=self.max_smile_len) for smiles_str in smiles_list]
+        unique_keys = list(dict.fromkeys(key for key in keys if key is not None))
+        scores = self.dock(unique_keys)
+
+        return [None if key is None else scores[key] for key in keys]
+
+
+    def dock(self, smiles_list):
+        ''' Input:
+                smiles_list: list of distinct (canonical) smiles strings
+            Output:
+                dict smiles string --> docking score (None if failed/timed out)
+        '''
+        start = time.time()
+        queue = deque(smiles_list)
+        running = {} # worker --> (smiles, dispatch time) of the job it is docking
+        scores = {}
+        while queue or running:
+            for worker in self.workers:
+                if queue and worker.ready and (worker not in running):
+                    smiles_str = queue.popleft()
+                    worker.conn.send(smiles_str)
+                    running[worker] = (smiles_str, time.time())
+            # wait for finished jobs (and workers finishing startup) until the next job deadline
+            deadline = min([t + self.timeout for _, t in running.values()], default=None)
+            wait_for = None if deadline is None else max(0.0, deadline - time.time())
+            listening = {worker.conn: worker for worker in self.workers if (worker in running) or (not worker.ready)}
+            for conn in wait(list(listening.keys()), timeout=wait_for):
+                worker = listening[conn]
+                try:
+                    message, score = conn.recv()
+                except (EOFError, OSError):
+                    # worker process died
+                    if not worker.ready:
+                        raise RuntimeError(f"Docking worker failed to start tdc oracle {self.protein_name}")
+                    smiles_str, _ = running.pop(worker)
+                    print("Docking worker died while docking smiles str::", smiles_str)
+                    scores[smiles_str] = None
+                    self._replace(worker)
+                    continue
+                if message == "ready":
+                    worker.ready = True
+                else:
+                    smiles_str, _ = running.pop(worker)
+                    scores[smiles_str] = _valid_score(score)
+            now = time.time()
+            for worker, (smiles_str, t) in list(running.items()):
+                if now - t > self.timeout:
+                    # the oracle call can not be interrupted in process, kill the worker instead
+                    print(f"TimeoutError encountered getting docking score for smiles_str: {smiles_str}")
+                    del running[worker]
+                    scores[smiles_str] = None
+                    self._replace(worker)
+        if len(smiles_list) > 0:
+            print(f"docked {len(smiles_list)} molecules in {time.time()-start} seconds")
+
+        return scores
+
+
+    def _replace(self, worker):
+        worker.kill()
+        self.workers[self.workers.index(worker)] = _DockingWorker(self.ctx, self.protein_name)
+
+
+    def shutdown(self):
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+        self.workers = []
+
+
+def _valid_score(score):
+    if (score is None) or (not math.isfinite(score)):
+        return None
+    return score
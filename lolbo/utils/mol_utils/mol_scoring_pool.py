@@ -0,0 +1,68 @@
+import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from lolbo.utils.mol_utils.mol_utils import smiles_to_desired_scores, get_guacamol_obj
+
+
+# task scored by each worker process, set once per worker
+_worker_task_id = None
+
+
+def _init_worker(task_id):
+    global _worker_task_id
+    _worker_task_id = task_id
+    if task_id not in ["logp", "qed"]:
+        # build this task's benchmark (only) once per worker, before the first chunk arrives
+        get_guacamol_obj(task_id)
+
+
+def _score_chunk_in_worker(smiles_chunk):
+    return smiles_to_desired_scores(smiles_chunk, _worker_task_id).tolist()
+
+
+class MoleculeScoringPool:
+    '''Persistent process pool scoring lists of smiles strings for one
+        molecule task ("logp", "qed" or a guacamol task name).
+        Guacamol scoring is pure python/rdkit CPU work, so each worker process
+        builds its own copy of the task's benchmark once (pool initializer)
+        and the smiles are dispatched in chunks, one chunk per task sent to a worker.
+        Called on a list of smiles, returns the np.array of scores in the same order
+        (np.nan for invalid molecules), same as smiles_to_desired_scores'''
+
+    def __init__(
+        self,
+        task_id,
+        num_workers=4,
+        chunks_per_worker=4, # chunks each batch is split into per worker (more chunks --> better load balance)
+        min_batch_size=None, # batches smaller than this are scored in process (None --> 2 * num_workers)
+    ):
+        self.task_id = task_id
+        self.num_workers = num_workers
+        self.chunks_per_worker = chunks_per_worker
+        if min_batch_size is None:
+            min_batch_size = 2 * num_workers
+        self.min_batch_size = min_batch_size
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_worker,
+            initargs=(task_id,),
+        )
+
+
+    def __call__(self, smiles_list):
+        smiles_list = list(smiles_list)
+        if len(smiles_list) < self.min_batch_size:
+            # not worth the inter process round trip
+            return smiles_to_desired_scores(smiles_list, self.task_id)
+        n_chunks = self.num_workers * self.chunks_per_worker
+        chunk_size = math.ceil(len(smiles_list) / n_chunks)
+        chunks = [smiles_list[i:i + chunk_size] for i in range(0, len(smiles_list), chunk_size)]
+        scores = []
+        for chunk_scores in self.executor.map(_score_chunk_in_worker, chunks):
+            scores.extend(chunk_scores)
+
+        return np.array(scores, dtype=float)
+
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
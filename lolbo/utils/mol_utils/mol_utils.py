@@ -1,18 +1,16 @@
 import numpy as np
 import time
 import math
-from multiprocessing.pool import ThreadPool
 import itertools
 import time 
-from lolbo.utils.mol_utils.moses_metrics.SA_Score import sascorer 
-try: # for tdc docking 
-    from tdc import Oracle
-except: 
-    print("Warning: Failed to import tdc docking oracle, only needed for molecule docking tasks")
+from functools import lru_cache
+from lolbo.utils.edit_distance import edit_distance
+from collections.abc import Mapping
+# heavy, task specific imports (guacamol, tdc, networkx, sascorer --> moses) are deferred to first use
+#   so importing this module (i.e. from your_objective_functions.py for protein tasks) stays cheap
 
 from rdkit import Chem
 from rdkit.Chem import Crippen
-import networkx as nx
 from rdkit.Chem import rdmolops
 from rdkit.Chem.QED import qed
 from rdkit.Chem.Fingerprints import FingerprintMols
@@ -20,25 +18,23 @@ from rdkit import DataStructs
 from rdkit.DataStructs.cDataStructs import FoldFingerprint
 from rdkit.DataStructs.cDataStructs import TanimotoSimilarity
 
-from guacamol import standard_benchmarks 
 
-med1 = standard_benchmarks.median_camphor_menthol() #'Median molecules 1'
-med2 = standard_benchmarks.median_tadalafil_sildenafil() #'Median molecules 2',
-pdop = standard_benchmarks.perindopril_rings() # 'Perindopril MPO',
-osmb = standard_benchmarks.hard_osimertinib()  # 'Osimertinib MPO',
-adip = standard_benchmarks.amlodipine_rings()  # 'Amlodipine MPO' 
-siga = standard_benchmarks.sitagliptin_replacement() #'Sitagliptin MPO'
-zale = standard_benchmarks.zaleplon_with_other_formula() # 'Zaleplon MPO'
-valt = standard_benchmarks.valsartan_smarts()  #'Valsartan SMARTS',
-dhop = standard_benchmarks.decoration_hop() # 'Deco Hop'
-shop = standard_benchmarks.scaffold_hop() # Scaffold Hop'
-rano= standard_benchmarks.ranolazine_mpo() #'Ranolazine MPO' 
-fexo = standard_benchmarks.hard_fexofenadine() # 'Fexofenadine MPO'... 'make fexofenadine less greasy'
-
-
-guacamol_objs = {"med1":med1,"pdop":pdop, "adip":adip, "rano":rano, "osmb":osmb,
-        "siga":siga, "zale":zale, "valt":valt, "med2":med2,"dhop":dhop, "shop":shop, 
-        'fexo':fexo} 
+# task name --> guacamol.standard_benchmarks constructor, 
+#   each benchmark is only built the first time its task is scored (see get_guacamol_obj)
+GUACAMOL_BENCHMARKS = {
+    "med1": "median_camphor_menthol", #'Median molecules 1'
+    "pdop": "perindopril_rings", # 'Perindopril MPO',
+    "adip": "amlodipine_rings", # 'Amlodipine MPO' 
+    "rano": "ranolazine_mpo", #'Ranolazine MPO' 
+    "osmb": "hard_osimertinib", # 'Osimertinib MPO',
+    "siga": "sitagliptin_replacement", #'Sitagliptin MPO'
+    "zale": "zaleplon_with_other_formula", # 'Zaleplon MPO'
+    "valt": "valsartan_smarts", #'Valsartan SMARTS',
+    "med2": "median_tadalafil_sildenafil", #'Median molecules 2',
+    "dhop": "decoration_hop", # 'Deco Hop'
+    "shop": "scaffold_hop", # Scaffold Hop'
+    "fexo": "hard_fexofenadine", # 'Fexofenadine MPO'... 'make fexofenadine less greasy'
+}
 
 
 GUACAMOL_TASK_NAMES = [
@@ -46,23 +42,85 @@ GUACAMOL_TASK_NAMES = [
     'zale', 'valt', 'med2', 'dhop', 'shop', 'fexo'
 ]
 
+
+@lru_cache(maxsize=None)
+def get_guacamol_obj(task_id):
+    ''' guacamol benchmark for task_id, built once per process on first use '''
+    from guacamol import standard_benchmarks 
+    return getattr(standard_benchmarks, GUACAMOL_BENCHMARKS[task_id])()
+
+
+class LazyGuacamolObjs(Mapping):
+    ''' task name --> guacamol benchmark, 
+        read only dict view of get_guacamol_obj kept for code indexing guacamol_objs '''
+
+    def __getitem__(self, task_id):
+        return get_guacamol_obj(task_id)
+
+    def __iter__(self):
+        return iter(GUACAMOL_BENCHMARKS)
+
+    def __len__(self):
+        return len(GUACAMOL_BENCHMARKS)
+
+
+guacamol_objs = LazyGuacamolObjs()
+
+
+@lru_cache(maxsize=None)
+def _guacamol_scoring_classes():
+    from guacamol.scoring_function import (
+        ScoringFunctionBasedOnRdkitMol,
+        GeometricMeanScoringFunction,
+        ArithmeticMeanScoringFunction,
+    )
+    from guacamol.common_scoring_functions import IsomerScoringFunction
+    from guacamol.utils.math import geometric_mean
+    return (
+        ScoringFunctionBasedOnRdkitMol,
+        GeometricMeanScoringFunction,
+        ArithmeticMeanScoringFunction,
+        IsomerScoringFunction,
+        geometric_mean,
+    )
+
+
+def _sascorer():
+    from lolbo.utils.mol_utils.moses_metrics.SA_Score import sascorer 
+    return sascorer
+
+
 def smile_is_valid_mol(smile):
+    return smile_to_valid_mol(smile) is not None
+
+
+def smile_to_valid_mol(smile):
+    ''' rdkit mol of smile, None for empty or invalid smiles '''
     if smile is None or len(smile)==0:
-        return False
-    mol = Chem.MolFromSmiles(smile)
+        return None
+    return Chem.MolFromSmiles(smile)
+
+
+def canonicalize_smiles(smile):
+    ''' canonical smiles string of smile (the same string for all smiles of a molecule),
+        smile itself if it is not a valid molecule '''
+    mol = smile_to_valid_mol(smile)
     if mol is None:
-        return False
-    return True
+        return smile
+    return Chem.MolToSmiles(mol)
 
 
 def smile_to_guacamole_score(obj_func_key, smile):
-    if smile is None or len(smile)==0:
-        return None
-    mol = Chem.MolFromSmiles(smile)
+    mol = smile_to_valid_mol(smile)
     if mol is None:
         return None
-    func = guacamol_objs[obj_func_key]
-    score = func.objective.score(smile)
+    return mol_to_guacamole_score(get_guacamol_obj(obj_func_key), mol, smile)
+
+
+def mol_to_guacamole_score(guacamol_obj, mol, smile):
+    ''' guacamol score of an already parsed (valid) mol,
+        returns None for invalid/corrupt scores '''
+    score = guacamol_score_mol(guacamol_obj.objective, mol, smile)
     if score is None:
         return None
     if score < 0:
@@ -70,6 +128,39 @@ def smile_to_guacamole_score(obj_func_key, smile):
     return score 
 
 
+def guacamol_score_mol(scoring_function, mol, smile):
+    ''' Same value as scoring_function.score(smile) but evaluated on the parsed mol.
+        guacamol re-parses the smiles string once per leaf scoring function 
+        (i.e. 2-5 times per molecule for the MPO tasks), here the composite scoring functions 
+        used by the tasks above are unrolled so all leaves share one rdkit mol.
+        Any other scoring function falls back to scoring_function.score(smile) '''
+    (ScoringFunctionBasedOnRdkitMol, GeometricMeanScoringFunction, ArithmeticMeanScoringFunction,
+        IsomerScoringFunction, geometric_mean) = _guacamol_scoring_classes()
+    if isinstance(scoring_function, ScoringFunctionBasedOnRdkitMol):
+        try:
+            return scoring_function.modify_score(scoring_function.score_mol(mol))
+        except Exception:
+            return scoring_function.corrupt_score
+    if type(scoring_function) is ArithmeticMeanScoringFunction:
+        partial_scores = [guacamol_score_mol(f, mol, smile) for f in scoring_function.scoring_functions]
+        weights = np.array(scoring_function.weights)
+        raw_score = np.sum(weights * np.array(partial_scores)) / np.sum(weights)
+        return scoring_function.modify_score(raw_score)
+    if type(scoring_function) in (GeometricMeanScoringFunction, IsomerScoringFunction):
+        try:
+            partial_scores = [guacamol_score_mol(f, mol, smile) for f in scoring_function.scoring_functions]
+            if scoring_function.corrupt_score in partial_scores:
+                raw_score = scoring_function.corrupt_score
+            elif type(scoring_function) is IsomerScoringFunction:
+                raw_score = scoring_function.mean_function(partial_scores)
+            else:
+                raw_score = geometric_mean(partial_scores)
+            return scoring_function.modify_score(raw_score)
+        except Exception:
+            return scoring_function.corrupt_score
+    return scoring_function.score(smile)
+
+
 def smile_to_rdkit_mol(smile): return Chem.MolFromSmiles(smile)
 vectorized_smiles_arr_to_mols_arr = np.vectorize(smile_to_rdkit_mol) 
 
@@ -83,6 +174,10 @@ def smile_to_QED(smile):
     mol = Chem.MolFromSmiles(smile)
     if mol is None:
         return None
+    return mol_to_QED(mol)
+
+
+def mol_to_QED(mol):
     qed_score = qed(mol)
     return qed_score
 
@@ -95,7 +190,7 @@ def smile_to_sa(smile):
     mol = Chem.MolFromSmiles(smile)
     if mol is None:
         return None
-    return sascorer.calculateScore(mol)
+    return _sascorer().calculateScore(mol)
 
 def smile_to_penalized_logP(smile):
     """ calculate penalized logP for a given smiles string """
@@ -104,8 +199,12 @@ def smile_to_penalized_logP(smile):
     mol = Chem.MolFromSmiles(smile)
     if mol is None:
         return None
+    return mol_to_penalized_logP(mol)
+
+
+def mol_to_penalized_logP(mol):
     logp = Crippen.MolLogP(mol)
-    sa = sascorer.calculateScore(mol)
+    sa = _sascorer().calculateScore(mol)
     cycle_length = _cycle_score(mol)
     """
     Calculate final adjusted score.
@@ -123,6 +222,7 @@ def smile_to_penalized_logP(smile):
     return max(score, -float("inf"))
 
 def _cycle_score(mol):
+    import networkx as nx
     cycle_list = nx.cycle_basis(nx.Graph(rdmolops.GetAdjacencyMatrix(mol)))
     if len(cycle_list) == 0:
         cycle_length = 0
@@ -136,49 +236,61 @@ def _cycle_score(mol):
 
 
 def setup_tdc_oracle(protien_name):
+    from tdc import Oracle # tdc is only needed for molecule docking tasks
     oracle = Oracle(name=protien_name)
     return oracle
 
 
-def smile_to_tdc_docking_score(smiles_str, tdc_oracle, max_smile_len=600, timeout=600):
-    # goal of function:
-    #          return docking score (score = tdc_oracle(smiles_str) ) iff it can be computed within timeout seconds
-    #           otherwise, return None
+def canonical_docking_smiles(smiles_str, max_smile_len=600):
+    ''' canonical smiles string docked for smiles_str, 
+        None if smiles_str is invalid or too long to dock '''
     if not smile_is_valid_mol(smiles_str):
         return None
     smiles_str = Chem.CanonSmiles(smiles_str)
     if len(smiles_str) > max_smile_len:
         return None
-    start = time.time()
+    return smiles_str
 
-    def get_the_score(smiles_str):
-        docking_score = tdc_oracle(smiles_str)
-        return docking_score
 
-    pool = ThreadPool(1)
+@lru_cache(maxsize=None)
+def get_docking_service(protein_name, timeout=600, max_smile_len=600):
+    # one long lived DockingService per tdc docking oracle, shared by all calls 
+    from lolbo.utils.mol_utils.docking_service import DockingService
+    return DockingService(protein_name, timeout=timeout, max_smile_len=max_smile_len)
 
-    async_result = pool.apply_async(get_the_score, (smiles_str,))
-    from multiprocessing.context import TimeoutError
-    try:
-        ret_value = async_result.get(timeout=timeout)
-    except Exception as e:
-        print("Error occurred getting score from smiles str::",smiles_str,  e)
-        # print('TimeoutError encountered getting docking score for smiles_str:', smiles_str)
-        ret_value = None
 
+def smile_to_tdc_docking_score(smiles_str, tdc_oracle, max_smile_len=600, timeout=600):
+    # goal of function:
+    #          return docking score (score = tdc_oracle(smiles_str) ) iff it can be computed within timeout seconds
+    #           otherwise, return None
+    # docks in the worker processes of the shared DockingService of tdc_oracle's protein, 
+    #   a docking job that times out is killed with its worker (see docking_service.py) 
+    start = time.time()
+    ret_value = get_docking_service(tdc_oracle.name, timeout=timeout, max_smile_len=max_smile_len)([smiles_str])[0]
     print(f"getting docking score: {ret_value} from protein took {time.time()-start} seconds")
     return ret_value
 
 
-def smiles_to_desired_scores(smiles_list, task_id="logp" ):
+def smiles_to_desired_scores(smiles_list, task_id="logp"):
+    ''' Scores each smiles string for task_id ("logp", "qed" or a guacamol task name),
+        parsing each smiles string only once. np.nan for invalid molecules/scores '''
+    if task_id not in ["logp", "qed"]:
+        guacamol_obj = get_guacamol_obj(task_id)
     scores = [] 
     for smiles_str in smiles_list:
-        if task_id == "logp":
-            score_ = smile_to_penalized_logP(smiles_str)
+        if task_id in ["logp", "qed"]:
+            # (as in smile_to_penalized_logP/smile_to_QED, only None smiles are rejected before parsing)
+            mol = None if smiles_str is None else Chem.MolFromSmiles(smiles_str)
+        else:
+            mol = smile_to_valid_mol(smiles_str)
+        if mol is None:
+            score_ = None
+        elif task_id == "logp":
+            score_ = mol_to_penalized_logP(mol)
         elif task_id == "qed":
-            score_ = smile_to_QED(smiles_str)
+            score_ = mol_to_QED(mol)
         else: # otherwise, assume it is a guacamol task
-            score_ = smile_to_guacamole_score(task_id, smiles_str)
+            score_ = mol_to_guacamole_score(guacamol_obj, mol, smiles_str)
         if (score_ is not None) and (math.isfinite(score_) ):
             scores.append(score_) 
         else:
@@ -290,17 +402,7 @@ def smiles_edit_distance(s1, s2):
     s1 = Chem.CanonSmiles(s1)
     s2 = Chem.CanonSmiles(s2)
 
-    m=len(s1)+1
-    n=len(s2)+1
-    tbl = {}
-    for i in range(m): tbl[i,0]=i
-    for j in range(n): tbl[0,j]=j
-    for i in range(1, m):
-        for j in range(1, n):
-            cost = 0 if s1[i-1] == s2[j-1] else 1 
-            tbl[i,j] = min(tbl[i, j-1]+1, tbl[i-1, j]+1, tbl[i-1, j-1]+cost)
-
-    return tbl[i,j] 
+    return edit_distance(s1, s2)
 
 
 def check_smiles_equivalence(smile1, smile2):
@@ -59,10 +59,21 @@ class PositionalEncoding(nn.Module):
         pe[0, :, 1::2] = torch.cos(position * div_term)
         self.register_buffer('pe', pe)
 
-    def forward(self, x):
-        x = x + self.pe[:, :x.shape[1], :]
+    def forward(self, x, offset=0):
+        # offset lets incremental decoding embed a single token at its true position
+        x = x + self.pe[:, offset:offset + x.shape[1], :]
         return self.dropout(x)
 
+def _split_heads(x, num_heads):
+    # (n, L, d) --> (n, num_heads, L, d // num_heads)
+    n, length, d = x.shape
+    return x.view(n, length, num_heads, d // num_heads).transpose(1, 2)
+
+def _merge_heads(x):
+    # (n, num_heads, L, head_dim) --> (n, L, num_heads * head_dim)
+    n, num_heads, length, head_dim = x.shape
+    return x.transpose(1, 2).reshape(n, length, num_heads * head_dim)
+
 class InfoTransformerVAE(pl.LightningModule):
     def __init__(self,
         dataset: SELFIESDataset,
@@ -182,35 +193,140 @@ class InfoTransformerVAE(pl.LightningModule):
 
         return logits
 
+    def init_decoder_cache(self, z, initial_len=64):
+        """ Allocate per-layer self-attention key/value buffers and precompute the cross-attention keys/values of z for incremental decoding.
+            Buffers start at initial_len positions and are doubled by _grow_decoder_cache as decoding needs more (most decodes stop far before max_string_length) """
+        n = z.shape[0]
+        max_len = min(initial_len, self.max_string_length + 1)
+        cache = []
+        for layer in self.decoder.layers:
+            attn = layer.multihead_attn
+            head_dim = attn.embed_dim // attn.num_heads
+            _, w_k, w_v = attn.in_proj_weight.chunk(3)
+            _, b_k, b_v = attn.in_proj_bias.chunk(3)
+            cache.append(dict(
+                k=z.new_empty(n, attn.num_heads, max_len, head_dim),
+                v=z.new_empty(n, attn.num_heads, max_len, head_dim),
+                memory_k=_split_heads(F.linear(z, w_k, b_k), attn.num_heads),
+                memory_v=_split_heads(F.linear(z, w_v, b_v), attn.num_heads),
+            ))
+        return cache
+
+    def _grow_decoder_cache(self, layer_cache, length):
+        """ Make room for length positions in the key/value buffers of layer_cache, doubling them (up to max_string_length + 1 positions) when they are full """
+        buffer_len = layer_cache['k'].shape[2]
+        if length <= buffer_len:
+            return
+        new_len = max(length, min(2 * buffer_len, self.max_string_length + 1))
+        for key in ['k', 'v']:
+            buffer = layer_cache[key]
+            grown = buffer.new_empty(*buffer.shape[:2], new_len, buffer.shape[3])
+            grown[:, :, :buffer_len] = buffer
+            layer_cache[key] = grown
+
+    @staticmethod
+    def _cached_self_attention(x, attn, layer_cache, position):
+        q, k, v = F.linear(x, attn.in_proj_weight, attn.in_proj_bias).chunk(3, dim=-1)
+        layer_cache['k'][:, :, position] = _split_heads(k, attn.num_heads)[:, :, 0]
+        layer_cache['v'][:, :, position] = _split_heads(v, attn.num_heads)[:, :, 0]
+        # the new token may attend to itself and every earlier position, so no mask is needed
+        out = F.scaled_dot_product_attention(_split_heads(q, attn.num_heads), layer_cache['k'][:, :, :position + 1], layer_cache['v'][:, :, :position + 1])
+        return attn.out_proj(_merge_heads(out))
+
+    @staticmethod
+    def _cached_cross_attention(x, attn, layer_cache):
+        w_q, _, _ = attn.in_proj_weight.chunk(3)
+        b_q, _, _ = attn.in_proj_bias.chunk(3)
+        q = _split_heads(F.linear(x, w_q, b_q), attn.num_heads)
+        out = F.scaled_dot_product_attention(q, layer_cache['memory_k'], layer_cache['memory_v'])
+        return attn.out_proj(_merge_heads(out))
+
+    @staticmethod
+    def _feed_forward(x, layer):
+        return layer.linear2(layer.activation(layer.linear1(x)))
+
+    def decode_step(self, tgt, cache, position):
+        """ Run the decoder (in eval mode) on the single newest position tgt (n, 1, d_model), reading all earlier positions from cache """
+        x = tgt
+        for layer, layer_cache in zip(self.decoder.layers, cache):
+            self._grow_decoder_cache(layer_cache, position + 1)
+            if layer.norm_first:
+                x = x + self._cached_self_attention(layer.norm1(x), layer.self_attn, layer_cache, position)
+                x = x + self._cached_cross_attention(layer.norm2(x), layer.multihead_attn, layer_cache)
+                x = x + self._feed_forward(layer.norm3(x), layer)
+            else:
+                x = layer.norm1(x + self._cached_self_attention(x, layer.self_attn, layer_cache, position))
+                x = layer.norm2(x + self._cached_cross_attention(x, layer.multihead_attn, layer_cache))
+                x = layer.norm3(x + self._feed_forward(x, layer))
+        if self.decoder.norm is not None:
+            x = self.decoder.norm(x)
+        return x
+
+    @staticmethod
+    def _select_cache_rows(cache, rows):
+        return [{k: v[rows] for k, v in layer_cache.items()} for layer_cache in cache]
+
     @torch.no_grad()
-    def sample(self, n: int = -1, z: Tensor = None, differentiable: bool = False, return_logits: bool = False):
+    def sample(self, n: int = -1, z: Tensor = None, differentiable: bool = False, return_logits: bool = False, use_kv_cache: bool = True, retire_finished: bool = True):
         model_state = self.training
         self.eval()
         if z is None:
             z = self.sample_prior(n)
         else:
             n = z.shape[0]
+        # full per-row samples/logits are needed when returning them, so keep every row decoding
+        retire_finished = retire_finished and not (differentiable or return_logits)
 
         tokens = torch.zeros(n, 1, device=self.device).long() # Start token is 0, stop token is 1
-        random_gumbels = torch.zeros(n, 0, self.vocab_size, device=self.device)
+        finished = torch.zeros(n, dtype=torch.bool, device=self.device)
+        active = torch.arange(n, device=self.device) # rows still being decoded
+        if use_kv_cache:
+            # feed only the newest token each step, earlier keys/values are cached
+            cache = self.init_decoder_cache(z)
+            step_samples, step_logits = [], []
         while True: # Loop until every molecule hits a stop token
-            tgt = self.decoder_token_embedding(tokens)
-            tgt = self.decoder_position_encoding(tgt)
-            tgt_mask = nn.Transformer.generate_square_subsequent_mask(tokens.shape[-1]).to(self.device)
+            if use_kv_cache:
+                position = tokens.shape[-1] - 1
+                tgt = self.decoder_token_embedding(tokens[active, -1:])
+                tgt = self.decoder_position_encoding(tgt, offset=position)
+                decoding = self.decode_step(tgt, cache, position)
+            else:
+                tgt = self.decoder_token_embedding(tokens[active])
+                tgt = self.decoder_position_encoding(tgt)
+                tgt_mask = nn.Transformer.generate_square_subsequent_mask(tokens.shape[-1]).to(self.device)
 
-            decoding = self.decoder(tgt=tgt, memory=z, tgt_mask=tgt_mask)
+                decoding = self.decoder(tgt=tgt, memory=z[active], tgt_mask=tgt_mask)
             logits = decoding @ self.decoder_token_unembedding 
-            sample, randoms = gumbel_softmax(logits, dim=-1, hard=True, return_randoms=True)
+            sample = gumbel_softmax(logits, dim=-1, hard=True)
+            if use_kv_cache:
+                step_samples.append(sample)
+                step_logits.append(logits)
 
-            tokens = torch.cat([tokens, sample[:, -1, :].argmax(dim=-1)[:, None]], dim=-1)
-            random_gumbels = torch.cat([random_gumbels, randoms], dim=1)
+            # retired rows are padded with the stop token
+            next_tokens = torch.ones(n, dtype=torch.long, device=self.device)
+            next_tokens[active] = sample[:, -1, :].argmax(dim=-1)
+            tokens = torch.cat([tokens, next_tokens[:, None]], dim=-1)
+            finished |= next_tokens == 1
 
             # 1 is the stop token. Check if all molecules have a stop token in them
-            if torch.all((tokens == 1).sum(dim=-1) > 0).item() or tokens.shape[-1] > self.max_string_length: #no longer break at 1024, instead variable max string lengtth 
+            if finished.all().item() or tokens.shape[-1] > self.max_string_length: #no longer break at 1024, instead variable max string lengtth 
                 break
 
+            if retire_finished:
+                still_active = ~finished[active]
+                if not still_active.all().item():
+                    # compact the batch so finished rows stop costing decoder passes
+                    active = active[still_active]
+                    if use_kv_cache:
+                        cache = self._select_cache_rows(cache, still_active)
+
         self.train(model_state)
 
+        if use_kv_cache and (differentiable or return_logits):
+            # match the full-prefix outputs of the uncached decoder
+            sample = torch.cat(step_samples, dim=1)
+            logits = torch.cat(step_logits, dim=1)
+
         # TODO: Put this back in
         if not differentiable:
             sample = tokens
@@ -0,0 +1,240 @@
+import math
+import threading
+import multiprocessing as mp
+import numpy as np
+from queue import Queue
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class OracleCallFailed(Exception):
+    '''Set on the futures of xs whose oracle call raised an error or timed out.
+        Unlike a nan returned by the oracle (an invalid x), this is not a property
+        of x, so the score should not be cached and x can be scored again later'''
+
+
+class OracleCallTimedOut(OracleCallFailed):
+    '''Oracle call ran past the pool's timeout'''
+
+
+def _score_chunk(objective_function, x_chunk):
+    ''' Scores a chunk of xs with one objective_function call,
+        None scores (invalid xs) --> np.nan '''
+    scores = objective_function(x_chunk)
+    return [np.nan if score is None else score for score in scores]
+
+
+def _oracle_worker(objective_function, conn):
+    ''' Worker process loop: scores one chunk of xs per message until it receives None '''
+    while True:
+        x_chunk = conn.recv()
+        if x_chunk is None:
+            break
+        try:
+            conn.send(("done", _score_chunk(objective_function, x_chunk)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class _OracleWorker:
+    '''One oracle worker process and the parent's end of its pipe'''
+
+    def __init__(self, ctx, objective_function):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_oracle_worker, args=(objective_function, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class OraclePool:
+    '''Wraps an ObjectiveFunction (see your_tasks/your_objective_functions.py)
+        so that a list of xs is split into chunks which are scored concurrently,
+        one objective function call per chunk (so oracles that batch internally,
+        i.e. batched ESMFold or molecule scoring, still get batches).
+        Called exactly like the wrapped objective function:
+        takes a list of xs, returns the list of scores in the same order,
+        with np.nan wherever the oracle failed or timed out.
+        submit() returns one future per x, xs whose oracle call failed or timed out
+        hold an OracleCallFailed exception (gather() scores them as nan).
+        If a call on several xs raises an error, they are scored again one x per call,
+        so one x the oracle errors on does not fail the rest of its chunk.
+        The timeout of a call starts when the call starts running, not when it is submitted.
+        With executor="process" each call runs in a long lived worker process that is
+        killed (and replaced) if the call runs past its timeout.
+        With executor="thread" a call that runs past its timeout can not be stopped,
+        it is abandoned and keeps running in the background, but no longer holds a slot of the pool'''
+
+    def __init__(
+        self,
+        objective_function,
+        executor="thread", # "thread" or "process" (use "process" for CPU-bound pure python oracles, or oracles that may hang)
+        max_workers=4,
+        timeout=None, # max seconds for one oracle call (one chunk of xs) once it starts running (None --> wait forever)
+        chunk_size=None, # max xs per oracle call (None --> each submitted batch is split evenly over the workers)
+        start_method=None, # multiprocessing start method for executor="process" (None --> platform default)
+    ):
+        assert executor in ["thread", "process"]
+        self.objective_function = objective_function
+        self.executor_type = executor
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        # one slot per worker, each slot runs one oracle call at a time
+        self.slots = ThreadPoolExecutor(max_workers=max_workers)
+        if executor == "process":
+            self.ctx = mp.get_context(start_method)
+            # idle worker processes, a slot takes one for each call
+            self.idle_workers = Queue()
+            for _ in range(max_workers):
+                self.idle_workers.put(_OracleWorker(self.ctx, objective_function))
+
+
+    def __call__(self, x_list):
+        return self.gather(self.submit(x_list))
+
+
+    def submit(self, x_list):
+        ''' Input:
+                x_list: a list of input space items
+            Output:
+                a list of futures, one per x, in the same order
+        '''
+        x_list = list(x_list)
+        futures = [Future() for _ in x_list]
+        if len(x_list) == 0:
+            return futures
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = math.ceil(len(x_list) / self.max_workers)
+        for i in range(0, len(x_list), chunk_size):
+            self.slots.submit(self._run_chunk, x_list[i:i + chunk_size], futures[i:i + chunk_size])
+
+        return futures
+
+
+    def gather(self, futures):
+        ''' Input:
+                futures: list of futures returned by submit()
+            Output:
+                list of scores in the same order as the futures,
+                np.nan for any x whose oracle call failed or timed out
+        '''
+        if len(futures) == 0:
+            return []
+        wait(futures)
+        scores = []
+        for future in futures:
+            if future.exception() is not None:
+                scores.append(np.nan)
+            else:
+                scores.append(future.result())
+
+        return scores
+
+
+    def _run_chunk(self, x_chunk, futures):
+        ''' Runs in a slot: scores x_chunk and resolves its futures '''
+        try:
+            scores = self._call_with_timeout(x_chunk)
+        except OracleCallFailed as e:
+            if (len(x_chunk) > 1) and (not isinstance(e, OracleCallTimedOut)):
+                for x, future in zip(x_chunk, futures):
+                    self._run_chunk([x], [future])
+                return
+            print(f"Oracle call on {len(x_chunk)} xs failed: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, score in zip(futures, scores):
+            future.set_result(score)
+
+
+    def _call_with_timeout(self, x_chunk):
+        ''' One oracle call on x_chunk, raises OracleCallFailed on error or timeout '''
+        if self.executor_type == "process":
+            return self._call_in_worker_process(x_chunk)
+        if self.timeout is None:
+            try:
+                return _score_chunk(self.objective_function, x_chunk)
+            except Exception as e:
+                raise OracleCallFailed(repr(e)) from e
+        # run in a throwaway thread, so the slot is freed if the call hangs
+        call = Future()
+        def target():
+            try:
+                call.set_result(_score_chunk(self.objective_function, x_chunk))
+            except Exception as e:
+                call.set_exception(e)
+        threading.Thread(target=target, daemon=True).start()
+        try:
+            return call.result(timeout=self.timeout)
+        except FutureTimeoutError as e:
+            if not call.done():
+                raise OracleCallTimedOut(f"timed out after {self.timeout}s") from e
+            raise OracleCallFailed(repr(e)) from e
+        except Exception as e:
+            raise OracleCallFailed(repr(e)) from e
+
+
+    def _call_in_worker_process(self, x_chunk):
+        worker = self.idle_workers.get()
+        try:
+            worker.conn.send(x_chunk)
+            if not worker.conn.poll(self.timeout):
+                # the oracle call can not be interrupted in process, kill the worker instead
+                worker.kill()
+                worker = _OracleWorker(self.ctx, self.objective_function)
+                raise OracleCallTimedOut(f"timed out after {self.timeout}s")
+            message, result = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            # worker process died
+            worker.kill()
+            worker = _OracleWorker(self.ctx, self.objective_function)
+            raise OracleCallFailed(f"oracle worker process died: {e!r}") from e
+        finally:
+            self.idle_workers.put(worker)
+        if message == "error":
+            raise OracleCallFailed(result)
+
+        return result
+
+
+    def shutdown(self, wait=True):
+        self.slots.shutdown(wait=wait)
+        if self.executor_type == "process":
+            while not self.idle_workers.empty():
+                worker = self.idle_workers.get()
+                try:
+                    worker.conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+                    worker.process.join()
+                worker.conn.close()
+
+
+def maybe_wrap_in_oracle_pool(
+    objective_function,
+    num_oracle_workers=1,
+    oracle_executor="thread",
+    oracle_timeout=None,
+):
+    ''' Returns objective_function unchanged for serial evaluation
+        (num_oracle_workers <= 1 and no timeout), and an OraclePool
+        wrapping it otherwise '''
+    if (num_oracle_workers <= 1) and (oracle_timeout is None):
+        return objective_function
+    return OraclePool(
+        objective_function,
+        executor=oracle_executor,
+        max_workers=max(1, num_oracle_workers),
+        timeout=oracle_timeout,
+    )
@@ -0,0 +1,80 @@
+import json
+import math
+import sqlite3
+
+
+class ScoreStore:
+    '''Base class for a persistent oracle score cache
+        that can be shared across restarted or parallel runs.
+        Scores are keyed by (task_id, task_specific_args, x)
+        so different tasks can safely share one store'''
+
+    def lookup(self, xs):
+        ''' Input:
+                a list of input space items xs
+            Output:
+                dict mapping each x found in the store to its score
+        '''
+        raise NotImplementedError("Must implement lookup() for the score store")
+
+
+    def insert(self, xs, scores):
+        ''' Input:
+                a list of input space items xs and
+                the corresponding list of oracle scores
+                (nan scores are not stored)
+        '''
+        raise NotImplementedError("Must implement insert() for the score store")
+
+
+class SqliteScoreStore(ScoreStore):
+    '''Score store backed by a single SQLite file'''
+
+    def __init__(
+        self,
+        path,
+        task_id='',
+        task_specific_args=[],
+        max_vars_per_query=500, # stay under SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds
+        timeout=60, # seconds to wait on a lock held by a parallel run
+    ):
+        self.path = path
+        self.task_key = json.dumps([task_id, task_specific_args], default=str)
+        self.max_vars_per_query = max_vars_per_query
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        # WAL lets parallel runs read while another run is writing
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "task TEXT NOT NULL, x TEXT NOT NULL, score REAL NOT NULL, "
+            "PRIMARY KEY (task, x)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+
+    def lookup(self, xs):
+        xs = list(set(x for x in xs if isinstance(x, str)))
+        found = {}
+        for start in range(0, len(xs), self.max_vars_per_query):
+            chunk = xs[start:start + self.max_vars_per_query]
+            rows = self.conn.execute(
+                f"SELECT x, score FROM scores WHERE task = ? AND x IN ({','.join('?'*len(chunk))})",
+                [self.task_key, *chunk],
+            )
+            found.update(rows)
+
+        return found
+
+
+    def insert(self, xs, scores):
+        rows = [
+            (self.task_key, x, float(score)) for x, score in zip(xs, scores)
+            if isinstance(x, str) and (score is not None) and math.isfinite(float(score))
+        ]
+        if len(rows) > 0:
+            with self.conn: # commits on exit
+                self.conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?)", rows)
+
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM scores WHERE task = ?", [self.task_key]).fetchone()[0]
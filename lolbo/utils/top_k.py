@@ -0,0 +1,93 @@
+import heapq
+import torch
+
+
+class TopK:
+    '''Tracks the k highest scoring points (score, x, z and optionally c)
+        found during optimization.
+        A min-heap over (score, slot) gives the worst tracked point in O(1)
+        and replaces it in O(log k), and a dict counting the tracked xs
+        replaces the O(k) "x not in top_k_xs" scans.
+        Points live in fixed slots: scores and xs are lists indexed by slot,
+        zs and cs are rows of preallocated (k, dim) tensors,
+        so zs_tensor() / cs_tensor() are views with no stacking needed.
+        Membership uses key(x) (i.e. objective.canonical_key), so equivalent xs
+        count as the same x'''
+
+    def __init__(self, k, key=None):
+        self.k = k
+        self.key = key # x --> hashable key used to check if x is already tracked (None --> x itself)
+        self.heap = [] # (score, slot), heap[0] is the worst tracked point
+        self.scores = [] # scores[slot]
+        self.xs = [] # xs[slot]
+        self.x_counts = {} # key(x) --> number of slots holding x
+        self.zs = None # (k, z dim) tensor, allocated on first add
+        self.cs = None # (k, n constraints) tensor if constrained
+
+
+    def __len__(self):
+        return len(self.scores)
+
+
+    def min_score(self):
+        return self.heap[0][0]
+
+
+    def add(self, score, x, z, c=None):
+        ''' Input:
+                score: float score of x
+                x: input space item
+                z: tensor (z dim,) latent space point of x
+                c: optional tensor (n constraints,) of constraint values
+            Output:
+                True iff the point was added to the top k
+            Same rule as a list based top k: while fewer than k points are
+            tracked every point is added, afterwards a point replaces the worst
+            tracked point iff it scores higher and x is not already tracked
+        '''
+        x_key = x if self.key is None else self.key(x)
+        if len(self.scores) < self.k:
+            slot = len(self.scores)
+            self.scores.append(score)
+            self.xs.append(x)
+            heapq.heappush(self.heap, (score, slot))
+        elif (score > self.heap[0][0]) and (x_key not in self.x_counts):
+            # new point takes over the slot of the worst tracked point
+            slot = self.heap[0][1]
+            heapq.heapreplace(self.heap, (score, slot))
+            old_key = self.xs[slot] if self.key is None else self.key(self.xs[slot])
+            self.x_counts[old_key] -= 1
+            if self.x_counts[old_key] == 0:
+                del self.x_counts[old_key]
+            self.scores[slot] = score
+            self.xs[slot] = x
+        else:
+            return False
+        self.x_counts[x_key] = self.x_counts.get(x_key, 0) + 1
+        self.zs = self._set_row(self.zs, slot, z)
+        if c is not None:
+            self.cs = self._set_row(self.cs, slot, c)
+
+        return True
+
+
+    def _set_row(self, rows, slot, row):
+        row = row.detach().reshape(-1)
+        if rows is None:
+            rows = torch.empty((self.k, row.shape[0]), dtype=row.dtype, device=row.device)
+        rows[slot] = row
+        return rows
+
+
+    def zs_tensor(self):
+        ''' (n tracked, z dim) tensor of tracked zs, ordered by slot '''
+        if self.zs is None:
+            return None
+        return self.zs[:len(self.scores)]
+
+
+    def cs_tensor(self):
+        ''' (n tracked, n constraints) tensor of tracked cs, ordered by slot '''
+        if self.cs is None:
+            return None
+        return self.cs[:len(self.scores)]
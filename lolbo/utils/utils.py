@@ -1,8 +1,30 @@
 import torch
-import math
 from torch.utils.data import TensorDataset, DataLoader
 
 
+def token_budget_batches(train_x, max_tokens=2560, length_fn=len):
+    '''Group indices of train_x into batches of similar length
+    such that each batch, once padded to its longest member, 
+    holds at most max_tokens tokens (an x longer than 
+    max_tokens still gets a batch of its own). 
+    Returns a list of lists of indices into train_x
+    '''
+    lengths = [max(1, length_fn(x)) for x in train_x]
+    # sorting by length means the newest x is always the longest in its batch
+    order = sorted(range(len(train_x)), key=lambda ix: lengths[ix])
+    batches = []
+    batch = []
+    for ix in order:
+        if batch and (len(batch) + 1)*lengths[ix] > max_tokens:
+            batches.append(batch)
+            batch = []
+        batch.append(ix)
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
 def update_models_end_to_end_unconstrained(
     train_x,
     train_y_scores,
@@ -21,17 +43,14 @@ def update_models_end_to_end_unconstrained(
     optimizer = torch.optim.Adam([
             {'params': objective.vae.parameters()},
             {'params': model.parameters(), 'lr': learning_rte} ], lr=learning_rte)
-    # max batch size smaller to avoid memory limit with longer strings (more tokens)
-    max_string_length = len(max(train_x, key=len))
-    bsz = max(1, int(2560/max_string_length)) 
-    num_batches = math.ceil(len(train_x) / bsz)
+    # bucket xs by length and cap padded tokens per batch to avoid memory limit with longer strings
+    batches = token_budget_batches(train_x)
+    train_y_scores = torch.as_tensor(train_y_scores).float()
     for _ in range(num_update_epochs):
-        for batch_ix in range(num_batches):
-            start_idx, stop_idx = batch_ix*bsz, (batch_ix+1)*bsz
-            batch_list = train_x[start_idx:stop_idx]
+        for batch_idxs in batches:
+            batch_list = [train_x[ix] for ix in batch_idxs]
             z, vae_loss = objective.vae_forward(batch_list)
-            batch_y = train_y_scores[start_idx:stop_idx]
-            batch_y = torch.tensor(batch_y).float() 
+            batch_y = train_y_scores[batch_idxs]
             pred = model(z)
             surr_loss = -mll(pred, batch_y.to('cpu'))
             # add losses and back prop 
@@ -75,23 +94,20 @@ def update_models_end_to_end_with_constraints(
             optimize_list.append({f"params": c_model.parameters(), 'lr': learning_rte})
     optimizer = torch.optim.Adam(optimize_list, lr=learning_rte) 
 
-    # max batch size smaller to avoid memory limit with longer strings (more tokens)
-    max_string_length = len(max(train_x, key=len))
-    bsz = max(1, int(2560/max_string_length)) 
-    num_batches = math.ceil(len(train_x) / bsz)
+    # bucket xs by length and cap padded tokens per batch to avoid memory limit with longer strings
+    batches = token_budget_batches(train_x)
+    train_y_scores = torch.as_tensor(train_y_scores).float()
     for _ in range(num_update_epochs):
-        for batch_ix in range(num_batches):
-            start_idx, stop_idx = batch_ix*bsz, (batch_ix+1)*bsz
-            batch_list = train_x[start_idx:stop_idx]
+        for batch_idxs in batches:
+            batch_list = [train_x[ix] for ix in batch_idxs]
             z, vae_loss = objective.vae_forward(batch_list)
-            batch_y = train_y_scores[start_idx:stop_idx]
-            batch_y = torch.tensor(batch_y).float() 
+            batch_y = train_y_scores[batch_idxs]
             pred = model(z)
             surr_loss = -mll(pred, batch_y.to('cpu'))
 
             # add loss terms from constraint models! 
             if train_c_scores is not None:
-                batch_c = train_c_scores[start_idx:stop_idx]
+                batch_c = train_c_scores[batch_idxs]
                 for ix, c_model in enumerate(c_models):
                     batch_c_ix = batch_c[:,ix] 
                     c_pred_ix = c_model(z) 
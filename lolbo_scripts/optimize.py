@@ -34,7 +34,7 @@ class Optimize(object):
         minimize: If True we want to minimize the objective, otherwise we assume we want to maximize the objective
         max_n_oracle_calls: Max number of oracle calls allowed (budget). Optimization run terminates when this budget is exceeded
         learning_rte: Learning rate for model updates
-        acq_func: Acquisition function, must be either ei or ts (ei-->Expected Imporvement, ts-->Thompson Sampling)
+        acq_func: Acquisition function, must be either ei, ts or pathwise_ts (ei-->Expected Imporvement, ts-->Thompson Sampling, pathwise_ts-->Thompson Sampling with decoupled function samples on 50k candidates)
         bsz: Acquisition batch size
         num_initialization_points: Number evaluated data points used to optimization initialize run
         init_n_update_epochs: Number of epochs to train the surrogate model for on initial data before optimization begins
@@ -43,6 +43,7 @@ class Optimize(object):
         update_e2e: If True, we update the models end to end (we run LOLBO). If False, we never update end to end (we run TuRBO)
         k: We keep track of and update end to end on the top k points found during optimization
         verbose: If True, we print out updates such as best score found, number of oracle calls made, etc. 
+        max_pending_batches: If > 0, run asynchronously: propose new batches while up to this many earlier batches are still being scored by the oracle (use with num_oracle_workers > 1)
     """
     def __init__(
         self,
@@ -66,6 +67,7 @@ class Optimize(object):
         recenter_only=False,
         log_table_freq=10_000, 
         save_vae_ckpt=False,
+        max_pending_batches: int=0,
     ):
         signal.signal(signal.SIGINT, self.handler)
         # add all local args to method args dict to be logged by wandb
@@ -84,6 +86,7 @@ class Optimize(object):
         self.num_initialization_points = num_initialization_points
         self.e2e_freq = e2e_freq
         self.update_e2e = update_e2e
+        self.max_pending_batches = max_pending_batches
         self.set_seed()
         if wandb_project_name: # if project name specified
             self.wandb_project_name = wandb_project_name
@@ -203,25 +206,97 @@ class Optimize(object):
         # creates wandb tracker iff self.track_with_wandb == True
         self.create_wandb_tracker()
         last_logged_n_calls = 0 # log table + save vae ckpt every log_table_freq oracle calls
-        #main optimization loop
-        while self.lolbo_state.objective.num_calls < self.max_n_oracle_calls:
+        if self.max_pending_batches > 0:
+            self.run_lolbo_async_loop(last_logged_n_calls)
+        else:
+            #main optimization loop
+            while self.lolbo_state.objective.num_calls < self.max_n_oracle_calls:
+                self.log_data_to_wandb_on_each_loop()
+                # update models end to end when we fail to make
+                #   progress e2e_freq times in a row (e2e_freq=10 by default)
+                if (self.lolbo_state.progress_fails_since_last_e2e >= self.e2e_freq) and self.update_e2e:
+                    if not self.recenter_only:
+                        self.lolbo_state.update_models_e2e()
+                    self.lolbo_state.recenter()
+                    # Track this 
+                    if self.recenter_only:
+                        self.lolbo_state.update_surrogate_model()
+                else: # otherwise, just update the surrogate model on data
+                    self.lolbo_state.update_surrogate_model()
+                # generate new candidate points, evaluate them, and update data
+                self.lolbo_state.acquisition()
+                if self.lolbo_state.tr_state.restart_triggered:
+                    self.lolbo_state.initialize_tr_state()
+                # if a new best has been found, print out new best input and score:
+                if self.lolbo_state.new_best_found:
+                    if self.verbose:
+                        print("\nNew best found:")
+                        self.print_progress_update()
+                    self.lolbo_state.new_best_found = False
+                if (self.lolbo_state.objective.num_calls - last_logged_n_calls) >= self.log_table_freq:
+                    self.final_save = False 
+                    self.log_topk_table_wandb()
+                    last_logged_n_calls = self.lolbo_state.objective.num_calls
+
+
+        # if verbose, print final results 
+        if self.verbose:
+            print("\nOptimization Run Finished, Final Results:")
+            self.print_progress_update()
+
+        # log top k scores and xs in table
+        self.final_save = True 
+        self.log_topk_table_wandb()
+        self.tracker.finish()
+
+        return self 
+
+
+    def run_lolbo_async_loop(self, last_logged_n_calls=0):
+        ''' Asynchronous version of the main optimization loop,
+            new batches are proposed (with the batches still in flight
+            passed as pending points) while earlier batches are being scored,
+            and results are added to the data as they arrive
+        '''
+        pending = [] # batches submitted to the oracle, oldest first
+        new_data = True
+        # several batches can be collected between surrogate updates,
+        #   so the update trains on all rows added since the last one (not just the last bsz)
+        n_train_at_last_update = self.lolbo_state.train_z.shape[0]
+        # xs still being scored count toward the budget, so in-flight batches don't overshoot it
+        while self.lolbo_state.objective.num_calls + self.n_in_flight_calls(pending) < self.max_n_oracle_calls:
             self.log_data_to_wandb_on_each_loop()
-            # update models end to end when we fail to make
-            #   progress e2e_freq times in a row (e2e_freq=10 by default)
             if (self.lolbo_state.progress_fails_since_last_e2e >= self.e2e_freq) and self.update_e2e:
+                # zs of in-flight batches live in the current latent space,
+                #   so collect all of them before the vae is changed
+                self.collect_pending_batches(pending, wait_for_all=True)
                 if not self.recenter_only:
                     self.lolbo_state.update_models_e2e()
                 self.lolbo_state.recenter()
-                # Track this 
                 if self.recenter_only:
-                    self.lolbo_state.update_surrogate_model()
-            else: # otherwise, just update the surrogate model on data
-                self.lolbo_state.update_surrogate_model()
-            # generate new candidate points, evaluate them, and update data
-            self.lolbo_state.acquisition()
+                    self.lolbo_state.update_surrogate_model(
+                        n_new=self.lolbo_state.train_z.shape[0] - n_train_at_last_update
+                    )
+                    n_train_at_last_update = self.lolbo_state.train_z.shape[0]
+            elif new_data: # only retrain surrogate model once new data has come in
+                self.lolbo_state.update_surrogate_model(
+                    n_new=self.lolbo_state.train_z.shape[0] - n_train_at_last_update
+                )
+                n_train_at_last_update = self.lolbo_state.train_z.shape[0]
+            z_pending = None
+            if len(pending) > 0:
+                z_pending = torch.cat([batch['z'] for batch in pending], dim=-2)
+            pending.append(self.lolbo_state.submit_acquisition(z_pending=z_pending))
+            # only block on the oracle once all pending slots are full
+            #   (pending includes the batch just submitted, so up to 
+            #   max_pending_batches earlier batches stay in flight)
+            n_collected = self.collect_pending_batches(
+                pending,
+                wait_for_oldest=len(pending) > self.max_pending_batches,
+            )
+            new_data = n_collected > 0
             if self.lolbo_state.tr_state.restart_triggered:
                 self.lolbo_state.initialize_tr_state()
-            # if a new best has been found, print out new best input and score:
             if self.lolbo_state.new_best_found:
                 if self.verbose:
                     print("\nNew best found:")
@@ -231,19 +306,35 @@ class Optimize(object):
                 self.final_save = False 
                 self.log_topk_table_wandb()
                 last_logged_n_calls = self.lolbo_state.objective.num_calls
+        # don't lose batches still being scored when the budget runs out
+        self.collect_pending_batches(pending, wait_for_all=True)
 
+        return self
 
-        # if verbose, print final results 
-        if self.verbose:
-            print("\nOptimization Run Finished, Final Results:")
-            self.print_progress_update()
 
-        # log top k scores and xs in table
-        self.final_save = True 
-        self.log_topk_table_wandb()
-        self.tracker.finish()
+    def n_in_flight_calls(self, pending):
+        ''' Number of uncached xs submitted to the oracle by the batches in pending '''
+        return sum(len(batch['xs_to_be_queired']) for batch in pending)
 
-        return self 
+
+    def collect_pending_batches(self, pending, wait_for_oldest=False, wait_for_all=False):
+        ''' Adds every finished batch in pending to the data 
+            (removing it from pending), optionally waiting on the oldest 
+            or on all batches first. Returns number of batches collected
+        '''
+        n_collected = 0
+        while len(pending) > 0:
+            if wait_for_all or (wait_for_oldest and n_collected == 0):
+                batch = pending.pop(0)
+            else:
+                finished = [ix for ix, batch in enumerate(pending) if self.lolbo_state.objective.ready(batch)]
+                if len(finished) == 0:
+                    break
+                batch = pending.pop(finished[0])
+            self.lolbo_state.collect_acquisition(batch)
+            n_collected += 1
+
+        return n_collected
 
 
     def print_progress_update(self):
@@ -282,8 +373,8 @@ class Optimize(object):
             # save top k xs and ys 
             cols = ["Top K Scores", "Top K Strings"]
             data_list = []
-            for ix, score in enumerate(self.lolbo_state.top_k_scores):
-                data_list.append([ score, str(self.lolbo_state.top_k_xs[ix]) ])
+            for ix, score in enumerate(self.lolbo_state.top_k.scores):
+                data_list.append([ score, str(self.lolbo_state.top_k.xs[ix]) ])
             top_k_table = wandb.Table(columns=cols, data=data_list)
             self.tracker.log({f"top_k_table": top_k_table})
 
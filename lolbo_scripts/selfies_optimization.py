@@ -21,6 +21,7 @@ class SelfiesOptimization(Optimize):
         dim: dimensionality of latent space of VAE
         constraint1_min_threshold: min allowed value for constraint 1 (None --> unconstrained)
         constraint2_max_threshold: max allowed value for constraint 2 (None --> unconstrained)
+        score_store_path: Path to sqlite file used to share oracle scores across runs (None --> no persistent store)
     """
     def __init__(
         self,
@@ -32,6 +33,11 @@ class SelfiesOptimization(Optimize):
         constraint_thresholds: list=[], # list of corresponding threshold values (floats)
         constraint_types: list=[], # list of strings giving correspoding type for each threshold ("min" or "max" allowed)
         init_data_path: str="../initialization_data/guacamol_train_data_first_20k.csv",
+        score_store_path: str=None, # optional sqlite file used to share oracle scores across (parallel) runs
+        num_oracle_workers: int=1, # number of xs scored concurrently by the oracle
+        oracle_executor: str="thread", # "thread" or "process" pool used when num_oracle_workers > 1
+        oracle_timeout: float=None, # max seconds for one oracle call once it starts running (None --> no limit)
+        num_scoring_workers: int=1, # number of processes used to score each batch of smiles (guacamol/logp/qed)
         **kwargs,
     ):
         self.path_to_vae_statedict = path_to_vae_statedict
@@ -39,6 +45,11 @@ class SelfiesOptimization(Optimize):
         self.max_string_length = max_string_length
         self.task_specific_args = task_specific_args 
         self.init_data_path = init_data_path
+        self.score_store_path = score_store_path
+        self.num_oracle_workers = num_oracle_workers
+        self.oracle_executor = oracle_executor
+        self.oracle_timeout = oracle_timeout
+        self.num_scoring_workers = num_scoring_workers
         # To specify constraints, pass in 
         #   1. constraint_function_ids: a list of constraint function ids, 
         #   2. constraint_thresholds: a list of thresholds, 
@@ -68,6 +79,11 @@ class SelfiesOptimization(Optimize):
             constraint_function_ids=self.constraint_function_ids, # list of strings identifying the black box constraint function to use
             constraint_thresholds=self.constraint_thresholds, # list of corresponding threshold values (floats)
             constraint_types=self.constraint_types, # list of strings giving correspoding type for each threshold ("min" or "max" allowed)
+            score_store_path=self.score_store_path, # optional sqlite file used to share oracle scores across runs
+            num_oracle_workers=self.num_oracle_workers,
+            oracle_executor=self.oracle_executor,
+            oracle_timeout=self.oracle_timeout,
+            num_scoring_workers=self.num_scoring_workers,
         )
         # if train zs have not been pre-computed for particular vae, compute them 
         #   by passing initialization selfies through vae 
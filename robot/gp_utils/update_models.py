@@ -1,6 +1,6 @@
 import torch
-import math
 from torch.utils.data import TensorDataset, DataLoader
+from lolbo.utils.utils import token_budget_batches
 
 
 def update_models_end_to_end(
@@ -18,17 +18,14 @@ def update_models_end_to_end(
     optimizer = torch.optim.Adam([
             {'params': objective.vae.parameters()},
             {'params': model.parameters(), 'lr': learning_rte} ], lr=learning_rte)
-    # max batch size smaller to avoid memory limit with longer strings (more tokens)
-    max_string_length = len(max(train_x, key=len))
-    bsz = max(1, int(2560/max_string_length)) 
-    num_batches = math.ceil(len(train_x) / bsz)
+    # bucket xs by length and cap padded tokens per batch to avoid memory limit with longer strings
+    batches = token_budget_batches(train_x)
+    train_y_scores = torch.as_tensor(train_y_scores).float()
     for _ in range(num_update_epochs):
-        for batch_ix in range(num_batches):
-            start_idx, stop_idx = batch_ix*bsz, (batch_ix+1)*bsz
-            batch_list = train_x[start_idx:stop_idx]
+        for batch_idxs in batches:
+            batch_list = [train_x[ix] for ix in batch_idxs]
             z, vae_loss = objective.vae_forward(batch_list)
-            batch_y = train_y_scores[start_idx:stop_idx]
-            batch_y = torch.tensor(batch_y).float() 
+            batch_y = train_y_scores[batch_idxs]
             pred = model(z)
             surr_loss = -mll(pred, batch_y.to('cpu'))
             # add losses and back prop 
@@ -3,10 +3,16 @@ import torch
 import sys 
 sys.path.append("../")
 from robot.latent_space_objective import LatentSpaceObjective
+from lolbo.utils.score_store import SqliteScoreStore
+from lolbo.utils.oracle_pool import maybe_wrap_in_oracle_pool
 from uniref_vae.data import collate_fn 
 from uniref_vae.load_vae import load_vae
 from your_tasks.your_objective_functions import OBJECTIVE_FUNCTIONS_DICT 
-from your_tasks.your_diversity_functions import DIVERSITY_FUNCTIONS_DICT 
+from your_tasks.your_diversity_functions import (
+    DIVERSITY_FUNCTIONS_DICT,
+    BOUNDED_DIVERSITY_FUNCTIONS_DICT,
+    METRIC_DIVERSITY_FUNCTION_IDS,
+)
 
 
 class InfoTransformerVAEDiverseObjective(LatentSpaceObjective):
@@ -25,14 +31,28 @@ class InfoTransformerVAEDiverseObjective(LatentSpaceObjective):
         num_calls=0,
         lb=None,
         ub=None,
+        score_store_path=None, # optional sqlite file used to share oracle scores across runs
+        num_oracle_workers=1, # number of xs scored concurrently by the oracle
+        oracle_executor="thread", # "thread" or "process" pool used when num_oracle_workers > 1
+        oracle_timeout=None, # max seconds for one oracle call once it starts running (None --> no limit)
     ):
         self.dim                    = dim # VAE latent space dim 
         self.path_to_vae_statedict  = path_to_vae_statedict # path to trained vae stat dict
         self.task_specific_args     = task_specific_args
         self.max_string_length      = max_string_length # max string length that VAE can generate
         self.divf_id                = divf_id # specify which diversity function to use with string id 
+        self.divf_is_metric         = divf_id in METRIC_DIVERSITY_FUNCTION_IDS
         assert task_id in OBJECTIVE_FUNCTIONS_DICT 
-        self.objective_function = OBJECTIVE_FUNCTIONS_DICT[task_id](*self.task_specific_args)
+        self.objective_function = maybe_wrap_in_oracle_pool(
+            OBJECTIVE_FUNCTIONS_DICT[task_id](*self.task_specific_args),
+            num_oracle_workers=num_oracle_workers,
+            oracle_executor=oracle_executor,
+            oracle_timeout=oracle_timeout,
+        )
+
+        score_store = None
+        if score_store_path is not None:
+            score_store = SqliteScoreStore(score_store_path, task_id, self.task_specific_args)
         
         super().__init__(
             num_calls=num_calls,
@@ -41,6 +61,7 @@ class InfoTransformerVAEDiverseObjective(LatentSpaceObjective):
             dim=self.dim, #  DEFAULT VAE LATENT SPACE DIM
             lb=lb,
             ub=ub,
+            score_store=score_store,
         )
 
     def vae_decode(self, z):
@@ -75,6 +96,17 @@ class InfoTransformerVAEDiverseObjective(LatentSpaceObjective):
         return scores_list[0]
 
 
+    def query_oracle_batch(self, xs):
+        ''' Input: 
+                list of items xs (list of aa seqs)
+            Output:
+                a LIST of corresponding scores which are y,
+                one oracle call for the whole list
+        '''
+        scores_list = self.objective_function(xs)
+        return scores_list 
+
+
     def initialize_vae(self):
         ''' Sets self.vae to the desired pretrained vae and 
             sets self.dataobj to the corresponding data class 
@@ -114,3 +146,10 @@ class InfoTransformerVAEDiverseObjective(LatentSpaceObjective):
             with some minimum diversity between eachother
         '''
         return DIVERSITY_FUNCTIONS_DICT[self.divf_id](x1, x2) 
+
+
+    def bounded_divf(self, x1, x2, bound):
+        ''' divf(x1, x2) if it is < bound, otherwise a value >= bound '''
+        if self.divf_id in BOUNDED_DIVERSITY_FUNCTIONS_DICT:
+            return BOUNDED_DIVERSITY_FUNCTIONS_DICT[self.divf_id](x1, x2, bound)
+        return self.divf(x1, x2)
@@ -19,6 +19,7 @@ class LatentSpaceObjective(Objective):
         dim=256,
         lb=None,
         ub=None,
+        score_store=None,
     ):
         super().__init__(
             xs_to_scores_dict=xs_to_scores_dict,
@@ -27,6 +28,7 @@ class LatentSpaceObjective(Objective):
             dim=dim,
             lb=lb,
             ub=ub,
+            score_store=score_store,
         )
         # load in pretrained VAE, store in variable self.vae
         self.vae = None
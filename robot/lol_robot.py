@@ -1,9 +1,11 @@
 import torch
-import math
 import numpy as np
 from robot.trust_region import update_state
 from robot.gp_utils.update_models import update_models_end_to_end
+from lolbo.utils.utils import token_budget_batches
 from robot.robot import RobotState
+from lolbo.utils.growable_tensor import append_rows
+from lolbo.utils.top_k import TopK
 
 class LolRobotState(RobotState):
 
@@ -23,6 +25,7 @@ class LolRobotState(RobotState):
         bsz=10,
         acq_func='ts',
         verbose=True,
+        batch_decode_trs=True,
     ):
 
         super().__init__(
@@ -40,6 +43,7 @@ class LolRobotState(RobotState):
             bsz=bsz,
             acq_func=acq_func,
             verbose=verbose,
+            batch_decode_trs=batch_decode_trs,
             )
 
         self.progress_fails_since_last_e2e = 0
@@ -84,6 +88,7 @@ class LolRobotState(RobotState):
         feasible_ys = out_dict['scores']
         feasible_searchspace_pts = out_dict['valid_zs']
         self.all_feasible_xs = self.all_feasible_xs + feasible_xs.tolist() 
+        self.all_feasible_xs_index.extend(feasible_xs.tolist())
 
         return feasible_ys, feasible_searchspace_pts
 
@@ -91,7 +96,7 @@ class LolRobotState(RobotState):
     def get_feasible_cands(self, x_cands ):
         self.feasible_xs, bool_arr = self.remove_infeasible_candidates(
             x_cands=x_cands, 
-            higher_ranked_cands=self.all_feasible_xs
+            higher_ranked_cands=self.all_feasible_xs_index
         )
         feasible_searchspace_pts = self.z_next[bool_arr]
         
@@ -104,6 +109,24 @@ class LolRobotState(RobotState):
         return x_next
 
 
+    def generate_batch_all_trs(self):
+        ''' Generates candidate zs in every trust region and decodes 
+            all M x bsz of them with a single vae_decode call '''
+        self.tr_z_nexts = [RobotState.generate_batch_single_tr(self, state) for state in self.rank_ordered_trs]
+        x_nexts = self.objective.vae_decode(torch.cat(self.tr_z_nexts))
+        self.tr_batches = []
+        start = 0
+        for z_next in self.tr_z_nexts:
+            self.tr_batches.append(x_nexts[start:start + len(z_next)])
+            start += len(z_next)
+
+
+    def tr_batch(self, ix):
+        # z_next of this tr, used by get_feasible_cands
+        self.z_next = self.tr_z_nexts[ix]
+        return self.tr_batches[ix]
+
+
     def update_data_all_feasible_points(self,):
         self.update_next(
             z_next_=self.all_feasible_searchspace_pts,
@@ -116,11 +139,10 @@ class LolRobotState(RobotState):
     def initialize_top_k(self):
         ''' Initialize top k x, y, and zs'''
         # track top k scores found
-        self.top_k_scores, top_k_idxs = torch.topk(self.train_y.squeeze(), min(self.k, len(self.train_y)))
-        self.top_k_scores = self.top_k_scores.tolist()
-        top_k_idxs = top_k_idxs.tolist()
-        self.top_k_xs = [self.train_x[i] for i in top_k_idxs]
-        self.top_k_zs = [self.train_z[i].unsqueeze(-2) for i in top_k_idxs]
+        self.top_k = TopK(self.k, key=self.objective.canonical_key)
+        top_k_scores, top_k_idxs = torch.topk(self.train_y.squeeze(), min(self.k, len(self.train_y)))
+        for score, i in zip(top_k_scores.tolist(), top_k_idxs.tolist()):
+            self.top_k.add(score, self.train_x[i], self.train_z[i])
 
 
     def update_next(self, z_next_, y_next_, x_next_, acquisition=False):
@@ -141,18 +163,9 @@ class LolRobotState(RobotState):
         progress = False
         for i, score in enumerate(y_next_):
             self.train_x.append(x_next_[i] )
-            if len(self.top_k_scores) < self.k: 
-                # if we don't yet have k top scores, add it to the list
-                self.top_k_scores.append(score.item())
-                self.top_k_xs.append(x_next_[i])
-                self.top_k_zs.append(z_next_[i].unsqueeze(-2))
-            elif score.item() > min(self.top_k_scores) and (x_next_[i] not in self.top_k_xs):
-                # if the score is better than the worst score in the top k list, upate the list
-                min_score = min(self.top_k_scores)
-                min_idx = self.top_k_scores.index(min_score)
-                self.top_k_scores[min_idx] = score.item()
-                self.top_k_xs[min_idx] = x_next_[i]
-                self.top_k_zs[min_idx] = z_next_[i].unsqueeze(-2) # .to('cpu')
+            # add to top k if we don't yet have k points or if the score 
+            #   is better than the worst score in the top k 
+            self.top_k.add(score.item(), x_next_[i], z_next_[i])
             #if we imporve 
             if score.item() > self.best_score_seen:
                 self.progress_fails_since_last_e2e = 0
@@ -162,8 +175,8 @@ class LolRobotState(RobotState):
         if (not progress) and acquisition: # if no progress msde, increment progress fails
             self.progress_fails_since_last_e2e += 1
         y_next_ = y_next_.unsqueeze(-1)
-        self.train_y = torch.cat((self.train_y, y_next_), dim=-2)
-        self.train_z = torch.cat((self.train_z, z_next_), dim=-2)
+        append_rows(self, "train_y", y_next_)
+        append_rows(self, "train_z", z_next_)
 
 
     def update_models_e2e(self):
@@ -172,8 +185,8 @@ class LolRobotState(RobotState):
         self.progress_fails_since_last_e2e = 0
         new_xs = self.train_x[-self.num_new_points:]
         new_ys = self.train_y[-self.num_new_points:].squeeze(-1).tolist()
-        train_x = new_xs + self.top_k_xs
-        train_y = torch.tensor(new_ys + self.top_k_scores).float()
+        train_x = new_xs + self.top_k.xs
+        train_y = torch.tensor(new_ys + self.top_k.scores).float()
         self.objective, self.model = update_models_end_to_end(
             train_x,
             train_y,
@@ -199,16 +212,13 @@ class LolRobotState(RobotState):
         self.model.train()
         optimizer1 = torch.optim.Adam([{'params': self.model.parameters(),'lr': self.learning_rte} ], lr=self.learning_rte)
         new_xs = self.train_x[-self.num_new_points:]
-        train_x = new_xs + self.top_k_xs
-        max_string_len = len(max(train_x, key=len))
-        # max batch size smaller to avoid memory limit 
-        #   with longer strings (more tokens) 
-        bsz = max(1, int(2560/max_string_len))
-        num_batches = math.ceil(len(train_x) / bsz) 
+        train_x = new_xs + self.top_k.xs
+        # bucket xs by length and cap padded tokens per batch 
+        #   to avoid memory limit with longer strings (more tokens) 
+        batches = token_budget_batches(train_x)
         for _ in range(self.num_update_epochs):
-            for batch_ix in range(num_batches):
-                start_idx, stop_idx = batch_ix*bsz, (batch_ix+1)*bsz
-                batch_list = train_x[start_idx:stop_idx] 
+            for batch_idxs in batches:
+                batch_list = [train_x[ix] for ix in batch_idxs]
                 z, _ = self.objective.vae_forward(batch_list)
                 out_dict = self.objective(z)
                 scores_arr = out_dict['scores'] 
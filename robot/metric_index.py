@@ -0,0 +1,113 @@
+class BKTree:
+    '''Incremental BK-tree (Burkhard & Keller 1973) over the xs accepted so far,
+        used by ROBOT to check if a candidate is within tau of any higher ranked x.
+        divf must be a true metric (i.e. edit distance), since queries skip
+        every subtree the triangle inequality rules out:
+            for a node p with d = divf(x, p), a child subtree holding ys with
+            divf(p, y) = k can only contain a y with divf(x, y) < tau if |d - k| < tau.
+        Works for real valued metrics too (children are keyed by exact distance).
+        bounded_divf(x1, x2, bound) optionally gives divf(x1, x2) if it is < bound
+        and any value >= bound otherwise (i.e. lolbo.utils.edit_distance.bounded_edit_distance),
+        queries only need d up to tau + (largest child key) so they can stop early'''
+
+    def __init__(self, divf, xs=(), bounded_divf=None):
+        self.divf = divf
+        self.bounded_divf = bounded_divf
+        self.root = None # (x, {divf(child x, x): child node})
+        self.n = 0
+        self.extend(xs)
+
+
+    def __len__(self):
+        return self.n
+
+
+    def add(self, x):
+        self.n += 1
+        if self.root is None:
+            self.root = (x, {})
+            return
+        node = self.root
+        while True:
+            d = self.divf(x, node[0])
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (x, {})
+                return
+            node = child
+
+
+    def extend(self, xs):
+        for x in xs:
+            self.add(x)
+
+
+    def any_within(self, x, tau):
+        ''' True iff divf(x, y) < tau for some indexed y '''
+        return self.find_within(x, tau) is not None
+
+
+    def find_within(self, x, tau):
+        ''' An indexed y with divf(x, y) < tau, None if there is none '''
+        if self.root is None:
+            return None
+        stack = [self.root]
+        while stack:
+            node_x, children = stack.pop()
+            if self.bounded_divf is None:
+                d = self.divf(x, node_x)
+            else:
+                # d >= tau + max key prunes every child, just like the exact d would
+                d = self.bounded_divf(x, node_x, tau + max(children, default=0))
+            if d < tau:
+                return node_x
+            for k, child in children.items():
+                if abs(d - k) < tau:
+                    stack.append(child)
+
+        return None
+
+
+class LinearIndex:
+    '''Same interface as BKTree for diversity functions that are not metrics,
+        any_within checks x against every indexed y'''
+
+    def __init__(self, divf, xs=(), bounded_divf=None):
+        self.divf = divf
+        self.bounded_divf = bounded_divf
+        self.xs = list(xs)
+
+
+    def __len__(self):
+        return len(self.xs)
+
+
+    def add(self, x):
+        self.xs.append(x)
+
+
+    def extend(self, xs):
+        self.xs.extend(xs)
+
+
+    def any_within(self, x, tau):
+        return self.find_within(x, tau) is not None
+
+
+    def find_within(self, x, tau):
+        for y in self.xs:
+            if self.bounded_divf is None:
+                d = self.divf(x, y)
+            else:
+                d = self.bounded_divf(x, y, tau)
+            if d < tau:
+                return y
+        return None
+
+
+def make_diversity_index(divf, xs=(), divf_is_metric=False, bounded_divf=None):
+    ''' BKTree over xs if divf is a true metric, LinearIndex otherwise '''
+    if divf_is_metric:
+        return BKTree(divf, xs, bounded_divf=bounded_divf)
+    return LinearIndex(divf, xs, bounded_divf=bounded_divf)
+
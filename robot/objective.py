@@ -1,5 +1,6 @@
 import numpy as np
 import torch 
+from lolbo.utils.oracle_pool import OraclePool
 
 class Objective:
     '''Base class for any optimization task
@@ -7,6 +8,10 @@ class Objective:
         the total number of oracle class made during 
         optimization 
     ''' 
+    # True iff divf is a true metric (triangle inequality holds),
+    #   lets ROBOT index accepted xs in a BK-tree (see robot/metric_index.py)
+    divf_is_metric = False
+
     def __init__(
         self,
         xs_to_scores_dict={},
@@ -15,9 +20,16 @@ class Objective:
         dim=256,
         lb=None,
         ub=None,
+        score_store=None,
     ):
         # dict used to track xs and scores (ys) queried during optimization
         self.xs_to_scores_dict = xs_to_scores_dict 
+        # optional persistent store (see lolbo/utils/score_store.py) 
+        #   shared across runs, consulted before calling the oracle
+        self.score_store = score_store
+        # memo table x --> canonical_key(x), the keys of xs_to_scores_dict 
+        #   (see canonicalize(), i.e. one key for all smiles strings of a molecule)
+        self.canonical_keys = {}
         # track total number of times the oracle has been called
         self.num_calls = num_calls
         # string id for optimization task, often used by oracle
@@ -44,24 +56,50 @@ class Objective:
 
 
     def xs_to_valid_scores(self, xs):
+        keys = [self.canonical_key(x) for x in xs]
+        if self.score_store is not None:
+            # pull in scores already computed by earlier or parallel runs
+            self.xs_to_scores_dict.update(self.score_store.lookup(
+                [key for key in keys if isinstance(key, str) and (key not in self.xs_to_scores_dict)]
+            ))
         scores = []
-        for idx, x in enumerate(xs):
+        xs_to_be_queired = []
+        keys_to_be_queired = {} # canonical key --> index into xs_to_be_queired
+        for x, key in zip(xs, keys):
             # if we have already computed the score, don't 
             #   re-compute (don't call oracle unnecessarily)
-            if x in self.xs_to_scores_dict:
-                score = self.xs_to_scores_dict[x]
-            else: # otherwise call the oracle to get score
-                score = self.query_oracle(x)
-                # add score to dict so we don't have to
-                #   compute it again if we get the same input x
-                self.xs_to_scores_dict[x] = score
-                # track number of oracle calls 
-                #   nan scores happen when we pass an invalid
-                #   molecular string and thus avoid calling the
-                #   oracle entirely
-                if np.logical_not(np.isnan(score)):
-                    self.num_calls += 1
+            if key in self.xs_to_scores_dict:
+                score = self.xs_to_scores_dict[key]
+            else: # otherwise score it below with the rest of the batch
+                score = "?"
+                # equivalent xs in one batch are only scored once
+                if key not in keys_to_be_queired:
+                    keys_to_be_queired[key] = len(xs_to_be_queired)
+                    xs_to_be_queired.append(x)
             scores.append(score)
+        # one oracle call for all uncached xs 
+        computed_scores, failed = self.query_oracle_uncached(xs_to_be_queired)
+        # add scores to dict so we don't have to
+        #   compute them again if we get the same (or an equivalent) input x
+        #   (nans of oracle calls that raised or timed out say nothing about x and are not cached)
+        cached_keys = [key for key, ix in keys_to_be_queired.items() if not failed[ix]]
+        for key in cached_keys:
+            self.xs_to_scores_dict[key] = computed_scores[keys_to_be_queired[key]]
+        if self.score_store is not None:
+            self.score_store.insert(cached_keys, [computed_scores[keys_to_be_queired[key]] for key in cached_keys])
+        # move computed scores to scores list 
+        temp = [] 
+        for score, key in zip(scores, keys):
+            if isinstance(score, str) and score == "?":
+                temp.append(computed_scores[keys_to_be_queired[key]]) 
+            else:
+                temp.append(score)
+        scores = temp 
+        # track number of oracle calls 
+        #   nan scores happen when we pass an invalid
+        #   molecular string and thus avoid calling the
+        #   oracle entirely
+        self.num_calls += int(np.logical_not(np.isnan(np.array(computed_scores, dtype=float))).sum())
         scores_arr = np.array(scores)
         if type(xs) is list: 
             xs = np.array(xs) 
@@ -79,6 +117,49 @@ class Objective:
         return out_dict
 
 
+    def query_oracle_uncached(self, xs):
+        ''' Input: 
+                a list of uncached input space items xs (rows of a tensor search space)
+            Output:
+                list of scores, and list of bools (True where the oracle call failed or timed out),
+                xs are scored concurrently when self.objective_function is an OraclePool 
+                and with query_oracle_batch() otherwise
+        '''
+        if len(xs) == 0:
+            return [], []
+        objective_function = getattr(self, "objective_function", None)
+        if isinstance(objective_function, OraclePool):
+            futures = objective_function.submit(xs)
+            scores = objective_function.gather(futures)
+            return scores, [future.exception() is not None for future in futures]
+        if torch.is_tensor(xs[0]):
+            xs = torch.stack(xs)
+        return list(self.query_oracle_batch(xs)), [False]*len(xs)
+
+
+    def canonical_key(self, x):
+        ''' Key of x in xs_to_scores_dict, the score store and the top k
+            (memoized canonicalize(x)) '''
+        if not isinstance(x, str):
+            return self.canonicalize(x)
+        key = self.canonical_keys.get(x)
+        if key is None:
+            key = self.canonicalize(x)
+            self.canonical_keys[x] = key
+        return key
+
+
+    def canonicalize(self, x):
+        ''' Input: 
+                an input space item x
+            Output:
+                canonical form of x, xs with the same canonical form 
+                are treated as the same x and only scored by the oracle once
+                (identity by default, override i.e. with canonical smiles for molecules)
+        '''
+        return x
+
+
     def query_oracle(self, x):
         ''' Input: 
                 a single input space item x
@@ -90,6 +171,17 @@ class Objective:
         raise NotImplementedError("Must implement query_oracle() specific to desired optimization task")
 
 
+    def query_oracle_batch(self, xs):
+        ''' Input: 
+                a list of input space items xs (or a tensor with one x per row)
+            Output:
+                list of the corresponding scores y (np.nan for invalid xs),
+                calls query_oracle() on each x by default, 
+                override to score the whole batch in one oracle call
+        '''
+        return [self.query_oracle(x) for x in xs]
+
+
     def divf(self, x1, x2):
         ''' Input: 
                 x1 and x2, two arbitrary items from search space X
@@ -97,3 +189,14 @@ class Objective:
                 float giving some measure of diversity between x1 and x2
         '''
         raise NotImplementedError("Must implement method divf() (diversity function)")
+
+
+    def bounded_divf(self, x1, x2, bound):
+        ''' Input: 
+                x1 and x2, two arbitrary items from search space X
+                bound: float
+            Output: 
+                divf(x1, x2) if it is < bound, otherwise any value >= bound 
+                (override with a version that stops early, the default computes divf exactly)
+        '''
+        return self.divf(x1, x2)
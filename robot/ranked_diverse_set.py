@@ -0,0 +1,97 @@
+import bisect
+from robot.metric_index import make_diversity_index
+
+
+class RankedDiverseSet:
+    '''Greedy rank ordered diverse set over ROBOT's growing train data,
+        kept up to date incrementally across steps (see RobotState.recenter_trs).
+        Points are held in a list sorted by score (binary search inserts, no full re-sort),
+        select(M) walks down the ranks and accepts a point iff it is not within tau
+        of any higher ranked accepted point, until M points are accepted.
+        The decision made at each rank of the last walk is cached
+        (accepted, or the accepted point within tau of it), so after new points are added:
+            ranks above the highest ranked new point are reused as they are,
+            a point blocked by a point that is still accepted stays rejected without any divf call,
+            a point accepted last time is only checked against the newly accepted points,
+        and the set returned is the same as a full greedy pass over all points'''
+
+    def __init__(
+        self,
+        get_x, # train idx --> x
+        divf,
+        tau,
+        divf_is_metric=False, # True --> BK-tree index over the accepted points (see robot/metric_index.py)
+        bounded_divf=None,
+    ):
+        self.get_x = get_x
+        self.tau = tau
+        self.divf_is_metric = divf_is_metric
+        # the index holds train idxs, divf is applied to the corresponding xs
+        self.divf = lambda i, j: divf(get_x(i), get_x(j))
+        self.bounded_divf = None
+        if bounded_divf is not None:
+            self.bounded_divf = lambda i, j, bound: bounded_divf(get_x(i), get_x(j), bound)
+        self.ranked = [] # (-score, train idx) for all points, highest score first
+        self.walk = [] # (train idx, idx of the accepted point within tau of it or None if accepted) for each rank visited by the last select()
+        self.first_changed_rank = 0 # highest rank a point was inserted at since the last select()
+
+
+    def __len__(self):
+        return len(self.ranked)
+
+
+    def extend(self, scores):
+        ''' Adds the next len(scores) points (train idxs len(self), len(self) + 1, ...) '''
+        for score in scores:
+            item = (-score, len(self.ranked))
+            rank = bisect.bisect_left(self.ranked, item)
+            self.ranked.insert(rank, item)
+            self.first_changed_rank = min(self.first_changed_rank, rank)
+
+
+    def diversity_index(self, idxs=()):
+        return make_diversity_index(
+            self.divf,
+            idxs,
+            divf_is_metric=self.divf_is_metric,
+            bounded_divf=self.bounded_divf,
+        )
+
+
+    def select(self, M):
+        ''' Returns train idxs of the (up to) M highest ranked diverse points, highest score first,
+            fewer than M if all points were visited '''
+        # ranks of the last walk above the first inserted point are unchanged
+        n_reused = min(self.first_changed_rank, len(self.walk))
+        old_blockers = dict(self.walk[n_reused:])
+        previously_accepted = set(idx for idx, blocker in self.walk if blocker is None)
+        self.walk = self.walk[:n_reused]
+        accepted = [idx for idx, blocker in self.walk if blocker is None]
+        accepted_set = set(accepted)
+        index = self.diversity_index(accepted)
+        new_index = self.diversity_index() # accepted points that were not accepted by the last walk
+        rank = n_reused
+        while (len(accepted) < M) and (rank < len(self.ranked)):
+            idx = self.ranked[rank][1]
+            rank += 1
+            if idx not in old_blockers:
+                blocker = index.find_within(idx, self.tau)
+            elif old_blockers[idx] is None:
+                # feasible w.r.t. all points accepted above it last time,
+                #   the relative order of old points is unchanged so only new ones can block it now
+                blocker = new_index.find_within(idx, self.tau)
+            elif old_blockers[idx] in accepted_set:
+                blocker = old_blockers[idx]
+            else:
+                blocker = index.find_within(idx, self.tau)
+            self.walk.append((idx, blocker))
+            if blocker is None:
+                accepted.append(idx)
+                accepted_set.add(idx)
+                index.add(idx)
+                if idx not in previously_accepted:
+                    new_index.add(idx)
+        self.first_changed_rank = len(self.walk)
+
+        return accepted
+
@@ -5,8 +5,17 @@ from gpytorch.mlls import PredictiveLogLikelihood
 from robot.trust_region import TrustRegionState, update_state, generate_batch
 from robot.gp_utils.update_models import update_surr_model
 from robot.gp_utils.ppgpr import GPModelDKL
+from lolbo.utils.growable_tensor import GrowableTensorAttribute, append_rows
+from robot.metric_index import make_diversity_index
+from robot.ranked_diverse_set import RankedDiverseSet
 
 class RobotState:
+    # stored in preallocated buffers so appends in update_next 
+    #   don't copy the full history every step 
+    #   (train_x is only a tensor when the search space is not latent)
+    train_x = GrowableTensorAttribute()
+    train_y = GrowableTensorAttribute()
+    train_z = GrowableTensorAttribute()
 
     def __init__(
         self,
@@ -25,6 +34,7 @@ class RobotState:
         bsz=10,
         acq_func='ts',
         verbose=True,
+        batch_decode_trs=True,
     ):
 
         self.tau                = tau               # Diversity threshold
@@ -39,10 +49,11 @@ class RobotState:
         self.init_n_epochs      = init_n_epochs     # num epochs train surr model on initial data
         self.learning_rte       = learning_rte      # lr to use for model updates
         self.bsz                = bsz               # acquisition batch size
-        self.acq_func           = acq_func          # acquisition function (Expected Improvement (ei) or Thompson Sampling (ts))
+        self.acq_func           = acq_func          # acquisition function (Thompson Sampling (ts) or pathwise Thompson Sampling (pathwise_ts))
         self.verbose            = verbose
+        self.batch_decode_trs   = batch_decode_trs  # if True generate candidates for all trs before filtering (one vae decode per step for LOL-ROBOT)
 
-        assert acq_func == "ts"
+        assert acq_func in ["ts", "pathwise_ts"]
         if minimize:
             self.train_y = self.train_y * -1
 
@@ -63,7 +74,7 @@ class RobotState:
         # put initial xs and ys in dict to be tracked by objective
         init_xs_to_scores_dict = {}
         for idx, x in enumerate(self.train_x):
-            init_xs_to_scores_dict[x] = self.train_y.squeeze()[idx].item()
+            init_xs_to_scores_dict[self.objective.canonical_key(x)] = self.train_y.squeeze()[idx].item()
         self.objective.xs_to_scores_dict = init_xs_to_scores_dict
 
 
@@ -77,6 +88,15 @@ class RobotState:
                 )
             self.rank_ordered_trs.append(state)
         
+        # rank ordered diverse set over all evaluated points, 
+        #   updated incrementally by recenter_trs as points are added
+        self.ranked_diverse_set = RankedDiverseSet(
+            get_x=lambda idx: self.train_x[idx],
+            divf=self.objective.divf,
+            tau=self.tau,
+            divf_is_metric=self.objective.divf_is_metric,
+            bounded_divf=self.objective.bounded_divf,
+        )
         # find feasible tr centers to start 
         self.recenter_trs() 
 
@@ -85,25 +105,24 @@ class RobotState:
         # recenter trust regions and log best diverse set found 
         M_diverse_scores = []
         tr_center_xs = []
-        idx_num = 0
-        _, top_t_idxs = torch.topk(self.train_y.squeeze(), len(self.train_y))
+        tr_center_index = self.diversity_index() # tr_center_xs, for feasibility checks
+        # add points evaluated since the last recenter, then 
+        #   find highest scoring feasible points in dataset for tr centers
+        self.ranked_diverse_set.extend(self.train_y[len(self.ranked_diverse_set):].reshape(-1).tolist())
+        center_idxs = self.ranked_diverse_set.select(self.M)
         for ix, state in enumerate(self.rank_ordered_trs):
-            while True: 
-                # if we run out of feasible points in dataset
-                if idx_num >= len(self.train_y): 
-                    # Randomly sample a new feasible point (rare occurance)
-                    center_x, center_point, center_score = self.randomly_sample_feasible_center(higher_ranked_xs=tr_center_xs) 
-                    break
-                # otherwise, finding highest scoring feassible point in remaining dataset for tr center
-                center_idx = top_t_idxs[idx_num]
+            if ix < len(center_idxs):
+                center_idx = center_idxs[ix]
                 center_score = self.train_y[center_idx].item()
                 center_point = self.search_space_data()[center_idx] 
                 center_x = self.train_x[center_idx]
-                idx_num += 1
-                if self.is_feasible(center_x, higher_ranked_xs=tr_center_xs):
-                    break 
+            else:
+                # if we run out of feasible points in dataset
+                # Randomly sample a new feasible point (rare occurance)
+                center_x, center_point, center_score = self.randomly_sample_feasible_center(higher_ranked_xs=tr_center_index) 
 
             tr_center_xs.append(center_x) 
+            tr_center_index.add(center_x)
             M_diverse_scores.append(center_score)
             state.center_point = center_point
             state.best_value = center_score
@@ -158,9 +177,23 @@ class RobotState:
         self.initial_model_training_complete = True
 
 
+    def diversity_index(self, xs=()):
+        ''' Index over xs answering "is x within tau of any of them" (see robot/metric_index.py),
+            a BK-tree when the objective's divf is a true metric '''
+        return make_diversity_index(
+            self.objective.divf,
+            xs,
+            divf_is_metric=self.objective.divf_is_metric,
+            bounded_divf=self.objective.bounded_divf,
+        )
+
+
     def is_feasible(self, x, higher_ranked_xs): 
+        ''' higher_ranked_xs: list of xs or an index from diversity_index() '''
+        if hasattr(higher_ranked_xs, "any_within"):
+            return not higher_ranked_xs.any_within(x, self.tau)
         for higher_ranked_x in higher_ranked_xs:
-            if self.objective.divf(x, higher_ranked_x) < self.tau:
+            if self.objective.bounded_divf(x, higher_ranked_x, self.tau) < self.tau:
                 return False 
         return True 
 
@@ -209,6 +242,16 @@ class RobotState:
         return search_space_cands
 
 
+    def generate_batch_all_trs(self):
+        ''' Generates candidates in every trust region, 
+            read back per trust region with tr_batch() '''
+        self.tr_batches = [self.generate_batch_single_tr(state) for state in self.rank_ordered_trs]
+
+
+    def tr_batch(self, ix):
+        return self.tr_batches[ix]
+
+
     def remove_infeasible_candidates(self, x_cands, higher_ranked_cands):
         feasible_xs = []
         bool_arr = []
@@ -271,12 +314,20 @@ class RobotState:
         evaluate them, and update data
         '''
         self.all_feasible_xs = [] # (used only by LOL-ROBOT when searchspace pts != xs)
+        self.all_feasible_xs_index = self.diversity_index() # all_feasible_xs, for feasibility checks
         self.all_feasible_ys = []
         self.all_feasible_searchspace_pts = torch.tensor([])
-        for state in self.rank_ordered_trs:
+        if self.batch_decode_trs:
+            # generate the candidates of all trust regions up front
+            #   so they are prepared (i.e. decoded) as one batch 
+            self.generate_batch_all_trs()
+        for ix, state in enumerate(self.rank_ordered_trs):
             # 1. Generate a batch of candidates in 
             #   trust region using global surrogate model
-            x_next = self.generate_batch_single_tr(state)
+            if self.batch_decode_trs:
+                x_next = self.tr_batch(ix)
+            else:
+                x_next = self.generate_batch_single_tr(state)
 
             # 2. Asymetrically remove infeasible candidates
             feasible_searchspace_pts = self.get_feasible_cands(x_next )
@@ -312,5 +363,5 @@ class RobotState:
             self.best_score_seen = y_next_.max().item() 
             self.best_x_seen = x_next_[y_next_.argmax()] 
         y_next_ = y_next_.unsqueeze(-1)
-        self.train_y = torch.cat((self.train_y, y_next_), dim=-2)
-        self.train_x = torch.cat((self.train_x, x_next_), dim=-2)
+        append_rows(self, "train_y", y_next_)
+        append_rows(self, "train_x", x_next_)
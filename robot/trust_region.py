@@ -5,7 +5,7 @@ from torch.quasirandom import SobolEngine
 from botorch.acquisition import qExpectedImprovement
 from botorch.optim import optimize_acqf
 # from .approximate_gp import *
-from botorch.generation import MaxPosteriorSampling 
+from lolbo.utils.bo_utils.constrained_max_posterior_sampling import MaxPosteriorSampling 
 from typing import Any
 # based on TuRBO State from BoTorch
 
@@ -60,13 +60,14 @@ def generate_batch(
     n_candidates=None,  # Number of candidates for Thompson sampling 
     num_restarts=10,
     raw_samples=256,
-    acqf="ts",  # "ei" or "ts"
+    acqf="ts",  # "ei", "ts" or "pathwise_ts" (ts with decoupled function samples, scales to many more candidates)
     dtype=torch.float32,
     device=torch.device('cpu'),
     absolute_bounds=None, 
 ):
-    assert acqf in ("ts", "ei")
+    assert acqf in ("ts", "ei", "pathwise_ts")
     assert torch.all(torch.isfinite(Y))
+    if (n_candidates is None) and (acqf == "pathwise_ts"): n_candidates = 50_000
     if n_candidates is None: n_candidates = min(5000, max(2000, 200 * X.shape[-1]))
 
     x_center = state.center_point
@@ -89,7 +90,7 @@ def generate_batch(
         except: 
             acqf = 'ts'
 
-    if acqf == "ts":
+    if acqf in ("ts", "pathwise_ts"):
         dim = X.shape[-1]
         tr_lb = tr_lb.to('cpu')
         tr_ub = tr_ub.to('cpu') 
@@ -109,7 +110,7 @@ def generate_batch(
         X_cand = X_cand.to('cpu')
         X_cand[mask] = pert[mask]
         # Sample on the candidate points 
-        thompson_sampling = MaxPosteriorSampling(model=model, replacement=False ) 
+        thompson_sampling = MaxPosteriorSampling(model=model, replacement=False, pathwise=(acqf == "pathwise_ts")) 
         X_next = thompson_sampling(X_cand.to('cpu'), num_samples=batch_size )
 
     return X_next
@@ -20,6 +20,10 @@ class InfoTransformerVAEDiverseOptimization(Optimize):
         task_specific_args: list=[], # list of additional args to be passed into objective funcion 
         divf_id: str="edit_dist",
         init_data_path: str="../initialization_data/example_init_data.csv",
+        score_store_path: str=None, # optional sqlite file used to share oracle scores across (parallel) runs
+        num_oracle_workers: int=1, # number of xs scored concurrently by the oracle
+        oracle_executor: str="thread", # "thread" or "process" pool used when num_oracle_workers > 1
+        oracle_timeout: float=None, # max seconds for one oracle call once it starts running (None --> no limit)
         **kwargs,
     ):
         self.dim=dim
@@ -27,6 +31,10 @@ class InfoTransformerVAEDiverseOptimization(Optimize):
         self.task_specific_args = task_specific_args
         self.divf_id = divf_id
         self.init_data_path = init_data_path
+        self.score_store_path = score_store_path
+        self.num_oracle_workers = num_oracle_workers
+        self.oracle_executor = oracle_executor
+        self.oracle_timeout = oracle_timeout
         super().__init__(**kwargs)
 
         # add args to method args dict to be logged by wandb
@@ -41,6 +49,10 @@ class InfoTransformerVAEDiverseOptimization(Optimize):
             max_string_length=self.max_string_length,
             dim=self.dim,
             divf_id=self.divf_id,
+            score_store_path=self.score_store_path,
+            num_oracle_workers=self.num_oracle_workers,
+            oracle_executor=self.oracle_executor,
+            oracle_timeout=self.oracle_timeout,
         )
 
         return self
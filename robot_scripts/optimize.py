@@ -34,7 +34,7 @@ class Optimize(object):
         minimize: If True we want to minimize the objective, otherwise we assume we want to maximize the objective
         max_n_oracle_calls: Max number of oracle calls allowed (budget). Optimization run terminates when this budget is exceeded
         learning_rte: Learning rate for model updates
-        acq_func: Acquisition function, must be either ei or ts (ei-->Expected Imporvement, ts-->Thompson Sampling)
+        acq_func: Acquisition function, must be either ts or pathwise_ts (ts-->Thompson Sampling, pathwise_ts-->Thompson Sampling with decoupled function samples on 50k candidates)
         bsz: Acquisition batch size
         num_initialization_points: Number evaluated data points used to optimization initialize run
         init_n_update_epochs: Number of epochs to train the surrogate model for on initial data before optimization begins
@@ -44,6 +44,7 @@ class Optimize(object):
         save_csv_frequency: Save all collected data to a csv every save_csv_frequency iterations 
         k: We additionally keep track of and update end to end on the top k points found during optimization
         verbose: If True, we print out updates such as best score found, number of oracle calls made, etc. 
+        batch_decode_trs: If True, candidates of all M trust regions are generated (and decoded by the VAE) as one batch each step before the rank ordered feasibility filtering
     """
     def __init__(
         self,
@@ -67,6 +68,7 @@ class Optimize(object):
         save_csv_frequency: int=10,
         k: int=1_000,
         verbose: bool=True,
+        batch_decode_trs: bool=True,
     ):
 
         # add all local args to method args dict to be logged by wandb
@@ -137,7 +139,8 @@ class Optimize(object):
             learning_rte=learning_rte,
             bsz=bsz,
             acq_func=acq_func,
-            verbose=verbose
+            verbose=verbose,
+            batch_decode_trs=batch_decode_trs,
         )
 
 
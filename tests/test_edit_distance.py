@@ -0,0 +1,101 @@
+import random
+import pytest
+from lolbo.utils.edit_distance import edit_distance, bounded_edit_distance, edit_distances
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def dp_edit_distance(s1, s2):
+    # the dict based DP the bit-vector version replaces
+    m = len(s1) + 1
+    n = len(s2) + 1
+    tbl = {}
+    for i in range(m): tbl[i, 0] = i
+    for j in range(n): tbl[0, j] = j
+    for i in range(1, m):
+        for j in range(1, n):
+            cost = 0 if s1[i-1] == s2[j-1] else 1
+            tbl[i, j] = min(tbl[i, j-1]+1, tbl[i-1, j]+1, tbl[i-1, j-1]+cost)
+    return tbl[m-1, n-1]
+
+
+def random_pairs(seed, n_pairs=200):
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(n_pairs):
+        s1 = "".join(rng.choices(ALPHABET[:rng.randint(1, 20)], k=rng.randint(0, 90)))
+        s2 = "".join(rng.choices(ALPHABET[:rng.randint(1, 20)], k=rng.randint(0, 90)))
+        pairs.append((s1, s2))
+    return pairs
+
+
+@pytest.mark.parametrize("s1, s2, distance", [
+    ("", "", 0),
+    ("", "ACD", 3),
+    ("ACD", "", 3),
+    ("ACD", "ACD", 0),
+    ("kitten", "sitting", 3),
+    ("flaw", "lawn", 2),
+    ("A" * 70, "C" * 70, 70), # longer than one 64 bit word
+    (["C", "O", "N"], ["C", "N"], 1), # any sequences of hashable items
+])
+def test_edit_distance_known(s1, s2, distance):
+    assert edit_distance(s1, s2) == distance
+    assert edit_distance(s2, s1) == distance
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_edit_distance_matches_dp(seed):
+    for s1, s2 in random_pairs(seed):
+        assert edit_distance(s1, s2) == dp_edit_distance(s1, s2), (s1, s2)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bounded_edit_distance_matches_dp(seed):
+    rng = random.Random(seed)
+    for s1, s2 in random_pairs(seed):
+        d = dp_edit_distance(s1, s2)
+        tau = rng.randint(1, 60)
+        assert bounded_edit_distance(s1, s2, tau) == min(d, tau), (s1, s2, tau)
+
+
+@pytest.mark.parametrize("s1, s2, tau, expected", [
+    ("kitten", "sitting", 2.5, 3), # d=3 >= 2.5 --> ceil(2.5)
+    ("kitten", "sitting", 3.5, 3), # d=3 < 3.5 --> d
+    ("kitten", "sitting", 3.0, 3),
+    ("flaw", "lawn", 0.5, 1),
+    ("", "ACDEF", 2.2, 3), # length difference alone reaches tau
+    ("", "", 0.5, 0),
+    ("", "AC", 10, 2),
+])
+def test_bounded_edit_distance_float_tau(s1, s2, tau, expected):
+    assert bounded_edit_distance(s1, s2, tau) == expected
+    assert bounded_edit_distance(s2, s1, tau) == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_bounded_edit_distance_float_tau_feasibility(seed):
+    # "is the distance < tau" is answered the same as with the exact distance
+    rng = random.Random(seed)
+    for s1, s2 in random_pairs(seed):
+        d = dp_edit_distance(s1, s2)
+        tau = rng.randint(1, 60) - 0.5
+        assert (bounded_edit_distance(s1, s2, tau) < tau) == (d < tau), (s1, s2, tau)
+
+
+@pytest.mark.parametrize("tau", [None, 12, 11.5])
+def test_edit_distances_one_to_many(tau):
+    rng = random.Random(0)
+    seq = "".join(rng.choices(ALPHABET, k=120))
+    targets = ["".join(c if rng.random() > 0.1 else rng.choice(ALPHABET) for c in seq) for _ in range(10)]
+    targets += ["", seq, seq[:60], seq + "ACDEF"]
+    expected = [dp_edit_distance(seq, target) for target in targets]
+    if tau is not None:
+        expected = [min(d, 12) for d in expected]
+    distances = edit_distances(seq, targets, tau=tau)
+    assert distances.tolist() == expected
+
+
+def test_edit_distances_empty():
+    assert edit_distances("ACD", []).tolist() == []
+    assert edit_distances("", ["", "AC"]).tolist() == [0, 2]
@@ -0,0 +1,89 @@
+import random
+import pytest
+from lolbo.utils.edit_distance import edit_distance, bounded_edit_distance
+from robot.metric_index import BKTree, LinearIndex, make_diversity_index
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def mutated_seqs(seed, n_seqs, length=40, max_mut=25, base_seed=0):
+    # random mutants of one base seq, so distances spread around tau
+    base = "".join(random.Random(base_seed).choices(ALPHABET, k=length))
+    rng = random.Random(seed)
+    seqs = []
+    for _ in range(n_seqs):
+        s = list(base)
+        for _ in range(rng.randint(0, max_mut)):
+            s[rng.randrange(len(s))] = rng.choice(ALPHABET)
+        seqs.append("".join(s))
+    return seqs
+
+
+def check_same_answers(tree, linear, divf, queries, tau):
+    for q in queries:
+        found = tree.find_within(q, tau)
+        assert tree.any_within(q, tau) == linear.any_within(q, tau), (q, tau)
+        assert (found is None) == (linear.find_within(q, tau) is None), (q, tau)
+        if found is not None:
+            assert divf(q, found) < tau
+
+
+@pytest.mark.parametrize("tau", [1, 3, 5, 2.5, 7.5, 10.01])
+@pytest.mark.parametrize("use_bounded_divf", [False, True])
+def test_bk_tree_matches_linear_scan(tau, use_bounded_divf):
+    bounded_divf = bounded_edit_distance if use_bounded_divf else None
+    indexed = mutated_seqs(0, 80)
+    queries = mutated_seqs(1, 50) + mutated_seqs(2, 10, base_seed=1)
+    tree = BKTree(edit_distance, indexed, bounded_divf=bounded_divf)
+    linear = LinearIndex(edit_distance, indexed, bounded_divf=bounded_divf)
+    assert len(tree) == len(linear) == len(indexed)
+    check_same_answers(tree, linear, edit_distance, queries, tau)
+
+
+@pytest.mark.parametrize("tau", [0.5, 1, 1.5, 4])
+def test_bk_tree_duplicate_points(tau):
+    # duplicates sit at distance 0 from their first copy
+    indexed = mutated_seqs(3, 20, max_mut=3)
+    indexed = indexed + indexed[:10] + [indexed[0]] * 5
+    tree = BKTree(edit_distance, indexed, bounded_divf=bounded_edit_distance)
+    linear = LinearIndex(edit_distance, indexed)
+    assert len(tree) == len(indexed)
+    check_same_answers(tree, linear, edit_distance, indexed + mutated_seqs(4, 20, max_mut=3), tau)
+    assert tree.find_within(indexed[0], tau) == indexed[0]
+
+
+@pytest.mark.parametrize("tau", [0.25, 0.5, 1.3, 2.0])
+def test_bk_tree_real_valued_metric(tau):
+    # children keyed by exact float distances
+    rng = random.Random(4)
+    divf = lambda x, y: abs(x - y)
+    indexed = [round(rng.uniform(0, 20), 2) for _ in range(200)] + [3.0, 3.0]
+    queries = [round(rng.uniform(-2, 22), 2) for _ in range(200)] + [3.0]
+    tree = BKTree(divf, indexed)
+    linear = LinearIndex(divf, indexed)
+    check_same_answers(tree, linear, divf, queries, tau)
+
+
+@pytest.mark.parametrize("divf_is_metric, index_type", [(True, BKTree), (False, LinearIndex)])
+def test_empty_index(divf_is_metric, index_type):
+    index = make_diversity_index(edit_distance, divf_is_metric=divf_is_metric, bounded_divf=bounded_edit_distance)
+    assert isinstance(index, index_type)
+    assert len(index) == 0
+    assert index.find_within("ACD", 5) is None
+    assert not index.any_within("ACD", 5.5)
+    index.add("ACD")
+    assert index.find_within("ACE", 1.5) == "ACD"
+    assert not index.any_within("ACE", 1)
+
+
+def test_incremental_adds_match_bulk_build():
+    indexed = mutated_seqs(5, 60)
+    queries = mutated_seqs(6, 25)
+    tree = BKTree(edit_distance)
+    linear = LinearIndex(edit_distance)
+    for ix, x in enumerate(indexed):
+        tree.add(x)
+        linear.add(x)
+        if ix % 20 == 0:
+            check_same_answers(tree, linear, edit_distance, queries, 8)
+    check_same_answers(tree, linear, edit_distance, queries, 8)
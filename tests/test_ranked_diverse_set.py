@@ -0,0 +1,88 @@
+import random
+import pytest
+from lolbo.utils.edit_distance import edit_distance, bounded_edit_distance
+from robot.ranked_diverse_set import RankedDiverseSet
+
+ALPHABET = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def full_greedy(xs, ys, M, tau):
+    # the full recenter pass the incremental set replaces:
+    #   walk all points by score (ties by train idx), accept a point iff it is
+    #   not within tau of any accepted point, until M points are accepted
+    accepted = []
+    for idx in sorted(range(len(ys)), key=lambda i: (-ys[i], i)):
+        if len(accepted) == M:
+            break
+        if all(edit_distance(xs[idx], xs[j]) >= tau for j in accepted):
+            accepted.append(idx)
+    return accepted
+
+
+def mutate(rng, s, n_mut):
+    s = list(s)
+    for _ in range(n_mut):
+        s[rng.randrange(len(s))] = rng.choice(ALPHABET)
+    return "".join(s)
+
+
+def run_steps(seed, divf_is_metric, M, tau, n_steps, tied_scores=False, duplicate_xs=False):
+    ''' Grows the data like ROBOT does (new batches mostly near the selected points)
+        and checks select() against a full greedy pass after each step '''
+    rng = random.Random(seed)
+    base = "".join(rng.choices(ALPHABET, k=30))
+    xs = [mutate(rng, base, rng.randint(0, 15)) for _ in range(50)]
+    if tied_scores:
+        # few distinct scores --> many ties, broken by train idx
+        new_score = lambda step: float(rng.randint(0, 4 + step // 10))
+    else:
+        new_score = lambda step: rng.random() * (1 + step / 10)
+    ys = [new_score(0) for _ in xs]
+    diverse_set = RankedDiverseSet(
+        lambda i: xs[i],
+        edit_distance,
+        tau,
+        divf_is_metric=divf_is_metric,
+        bounded_divf=bounded_edit_distance,
+    )
+    for step in range(n_steps):
+        diverse_set.extend(ys[len(diverse_set):])
+        assert len(diverse_set) == len(xs)
+        selected = diverse_set.select(M)
+        assert selected == full_greedy(xs, ys, M, tau), step
+        # select() again without new points gives the same set
+        assert diverse_set.select(M) == selected
+        for _ in range(rng.randint(0, 10)):
+            if duplicate_xs and rng.random() < 0.3:
+                xs.append(rng.choice(xs))
+            else:
+                xs.append(mutate(rng, xs[rng.choice(selected)], rng.randint(0, 8)))
+            ys.append(new_score(step))
+
+
+@pytest.mark.parametrize("divf_is_metric", [True, False])
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_full_greedy(seed, divf_is_metric):
+    run_steps(seed, divf_is_metric, M=8, tau=6, n_steps=40)
+
+
+@pytest.mark.parametrize("divf_is_metric", [True, False])
+@pytest.mark.parametrize("tau", [1, 4.5])
+def test_matches_full_greedy_tied_scores(tau, divf_is_metric):
+    run_steps(3, divf_is_metric, M=8, tau=tau, n_steps=40, tied_scores=True)
+
+
+@pytest.mark.parametrize("divf_is_metric", [True, False])
+@pytest.mark.parametrize("tau", [1, 6])
+def test_matches_full_greedy_duplicate_xs(tau, divf_is_metric):
+    run_steps(4, divf_is_metric, M=8, tau=tau, n_steps=40, tied_scores=True, duplicate_xs=True)
+
+
+@pytest.mark.parametrize("divf_is_metric", [True, False])
+def test_fewer_than_M_feasible_points(divf_is_metric):
+    xs = ["ACDEF", "ACDEF", "ACDEG", "WWWWW"]
+    ys = [1.0, 3.0, 2.0, 0.5]
+    diverse_set = RankedDiverseSet(lambda i: xs[i], edit_distance, 2, divf_is_metric=divf_is_metric)
+    assert diverse_set.select(4) == []
+    diverse_set.extend(ys)
+    assert diverse_set.select(4) == full_greedy(xs, ys, 4, 2) == [1, 3]
@@ -0,0 +1,58 @@
+import os
+import pytest
+from inverse_folding_oracle.tm_align import cal_tm_score_native
+
+TARGET_DIR = os.path.join(os.path.dirname(__file__), "..", "inverse_folding_oracle", "target_pdb_files")
+
+# (folded pdb, target pdb, truncate folded, TM-score reported by the TMalign binary)
+#   folded pdbs are either a different target or the target itself with 
+#   5 N terminal and 10 C terminal residues removed
+REFERENCE_TM_SCORES = [
+    ("target_structure_0.pdb", "target_structure_1.pdb", False, 0.27454),
+    ("target_structure_1.pdb", "target_structure_10.pdb", False, 0.27728),
+    ("target_structure_10.pdb", "target_structure_11.pdb", False, 0.3545),
+    ("target_structure_11.pdb", "target_structure_12.pdb", False, 0.47758),
+    ("target_structure_12.pdb", "target_structure_13.pdb", False, 0.45628),
+    ("target_structure_13.pdb", "target_structure_14.pdb", False, 0.35079),
+    ("target_structure_14.pdb", "target_structure_15.pdb", False, 0.40531),
+    ("target_structure_15.pdb", "target_structure_16.pdb", False, 0.43067),
+    ("target_structure_16.pdb", "target_structure_17.pdb", False, 0.60752),
+    ("target_structure_17.pdb", "target_structure_18.pdb", False, 0.35507),
+    ("target_structure_18.pdb", "target_structure_19.pdb", False, 0.43833),
+    ("target_structure_19.pdb", "target_structure_2.pdb", False, 0.37912),
+    ("target_structure_2.pdb", "target_structure_20.pdb", False, 0.3534),
+    ("target_structure_20.pdb", "target_structure_21.pdb", False, 0.43567),
+    ("target_structure_21.pdb", "target_structure_22.pdb", False, 0.33996),
+    ("target_structure_22.pdb", "target_structure_23.pdb", False, 0.3229),
+    ("target_structure_23.pdb", "target_structure_3.pdb", False, 0.385),
+    ("target_structure_3.pdb", "target_structure_4.pdb", False, 0.35976),
+    ("target_structure_4.pdb", "target_structure_5.pdb", False, 0.32629),
+    ("target_structure_5.pdb", "target_structure_6.pdb", False, 0.31292),
+    ("target_structure_6.pdb", "target_structure_7.pdb", False, 0.29707),
+    ("target_structure_7.pdb", "target_structure_8.pdb", False, 0.32134),
+    ("target_structure_8.pdb", "target_structure_9.pdb", False, 0.36864),
+    ("target_structure_0.pdb", "target_structure_0.pdb", True, 0.85577),
+    ("target_structure_1.pdb", "target_structure_1.pdb", True, 0.88806),
+    ("target_structure_10.pdb", "target_structure_10.pdb", True, 0.85),
+    ("target_structure_11.pdb", "target_structure_11.pdb", True, 0.86364),
+    ("target_structure_12.pdb", "target_structure_12.pdb", True, 0.87395),
+    ("target_structure_13.pdb", "target_structure_13.pdb", True, 0.86486),
+    ("target_structure_14.pdb", "target_structure_14.pdb", True, 0.85849),
+    ("target_structure_15.pdb", "target_structure_15.pdb", True, 0.85714),
+]
+
+
+def truncated_pdb_text(path):
+    lines = open(path).read().splitlines()
+    residues = sorted(set(int(line[22:26]) for line in lines if line.startswith("ATOM")))
+    keep = set(residues[5:-10])
+    return "\n".join(line for line in lines if line.startswith("ATOM") and int(line[22:26]) in keep) + "\n"
+
+
+@pytest.mark.parametrize("folded, target, truncate, reference", REFERENCE_TM_SCORES)
+def test_native_tm_score_matches_tmalign(folded, target, truncate, reference):
+    folded_pdb = os.path.join(TARGET_DIR, folded)
+    if truncate:
+        folded_pdb = truncated_pdb_text(folded_pdb)
+    native = cal_tm_score_native(folded_pdb, os.path.join(TARGET_DIR, target))
+    assert native == pytest.approx(reference, abs=1e-4)
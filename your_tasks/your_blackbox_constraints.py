@@ -7,8 +7,7 @@ sys.path.append("../")
 import torch 
 try:
     from inverse_folding_oracle.get_prob_human import (
-        get_probs_human, 
-        load_human_classier_model
+        HumanClassifier
     )
 except:
     print("Probability Human Constraint Not Availalbe in this environment")
@@ -16,14 +15,24 @@ except:
 
 try:
     from inverse_folding_oracle.get_plddt import (
-        compute_plddt
+        compute_plddts
+    )
+    from inverse_folding_oracle.resources import (
+        get_esmfold_model,
+        get_esmfold_tokenizer,
     )
-    from transformers import AutoTokenizer 
-    from transformers import EsmForProteinFolding
 except:
     print("PLDDT Constraint Not Availalbe in this environment")
     print("Please use container in docker/inverse_fold/Dockerfile") 
 
+try:
+    # fold cache shared with the inverse fold oracle (needs a GPU machine, see inverse_folding_oracle/fold.py)
+    from inverse_folding_oracle.fold_cache import get_shared_fold_cache
+    import numpy as np 
+    FOLD_CACHE_AVAILABLE = True
+except ImportError:
+    FOLD_CACHE_AVAILABLE = False
+
 
 class ConstraintFunction:
     ''' Constraint function in form of c(x) <= 0'''
@@ -129,8 +138,15 @@ class ProbHumanConstraint(ConstraintFunction):
         self,
         threshold_value,
         threshold_type, # is the threshold a min allowed or max allowed value ?
+        device=None, # device the classifier runs on (defaults to cuda:0 if available, else cpu)
+        batch_size=64, # max seqs per classifier forward pass, seqs are length bucketed into micro batches 
+        quantize=False, # if True run a dynamic int8 quantized classifier on cpu 
     ):
-        self.human_classifier_tokenizer, self.human_classifier_model = load_human_classier_model() 
+        self.human_classifier = HumanClassifier(
+            device=device,
+            batch_size=batch_size,
+            quantize=quantize,
+        )
         super().__init__(
             threshold_type=threshold_type,
             threshold_value=threshold_value,
@@ -139,11 +155,7 @@ class ProbHumanConstraint(ConstraintFunction):
     def query_black_box(self, x_list):
         if not type(x_list) == list:
             x_list = x_list.tolist() 
-        probs_tensor = get_probs_human(
-            x_list, 
-            self.human_classifier_tokenizer, 
-            self.human_classifier_model,
-        )
+        probs_tensor = self.human_classifier(x_list)
         return probs_tensor.squeeze() 
 
 
@@ -155,11 +167,22 @@ class PlddtConstraint(ConstraintFunction):
         self,
         threshold_value,
         threshold_type, # is the threshold a min allowed or max allowed value ?
+        device="cpu", # device ESMFold runs on 
+        max_tokens_per_batch=1024, # max padded tokens per ESMFold forward pass 
+        use_fold_cache=True, # if True share fold results with the tm score objective (see inverse_folding_oracle/fold_cache.py), ignored where the fold cache can not be imported (no GPU)
+        fold_cache_size=2048, # max folded seqs kept in memory by the fold cache shared with the tm score objective 
+        fold_cache_dir=None, # optional dir for an on disk tier of the fold cache 
     ):
-        self.tokenizer = AutoTokenizer.from_pretrained("facebook/esmfold_v1")
-        self.fold_model = EsmForProteinFolding.from_pretrained("facebook/esmfold_v1")
-        self.fold_model = self.fold_model.eval() 
-        self.fold_model = self.fold_model.to('cpu')
+        self.device = device
+        self.max_tokens_per_batch = max_tokens_per_batch
+        # shared with the other oracles (see inverse_folding_oracle/resources.py)
+        self.tokenizer = get_esmfold_tokenizer()
+        self.fold_model = get_esmfold_model(device)
+        self.fold_cache = None
+        if use_fold_cache and (not FOLD_CACHE_AVAILABLE):
+            print("Fold cache not available in this environment (needs a GPU), computing plddts without it")
+        elif use_fold_cache:
+            self.fold_cache = get_shared_fold_cache(max_entries=fold_cache_size, cache_dir=fold_cache_dir)
 
         super().__init__(
             threshold_type=threshold_type,
@@ -167,10 +190,17 @@ class PlddtConstraint(ConstraintFunction):
         )
     
     def query_black_box(self, x_list):
-        plddts = []
-        for x in x_list:
-            plddt = compute_plddt(x, self.fold_model, self.tokenizer)
-            plddts.append(plddt)
+        # whole list is folded together, one ESMFold forward pass per length bucket 
+        if self.fold_cache is None:
+            return compute_plddts(
+                x_list, 
+                self.fold_model, 
+                self.tokenizer, 
+                max_tokens_per_batch=self.max_tokens_per_batch,
+            )
+        # seqs already folded by the tm score objective (or a previous call) are not folded again 
+        fold_results = self.fold_cache.fold(x_list, model=self.fold_model, max_tokens_per_batch=self.max_tokens_per_batch)
+        plddts = [np.nan if result is None else result.mean_plddt for result in fold_results]
 
         return torch.tensor(plddts).float() 
 
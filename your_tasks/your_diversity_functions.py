@@ -5,23 +5,29 @@
 '''
 import sys 
 sys.path.append("../")
+from lolbo.utils.edit_distance import edit_distance, bounded_edit_distance
 
 def string_edit_distance(s1, s2): 
     ''' Returns Levenshtein Edit Distance btwn two strings'''
-    m=len(s1)+1
-    n=len(s2)+1
-    tbl = {}
-    for i in range(m): tbl[i,0]=i
-    for j in range(n): tbl[0,j]=j
-    for i in range(1, m):
-        for j in range(1, n):
-            cost = 0 if s1[i-1] == s2[j-1] else 1 
-            tbl[i,j] = min(tbl[i, j-1]+1, tbl[i-1, j]+1, tbl[i-1, j-1]+cost)
+    # Myers' bit-vector algorithm, see lolbo/utils/edit_distance.py
+    return edit_distance(s1, s2)
 
-    return tbl[i,j] 
+def bounded_string_edit_distance(s1, s2, bound): 
+    ''' Edit distance btwn two strings if it is < bound, otherwise a value >= bound 
+        (stops early, enough for ROBOT's divf < tau feasibility checks)'''
+    return bounded_edit_distance(s1, s2, bound)
 
 # Diversity functions with unique string identifiers 
 # identifiers can be passed in when running ROBOT to specify which diversity function to use 
 DIVERSITY_FUNCTIONS_DICT = {
     'edit_dist':string_edit_distance
 }
+
+# optional early stopping versions of the diversity functions above (same identifiers)
+BOUNDED_DIVERSITY_FUNCTIONS_DICT = {
+    'edit_dist':bounded_string_edit_distance
+}
+
+# identifiers of the diversity functions above that are true metrics 
+#   (ROBOT then prunes feasibility checks with the triangle inequality)
+METRIC_DIVERSITY_FUNCTION_IDS = ['edit_dist']
@@ -9,11 +9,17 @@ sys.path.append("../")
 import numpy as np 
 import os 
 from lolbo.utils.mol_utils.mol_utils import smiles_to_desired_scores
+from lolbo.utils.mol_utils.mol_scoring_pool import MoleculeScoringPool
 
 try:
     # dependencies for inverse fold oracle 
-    from inverse_folding_oracle.aa_seq_to_tm_score import aa_seq_to_tm_score
-    from transformers import EsmForProteinFolding
+    from inverse_folding_oracle.aa_seq_to_tm_score import aa_seq_to_tm_score, aa_seqs_to_tm_scores
+    from inverse_folding_oracle.resources import (
+        get_esmfold_model,
+        get_esmfold_tokenizer,
+        get_target_ca_coords,
+    )
+    from inverse_folding_oracle.fold_cache import get_shared_fold_cache
 except:
     print("Inverse Folding Oracle not Availalbe in this environment")
     print("Please use container in docker/inverse_fold/Dockerfile to run IF optimization\n")
@@ -53,18 +59,31 @@ class ObjectiveFunction:
 class MoleculeObjective(ObjectiveFunction):
     """The objective function for the molecule tasks assuming smiles etc"""
     
-    def __init__(self,task_arg):
+    def __init__(
+        self,
+        task_arg,
+        num_workers=1, # number of processes scoring molecules in parallel (1 --> score in this process)
+    ):
         
         super().__init__()
         self.task_arg = task_arg
+        self.num_workers = num_workers
+        self.scoring_pool = None # MoleculeScoringPool, started on first call if num_workers > 1
         
     def query_black_box(self,x_list):
-        scores_list = []
-        for x in x_list:
-            # passing a list of 1 x
-            scores_list.append(smiles_to_desired_scores([x], self.task_arg).item())
-        
-        return scores_list
+        # score all xs together, each smiles string is parsed once
+        if self.num_workers <= 1:
+            return smiles_to_desired_scores(x_list, self.task_arg).tolist()
+        if self.scoring_pool is None:
+            self.scoring_pool = MoleculeScoringPool(self.task_arg, num_workers=self.num_workers)
+        return self.scoring_pool(x_list).tolist()
+
+    def __getstate__(self):
+        # process pools can not be pickled (i.e. when wrapped in a process OraclePool), 
+        #   a copy starts its own pool on first call 
+        state = self.__dict__.copy()
+        state['scoring_pool'] = None
+        return state
 
 class ExampleObjective(ObjectiveFunction):
     ''' Example objective funciton length of the input space items
@@ -99,23 +118,37 @@ class InverseFoldTMScoreObjective(ObjectiveFunction):
     def __init__( 
         self,
         target_pdb_id, # id number for the target structure 
+        max_tokens_per_batch=1024, # max padded tokens per ESMFold forward pass when folding a batch of seqs 
+        save_pdb_dir=None, # debug only, if given all folded pdbs are also saved to this dir 
+        tm_scorer="tmalign", # "tmalign" to call the TMalign binary, "native" for the in process numpy TM-align 
+        fold_cache_size=2048, # max folded seqs kept in memory by the fold cache shared with the plddt constraint 
+        fold_cache_dir=None, # optional dir for an on disk tier of the fold cache 
     ):
-        self.esm_model = EsmForProteinFolding.from_pretrained("facebook/esmfold_v1")
-        self.esm_model = self.esm_model.eval() 
-        self.esm_model = self.esm_model.to('cpu')
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.save_pdb_dir = save_pdb_dir
+        self.tm_scorer = tm_scorer
+        # shared process wide model/tokenizer/target (see inverse_folding_oracle/resources.py), 
+        #   preloaded here so the first oracle call does not pay for loading them 
+        self.esm_model = get_esmfold_model('cpu')
+        get_esmfold_tokenizer() 
         self.target_pdb_path = f"../inverse_folding_oracle/target_pdb_files/target_structure_{target_pdb_id}.pdb"
         assert os.path.exists(self.target_pdb_path)
+        if tm_scorer == "native":
+            get_target_ca_coords(self.target_pdb_path)
+        self.fold_cache = get_shared_fold_cache(max_entries=fold_cache_size, cache_dir=fold_cache_dir)
         super().__init__()
 
     def query_black_box(self, x_list):
-        scores_list = [] 
-        for x in x_list:
-            score = aa_seq_to_tm_score(
-                aa_seq=x, 
-                target_pdb_path=self.target_pdb_path,
-                esm_model=self.esm_model,
-            ) 
-            scores_list.append(score)
+        # fold all seqs together (one ESMFold forward pass per length bucket)
+        scores_list = aa_seqs_to_tm_scores(
+            aa_seqs=x_list, 
+            target_pdb_path=self.target_pdb_path,
+            esm_model=self.esm_model,
+            max_tokens_per_batch=self.max_tokens_per_batch,
+            save_pdb_dir=self.save_pdb_dir,
+            tm_scorer=self.tm_scorer,
+            fold_cache=self.fold_cache,
+        ) 
         return scores_list 
 
 